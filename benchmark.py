@@ -0,0 +1,1740 @@
+"""Benchmarks for the parking booking engine.
+
+Run ``python benchmark.py <name>``. Every benchmark works on a scratch
+database in a temporary directory and never touches parking.db.
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import gc
+import heapq
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime, timedelta
+
+import parking_engine
+
+# The command line entry point, for benchmarks that run the server
+PARKING_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parking.py")
+
+
+@contextlib.contextmanager
+def scratch_database(slot_count=20):
+    """Yield the path of a freshly migrated database with slot_count slots"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        parking_engine.initialize_database(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM slots")
+        conn.executemany(
+            "INSERT INTO slots (slot_id) VALUES (?)",
+            [(i,) for i in range(1, slot_count + 1)]
+        )
+        conn.commit()
+        conn.close()
+        yield db_path
+
+
+@contextlib.contextmanager
+def quiet():
+    # PaymentService and the expiry checker print on every booking
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def quiet_processes():
+    # Child processes started inside inherit stdout as a file descriptor
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+def close_all(systems):
+    closers = [threading.Thread(target=system.close) for system in systems]
+    for closer in closers:
+        closer.start()
+    for closer in closers:
+        closer.join()
+
+
+def legacy_book_slot(system, slot_id, user_id, vehicle_number, duration_minutes=60):
+    """The check-then-act booking path book_slot used before it became transactional"""
+    status_check = system.execute_query(
+        "SELECT status FROM slots WHERE slot_id = ?",
+        (slot_id,),
+        fetch=True
+    )
+
+    if not status_check or status_check[0][0] != 'available':
+        return False, "Slot is not available"
+
+    start_time = datetime.now()
+    end_time = start_time + timedelta(minutes=duration_minutes)
+    amount = parking_engine.PaymentService.calculate_charge(start_time, end_time)
+
+    system.execute_query(
+        "UPDATE slots SET status = 'booked' WHERE slot_id = ?",
+        (slot_id,)
+    )
+
+    system.execute_query('''
+    INSERT INTO bookings (
+        slot_id, user_id, vehicle_number,
+        start_time, end_time, amount_paid
+    ) VALUES (?, ?, ?, ?, ?, ?)
+    ''', (slot_id, user_id, vehicle_number,
+          start_time.isoformat(), end_time.isoformat(), amount))
+
+    if parking_engine.PaymentService.process_payment(amount):
+        system.execute_query(
+            "UPDATE bookings SET payment_status = 'paid' WHERE booking_id = ?",
+            (system.execute_query("SELECT last_insert_rowid()", fetch=True)[0][0],)
+        )
+
+    return True, f"Slot {slot_id} booked"
+
+
+def run_contention(book, threads, slots, rounds):
+    """Have every thread try to book every slot, round after round.
+
+    Each thread is a kiosk with its own ParkingSystem and connection. Between
+    rounds all slots are freed again. Returns successful bookings, the time
+    spent booking, and the number of (round, slot) pairs booked more than once.
+    """
+    with scratch_database(slots) as db_path, quiet():
+        systems = [parking_engine.ParkingSystem(db_path) for _ in range(threads)]
+        admin = sqlite3.connect(db_path, timeout=30)
+        successes = [0] * threads
+        double_bookings = 0
+        elapsed = 0.0
+
+        def kiosk(index, round_no, barrier):
+            order = list(range(1, slots + 1))
+            random.shuffle(order)
+            barrier.wait()
+            for slot_id in order:
+                ok, _ = book(systems[index], slot_id, f"r{round_no}-k{index}", "BENCH")
+                if ok:
+                    successes[index] += 1
+
+        for round_no in range(rounds):
+            barrier = threading.Barrier(threads + 1)
+            workers = [
+                threading.Thread(target=kiosk, args=(i, round_no, barrier))
+                for i in range(threads)
+            ]
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for worker in workers:
+                worker.join()
+            elapsed += time.perf_counter() - started
+
+            double_bookings += admin.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT slot_id FROM bookings WHERE status = 'active'
+                GROUP BY slot_id HAVING COUNT(*) > 1
+            )
+            ''').fetchone()[0]
+            admin.execute("UPDATE bookings SET status = 'completed' WHERE status = 'active'")
+            admin.execute("UPDATE slots SET status = 'available'")
+            admin.commit()
+
+        admin.close()
+        close_all(systems)
+    return sum(successes), elapsed, double_bookings
+
+
+def bench_booking_contention(args):
+    paths = [
+        ("check-then-act (before)", legacy_book_slot),
+        ("transactional (after)", lambda system, *a: system.book_slot(*a)),
+    ]
+    print(f"{args.threads} kiosks competing for {args.slots} slots, {args.rounds} rounds")
+    for label, book in paths:
+        booked, elapsed, doubles = run_contention(book, args.threads, args.slots, args.rounds)
+        rate = booked / elapsed if elapsed else 0.0
+        print(f"  {label:26} {booked:6d} bookings  {rate:9.1f} bookings/sec  "
+              f"{doubles} double-booked slots")
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_read_write_mix(args):
+    """Book and release on one thread while dashboard readers hammer the database"""
+    with scratch_database(args.slots) as db_path, quiet():
+        system = parking_engine.ParkingSystem(db_path)
+        stop = threading.Event()
+
+        def dashboard():
+            while not stop.is_set():
+                system.get_all_bookings()
+                system.execute_query(parking_engine.queries.TOTAL_BOOKINGS_QUERY, fetch=True)
+                system.execute_query(parking_engine.queries.ACTIVE_BOOKINGS_QUERY, fetch=True)
+
+        readers = [threading.Thread(target=dashboard) for _ in range(args.threads)]
+        for reader in readers:
+            reader.start()
+
+        latencies = []
+        for i in range(args.rounds * args.slots):
+            slot_id = i % args.slots + 1
+            started = time.perf_counter()
+            system.book_slot(slot_id, "bench", "BENCH")
+            latencies.append(time.perf_counter() - started)
+            booking_id = system.execute_query(
+                "SELECT MAX(booking_id) FROM bookings", fetch=True
+            )[0][0]
+            system.release_slot(booking_id)
+
+        stop.set()
+        for reader in readers:
+            reader.join()
+        metrics = system.pool.metrics()
+        system.close()
+
+    print(f"{len(latencies)} bookings with {args.threads} dashboard readers")
+    print(f"  book_slot p50 {percentile(latencies, 50) * 1000:.2f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms")
+    for kind, stats in metrics.items():
+        print(f"  {kind:6} checkouts {stats['checkouts']:7d}  contended {stats['contended']:6d}  "
+              f"wait {stats['wait_time'] * 1000:8.1f} ms  max wait {stats['max_wait'] * 1000:.2f} ms")
+
+
+def seed_stale_bookings(db_path, count, slots):
+    """Insert count active bookings that all ended an hour ago"""
+    start = (datetime.now() - timedelta(hours=2)).isoformat()
+    end = (datetime.now() - timedelta(hours=1)).isoformat()
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time) "
+        "VALUES (?, ?, ?, ?, ?)",
+        ((i % slots + 1, f"user{i}", f"V{i}", start, end) for i in range(count))
+    )
+    conn.execute("UPDATE slots SET status = 'booked'")
+    conn.commit()
+    conn.close()
+
+
+def legacy_expiry_sweep(system):
+    """The per-booking loop check_expired_bookings ran before the batched sweep"""
+    now = datetime.now().isoformat()
+    expired = system.execute_query(
+        "SELECT b.booking_id, b.slot_id FROM bookings b WHERE b.status = 'active' AND b.end_time < ?",
+        (now,),
+        fetch=True
+    ) or []
+
+    for booking_id, slot_id in expired:
+        system.execute_query(
+            "UPDATE bookings SET status = 'expired' WHERE booking_id = ?",
+            (booking_id,)
+        )
+        system.execute_query(
+            "UPDATE slots SET status = 'available' WHERE slot_id = ?",
+            (slot_id,)
+        )
+        print(f"Auto-released expired booking {booking_id} for slot {slot_id}")
+
+    return len(expired)
+
+
+def bench_expiry_sweep(args):
+    sweeps = [
+        ("per-booking loop (before)", legacy_expiry_sweep),
+        ("batched sweep (after)", lambda system: len(system.check_expired_bookings().expired)),
+    ]
+    print(f"Expiring {args.bookings} stale bookings over {args.slots} slots")
+    for label, sweep in sweeps:
+        with scratch_database(args.slots) as db_path:
+            seed_stale_bookings(db_path, args.bookings, args.slots)
+            with quiet():
+                system = parking_engine.ParkingSystem(db_path, expiry_checker=False)
+                started = time.perf_counter()
+                expired = sweep(system)
+                elapsed = time.perf_counter() - started
+                system.close()
+        print(f"  {label:26} {expired:7d} expired in {elapsed:8.3f} s")
+
+
+def bench_slot_lookup(args):
+    """Availability lookups through SQL and through the in-memory slot index"""
+    with scratch_database(args.slots) as db_path, quiet():
+        conn = sqlite3.connect(db_path)
+        # Book every other slot and make a tenth of them EV bays
+        conn.execute("UPDATE slots SET status = 'booked' WHERE slot_id % 2 = 0")
+        conn.execute("UPDATE slots SET vehicle_type = 'ev' WHERE slot_id % 10 = 1")
+        conn.commit()
+        conn.close()
+        system = parking_engine.ParkingSystem(db_path, expiry_checker=False)
+        lookups = [
+            ("SQL available slots", lambda: system.execute_query(parking_engine.queries.AVAILABLE_SLOTS_QUERY, fetch=True)),
+            ("index available slots", system.get_available_slots),
+            ("index count free", system.count_available_slots),
+            ("index first 10 free", lambda: system.first_available_slots(10)),
+            ("index next free ev", lambda: system.next_available_slot('ev')),
+        ]
+        timings = []
+        for label, lookup in lookups:
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                lookup()
+            timings.append((label, (time.perf_counter() - started) / args.rounds))
+        consistent = not system.check_slot_index()
+        system.close()
+
+    print(f"{args.slots} slots, half of them booked")
+    for label, elapsed in timings:
+        print(f"  {label:24} {elapsed * 1e6:10.1f} us/call")
+    print(f"  index consistent with tables: {consistent}")
+
+
+class FakeWidget:
+    """Stands in for a Tk widget; every constructor or method call is one widget operation"""
+    ops = 0
+
+    def __init__(self, *args, **kwargs):
+        FakeWidget.ops += 1
+
+    def __getattr__(self, name):
+        def operation(*args, **kwargs):
+            FakeWidget.ops += 1
+            return 0.0
+        return operation
+
+    def winfo_height(self):
+        return 600
+
+
+def legacy_render(children, available_slots):
+    """What update_slot_display did on every refresh before the diffing grid"""
+    for widget in children:
+        widget.destroy()
+    children[:] = []
+    for i, slot_id in enumerate(available_slots):
+        btn = FakeWidget(None, text=f"Slot {slot_id}")
+        btn.grid(row=i // 5, column=i % 5, padx=5, pady=5)
+        children.append(btn)
+
+
+def bench_slot_grid(args):
+    """Render the kiosk slot grid against a mocked Tk, with 1% of slots changing per refresh"""
+    from parking_engine import gui
+    rng = random.Random(42)
+    free = {slot_id: rng.random() < 0.5 for slot_id in range(1, args.slots + 1)}
+    refreshes = []
+    for _ in range(args.rounds):
+        for slot_id in rng.sample(range(1, args.slots + 1), max(1, args.slots // 100)):
+            free[slot_id] = not free[slot_id]
+        refreshes.append(sorted(free.items()))
+
+    legacy_children = []
+    renderers = [
+        ("destroy and rebuild (before)",
+         lambda states: legacy_render(legacy_children, [s for s, ok in states if ok])),
+    ]
+    original_button = gui.ttk.Button
+    gui.ttk.Button = FakeWidget
+    try:
+        grid = gui.SlotGrid(FakeWidget(), lambda slot_id: None)
+        virtual = gui.VirtualSlotGrid(FakeWidget(), lambda slot_id: None)
+        renderers.append(("diffing widget grid", grid.update))
+        renderers.append(("virtual canvas grid", virtual.update))
+
+        print(f"{args.slots} slots, {args.rounds} refreshes, {args.slots // 100} slots changing each time")
+        for label, render in renderers:
+            render(refreshes[0])
+            FakeWidget.ops = 0
+            started = time.perf_counter()
+            for states in refreshes[1:]:
+                render(states)
+            elapsed = (time.perf_counter() - started) / (len(refreshes) - 1)
+            ops = FakeWidget.ops / (len(refreshes) - 1)
+            print(f"  {label:30} {elapsed * 1000:8.2f} ms/refresh  {ops:9.0f} widget ops/refresh")
+    finally:
+        gui.ttk.Button = original_button
+
+
+class FakeTkRoot:
+    """Single-threaded stand-in for the Tk event loop that only knows after() timers"""
+
+    def __init__(self):
+        self.timers = []
+        self.cancelled = set()
+        self.ids = itertools.count()
+
+    def after(self, ms, callback, *args):
+        timer_id = next(self.ids)
+        heapq.heappush(self.timers, (time.perf_counter() + ms / 1000, timer_id, callback, args))
+        return timer_id
+
+    def after_cancel(self, timer_id):
+        self.cancelled.add(timer_id)
+
+    def run(self, seconds):
+        stop_at = time.perf_counter() + seconds
+        while self.timers and time.perf_counter() < stop_at:
+            due, timer_id, callback, args = heapq.heappop(self.timers)
+            if timer_id in self.cancelled:
+                continue
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            callback(*args)
+
+
+def bench_ui_stalls(args):
+    """Main-thread stalls while the admin screen refreshes, with and without the UI executor"""
+    from parking_engine import gui
+    with scratch_database(args.slots) as db_path:
+        seed_stale_bookings(db_path, args.bookings, args.slots)
+        with quiet():
+            system = parking_engine.ParkingSystem(db_path, expiry_checker=False)
+            results = []
+            for label, asynchronous in [("queries on main thread (before)", False),
+                                        ("UIExecutor (after)", True)]:
+                root = FakeTkRoot()
+                monitor = gui.StallMonitor(root, interval_ms=10)
+                executor = gui.UIExecutor(root) if asynchronous else None
+                delivered = []
+
+                def refresh():
+                    # The pre-pagination admin refresh: every booking plus the stats
+                    if executor:
+                        executor.submit("refresh", system.get_all_bookings, callback=delivered.append)
+                        executor.submit("stats", system.get_dashboard_stats)
+                    else:
+                        delivered.append(system.get_all_bookings())
+                        system.get_dashboard_stats()
+                    root.after(200, refresh)
+
+                root.after(0, refresh)
+                root.run(args.rounds / 10)
+                monitor.stop()
+                if executor:
+                    executor.close()
+                results.append((label, monitor, len(delivered),
+                                executor.coalesced if executor else 0))
+            system.close()
+
+    print(f"Admin refresh every 200 ms over {args.bookings} bookings for {args.rounds / 10:.1f} s")
+    for label, monitor, delivered, coalesced in results:
+        print(f"  {label:32} p50 <= {monitor.percentile(50):6.1f} ms  p99 <= {monitor.percentile(99):6.1f} ms  "
+              f"max {monitor.max_ms:7.1f} ms  ({delivered} refreshes, {coalesced} coalesced)")
+
+
+def start_server(db_path):
+    """Run ``parking.py serve`` in a subprocess; returns (process, port)"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, PARKING_SCRIPT, "--database", db_path,
+         "serve", "--port", str(port)],
+        cwd=os.path.dirname(db_path), stdout=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("parking server did not start")
+            time.sleep(0.05)
+
+
+HTTP_LOAD_MIX = [
+    (50, "GET", "/slots", None),
+    (20, "GET", "/users/{user}/bookings", None),
+    (10, "GET", "/admin/stats", None),
+    (20, "POST", "/bookings", '{{"slot_id": {slot}, "user_id": "{user}", '
+                              '"vehicle_number": "BENCH", "duration_minutes": 1}}'),
+]
+
+
+async def read_response(reader):
+    """(status, body) of one response"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+    return status, await reader.readexactly(length)
+
+
+async def http_client(port, client_id, requests, pipeline, slots, latencies, statuses):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    rng = random.Random(client_id)
+    weights = [weight for weight, *_ in HTTP_LOAD_MIX]
+    user = f"user{client_id}"
+    # Log in once for the /admin/ requests in the mix
+    login = b'{"username": "admin", "password": "admin123"}'
+    writer.write(b"POST /admin/login HTTP/1.1\r\nHost: bench\r\n"
+                 b"Content-Length: %d\r\n\r\n%s" % (len(login), login))
+    await writer.drain()
+    token = json.loads((await read_response(reader))[1])["token"]
+    sent = 0
+    while sent < requests:
+        batch = []
+        for _ in range(min(pipeline, requests - sent)):
+            _, method, path, body = rng.choices(HTTP_LOAD_MIX, weights)[0]
+            path = path.format(user=user)
+            body = body.format(slot=rng.randint(1, slots), user=user).encode() if body else b""
+            batch.append(f"{method} {path} HTTP/1.1\r\nHost: bench\r\n"
+                         f"Authorization: Bearer {token}\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        started = time.perf_counter()
+        writer.write(b"".join(batch))
+        await writer.drain()
+        for _ in batch:
+            status, _ = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+        sent += len(batch)
+    writer.close()
+
+
+async def run_http_load(port, clients, requests, pipeline, slots):
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        http_client(port, client_id, requests, pipeline, slots, latencies, statuses)
+        for client_id in range(clients)
+    ])
+    return latencies, statuses, time.perf_counter() - started
+
+
+def bench_http_load(args):
+    """Concurrent keep-alive clients against the HTTP/JSON server in a subprocess"""
+    with scratch_database(args.slots) as db_path:
+        process, port = start_server(db_path)
+        try:
+            results = []
+            for pipeline in (1, 8):
+                results.append((pipeline, asyncio.run(
+                    run_http_load(port, args.clients, args.rounds, pipeline, args.slots)
+                )))
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f"{args.clients} clients x {args.rounds} requests, {args.slots} slots")
+    for pipeline, (latencies, statuses, elapsed) in results:
+        codes = ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items()))
+        print(f"  pipeline depth {pipeline}:  {len(latencies) / elapsed:8.1f} requests/sec  "
+              f"p50 {percentile(latencies, 50) * 1000:7.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms  ({codes})")
+
+
+def bench_bulk_booking(args):
+    """Fleet bookings: book_slot in a loop against one book_slots_bulk call"""
+    results = []
+    for size in (1, 100, 10000):
+        with scratch_database(size) as db_path, quiet():
+            system = parking_engine.ParkingSystem(db_path, expiry_checker=False)
+            timings = []
+            for label, book in [
+                ("book_slot loop (before)",
+                 lambda: [system.book_slot(slot_id, "fleet", "FLEET") for slot_id in range(1, size + 1)]),
+                ("book_slots_bulk (after)",
+                 lambda: system.book_slots_bulk("fleet", "FLEET", count=size)),
+            ]:
+                started = time.perf_counter()
+                book()
+                elapsed = time.perf_counter() - started
+                booked = system.count_available_slots() == 0
+                timings.append((label, elapsed, booked))
+                bookings = [booking.booking_id for booking in system.get_user_bookings("fleet")]
+                system.release_bookings_bulk(bookings)
+            system.close()
+        results.append((size, timings))
+
+    for size, timings in results:
+        print(f"{size} slots per request")
+        for label, elapsed, booked in timings:
+            print(f"  {label:24} {elapsed * 1000:9.2f} ms  {size / elapsed:10.1f} bookings/sec"
+                  f"{'' if booked else '  (not all slots booked!)'}")
+
+
+def legacy_calculate_charge(start_time, end_time):
+    """PaymentService.calculate_charge before the tariff engine"""
+    if isinstance(start_time, str):
+        start_time = datetime.fromisoformat(start_time)
+    if isinstance(end_time, str):
+        end_time = datetime.fromisoformat(end_time)
+    duration = (end_time - start_time).total_seconds() / 3600
+    return round(duration * parking_engine.CONFIG['pricing']['hourly_rate'], 2)
+
+
+BANDED_PRICING = {
+    "hourly_rate": 5.00,
+    "tariff": {
+        "version": 1,
+        "grace_minutes": 10,
+        "daily_cap": 40.0,
+        "weekend_multiplier": 0.5,
+        "bands": [[7, 10, 2.0], [16, 19, 2.0], [22, 24, 0.5], [0, 6, 0.5]],
+        "vehicle_types": {"ev": 0.8, "oversize": 1.5},
+    },
+}
+
+
+def bench_tariff(args):
+    """Repricing a bookings export: the old per-call charge against the compiled tariff"""
+    rng = random.Random(42)
+    origin = datetime(2026, 1, 1)
+    starts, ends, vehicle_types = [], [], []
+    for _ in range(args.bookings):
+        start = origin + timedelta(seconds=rng.randint(0, 365 * 86400),
+                                           microseconds=rng.randint(0, 999999))
+        end = start + timedelta(minutes=rng.choice([15, 30, 60, 90, 120, 240, 480, 1440]))
+        starts.append(start.isoformat())
+        ends.append(end.isoformat())
+        vehicle_types.append(rng.choice(["regular", "ev", "oversize"]))
+
+    def timed(fn):
+        started = time.perf_counter()
+        charges = list(fn())
+        return time.perf_counter() - started, charges
+
+    flat = parking_engine.Tariff(parking_engine.CONFIG['pricing'])
+    banded = parking_engine.Tariff(BANDED_PRICING)
+    baseline_time, baseline = timed(lambda: map(legacy_calculate_charge, starts, ends))
+    rows = [("calculate_charge (before)", baseline_time, baseline)]
+    for label, tariff in [("flat", flat), ("banded", banded)]:
+        types = None if tariff is flat else vehicle_types
+        rows.append((f"{label} price()", *timed(
+            lambda: map(tariff.price, starts, ends, types or [None] * len(starts)))))
+        tariff.memo.clear()
+        rows.append((f"{label} price_cached()", *timed(
+            lambda: map(tariff.price_cached, starts, ends, types or [None] * len(starts)))))
+        rows.append((f"{label} price_batch()", *timed(
+            lambda: tariff.price_batch(starts, ends, types))))
+        minutes = ([parking_engine.tariff_minutes(start) for start in starts],
+                   [parking_engine.tariff_minutes(end) for end in ends])
+        rows.append((f"{label} price_batch(minutes)", *timed(
+            lambda: tariff.price_batch(*minutes, types))))
+
+    print(f"Repricing {args.bookings} bookings")
+    for label, elapsed, charges in rows:
+        same = "" if not label.startswith("flat") else (
+            "  same as before" if charges == baseline else
+            f"  {sum(a != b for a, b in zip(charges, baseline))} differ")
+        print(f"  {label:28} {elapsed * 1000:9.1f} ms  {elapsed / len(charges) * 1e6:6.2f} us/booking{same}")
+
+
+def bench_payment_outbox(args):
+    """Booking latency with a slow gateway, and outbox drain rate by worker count"""
+    size = args.payments
+    results = []
+    with scratch_database(size) as db_path, quiet():
+        # Before: the charge ran inside book_slot
+        gateway = parking_engine.FakeGateway(latency_ms=args.latency_ms, seed=1)
+        system = parking_engine.ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+        latencies = []
+        for slot_id in range(1, min(size, 20) + 1):
+            started = time.perf_counter()
+            system.book_slot(slot_id, "bench", "BENCH")
+            gateway.charge(f"inline-{slot_id}", 5.0)
+            latencies.append(time.perf_counter() - started)
+        system.release_bookings_bulk([booking.booking_id for booking in system.get_user_bookings("bench")])
+        system.execute_query("DELETE FROM payment_outbox")
+        system.close()
+        results.append(("inline charge (before)", None, latencies, None))
+
+        for workers in (1, 4, 16):
+            gateway = parking_engine.FakeGateway(latency_ms=args.latency_ms, failure_rate=0.05, seed=workers)
+            system = parking_engine.ParkingSystem(db_path, expiry_checker=False,
+                                           payment_gateway=gateway, payment_workers=workers)
+            latencies = []
+            started = time.perf_counter()
+            for slot_id in range(1, size + 1):
+                booked = time.perf_counter()
+                system.book_slot(slot_id, "bench", "BENCH")
+                latencies.append(time.perf_counter() - booked)
+            while system.payment_outbox.pending():
+                time.sleep(0.01)
+            drained = time.perf_counter() - started
+            metrics = system.payment_metrics()
+            system.release_bookings_bulk([booking.booking_id for booking in system.get_user_bookings("bench")])
+            system.close()
+            results.append((f"outbox, {workers:2d} workers", drained, latencies, metrics))
+
+    print(f"{size} bookings, gateway latency ~{args.latency_ms} ms")
+    for label, drained, latencies, metrics in results:
+        line = (f"  {label:24} book_slot p50 {percentile(latencies, 50) * 1000:7.2f} ms  "
+                f"p99 {percentile(latencies, 99) * 1000:7.2f} ms")
+        if metrics:
+            line += (f"  drained in {drained:6.2f} s ({size / drained:6.1f} payments/sec, "
+                     f"{metrics['retried']} retries, settle p99 {metrics['settle_p99_ms']:.0f} ms)")
+        print(line)
+
+
+def brute_force_free(windows, slot_ids, start, end):
+    """Slots with no (slot_id, start, end) window overlapping [start, end), by brute force"""
+    taken = {slot_id for slot_id, w_start, w_end in windows if w_start < end and start < w_end}
+    return [slot_id for slot_id in slot_ids if slot_id not in taken]
+
+
+def random_window(rng, origin, days):
+    start = origin + timedelta(minutes=rng.randrange(days * 1440))
+    return start, start + timedelta(minutes=rng.choice([30, 60, 120, 240, 720, 1440, 4320]))
+
+
+def bench_reservations(args):
+    """Advance reservations: index against brute-force overlap, then free-slot queries at scale"""
+    rng = random.Random(16)
+    origin = datetime.now().replace(second=0, microsecond=0) + timedelta(hours=1)
+
+    # Random reserve/cancel traffic on a small garage: every decision and
+    # every free-slot answer must match a brute-force overlap check
+    operations, mismatches = args.rounds * 100, 0
+    with scratch_database(50) as db_path, quiet():
+        system = parking_engine.ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+        slot_ids = list(range(1, 51))
+        accepted = {}  # reservation_id -> (slot_id, start, end)
+        for _ in range(operations):
+            if accepted and rng.random() < 0.2:
+                reservation_id = rng.choice(list(accepted))
+                system.cancel_reservation(reservation_id)
+                del accepted[reservation_id]
+                continue
+            slot_id = rng.choice(slot_ids)
+            start, end = random_window(rng, origin, 30)
+            expected = bool(brute_force_free(accepted.values(), [slot_id], start, end))
+            result = system.reserve_slot(slot_id, "bench", "BENCH", start, end)
+            mismatches += result.success != expected
+            if result.success:
+                accepted[result.reservation_id] = (slot_id, start, end)
+            start, end = random_window(rng, origin, 30)
+            mismatches += (system.find_free_slots(start, end)
+                           != brute_force_free(accepted.values(), slot_ids, start, end))
+        index_mismatches = system.check_reservation_index()
+        system.close()
+    print(f"{operations} random reserve/cancel operations on 50 slots: "
+          f"{mismatches} mismatches against brute force, {len(index_mismatches)} index/table mismatches")
+
+    # Months of reservations across thousands of slots, written straight to
+    # the table and loaded into the index
+    slot_count, days = 5000, 180
+    with scratch_database(slot_count) as db_path, quiet():
+        windows = []
+        for slot_id in range(1, slot_count + 1):
+            cursor = origin + timedelta(minutes=rng.randrange(1440))
+            while len(windows) < args.bookings * slot_id // slot_count:
+                start = cursor + timedelta(minutes=rng.randrange(0, 2880, 15))
+                cursor = start + timedelta(minutes=rng.choice([60, 120, 240, 480, 1440]))
+                if cursor > origin + timedelta(days=days):
+                    break
+                windows.append((slot_id, start, cursor))
+        conn = sqlite3.connect(db_path)
+        conn.executemany(
+            "INSERT INTO reservations (slot_id, user_id, vehicle_number, start_time, end_time) "
+            "VALUES (?, 'bench', 'BENCH', ?, ?)",
+            [(slot_id, start.isoformat(), end.isoformat()) for slot_id, start, end in windows]
+        )
+        conn.commit()
+
+        started = time.perf_counter()
+        system = parking_engine.ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+        loaded = time.perf_counter() - started
+        queries = [random_window(rng, origin, days) for _ in range(100)]
+        timings = {}
+        for label, find in [
+            ("brute force", lambda start, end: brute_force_free(windows, list(range(1, slot_count + 1)), start, end)),
+            ("SQL NOT EXISTS", lambda start, end: [row[0] for row in conn.execute(
+                "SELECT slot_id FROM slots s WHERE is_active = 1 AND NOT EXISTS ("
+                "SELECT 1 FROM reservations r WHERE r.slot_id = s.slot_id AND r.status = 'reserved' "
+                "AND r.start_time < ? AND r.end_time > ?) ORDER BY slot_id",
+                (end.isoformat(), start.isoformat())
+            )]),
+            ("find_free_slots", system.find_free_slots),
+        ]:
+            started = time.perf_counter()
+            timings[label] = ([find(start, end) for start, end in queries],
+                              (time.perf_counter() - started) / len(queries))
+        system.close()
+        conn.close()
+
+    expected = timings["brute force"][0]
+    print(f"{len(windows)} reservations over {days} days on {slot_count} slots "
+          f"(index loaded in {loaded * 1000:.0f} ms)")
+    for label, (answers, elapsed) in timings.items():
+        wrong = sum(answer != want for answer, want in zip(answers, expected))
+        print(f"  {label:16} {elapsed * 1000:8.2f} ms per free-slot query  {wrong} wrong answers")
+
+
+def seed_history(db_path, count, slots=20):
+    """Insert count finished bookings spread over the past year"""
+    rng = random.Random(17)
+    origin = datetime.now() - timedelta(days=365)
+    conn = sqlite3.connect(db_path)
+    rows = []
+    for i in range(count):
+        start = origin + timedelta(seconds=rng.randrange(365 * 86400))
+        end = start + timedelta(minutes=rng.choice([30, 60, 120, 240]))
+        rows.append((i % slots + 1, f"user{i % 5000}", f"V{i}", start.isoformat(), end.isoformat(),
+                     rng.choice(["completed", "expired"]), 5.0, "paid"))
+        if len(rows) == 50000:
+            conn.executemany(
+                "INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, "
+                "status, amount_paid, payment_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            rows = []
+    conn.executemany(
+        "INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, "
+        "status, amount_paid, payment_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def bench_export(args):
+    """Bookings history export: get_all_bookings into a file against the streaming export"""
+    with scratch_database() as db_path:
+        seed_history(db_path, args.bookings)
+        system = parking_engine.ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+        out_dir = os.path.dirname(db_path)
+
+        def legacy_export(path):
+            rows = system.get_all_bookings()
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(parking_engine.EXPORT_COLUMNS)
+                writer.writerows(booking.as_row() for booking in rows)
+            return len(rows)
+
+        runs = [("get_all_bookings + csv (before)", legacy_export, "csv")]
+        for fmt in parking_engine.EXPORT_WRITERS:
+            runs.append((f"export_bookings {fmt}",
+                         lambda path, fmt=fmt: parking_engine.export_bookings(system, path, fmt), fmt))
+        results = []
+        for label, export, fmt in runs:
+            path = os.path.join(out_dir, f"export.{fmt}")
+            tracemalloc.start()
+            started = time.perf_counter()
+            try:
+                written = export(path)
+            except RuntimeError as e:
+                tracemalloc.stop()
+                results.append((label, None, str(e), 0, 0))
+                continue
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append((label, elapsed, written, peak, os.path.getsize(path)))
+        system.close()
+
+    print(f"Exporting {args.bookings} bookings")
+    for label, elapsed, written, peak, size in results:
+        if elapsed is None:
+            print(f"  {label:32} skipped: {written}")
+            continue
+        print(f"  {label:32} {elapsed:7.2f} s  {written / elapsed:9.0f} rows/sec  "
+              f"peak Python memory {peak / 2**20:7.1f} MiB  file {size / 2**20:6.1f} MiB")
+
+
+def active_path_latencies(system, rounds):
+    """p50/p99 seconds of the calls kiosks, the expiry sweep and the admin screen make"""
+    samples = {}
+
+    def timed(label, fn, *fn_args):
+        started = time.perf_counter()
+        result = fn(*fn_args)
+        samples.setdefault(label, []).append(time.perf_counter() - started)
+        return result
+
+    for i in range(rounds):
+        slot_id = system.next_available_slot()
+        timed("book_slot", system.book_slot, slot_id, "bench", f"B{i}")
+        booking_id = system.get_user_bookings("bench")[0].booking_id
+        timed("get_user_bookings", system.get_user_bookings, "bench")
+        timed("release_slot", system.release_slot, booking_id)
+        timed("admin active page", system.get_all_bookings, {'status': 'active'}, None,
+              parking_engine.CONFIG['admin_page_size'])
+        timed("admin first page", system.get_all_bookings, None, None,
+              parking_engine.CONFIG['admin_page_size'])
+        timed("get_dashboard_stats", system.get_dashboard_stats)
+        timed("expiry sweep (idle)", system.check_expired_bookings)
+    return {label: (percentile(times, 50), percentile(times, 99)) for label, times in samples.items()}
+
+
+def bench_archive(args):
+    """Active-path latency with a large booking history, before and after archiving it"""
+    with scratch_database(200) as db_path:
+        started = time.perf_counter()
+        seed_history(db_path, args.history, 200)
+        seeded = time.perf_counter() - started
+        with quiet():
+            system = parking_engine.ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+            before = active_path_latencies(system, args.rounds * 10)
+            started = time.perf_counter()
+            moved = system.archive_bookings(older_than_days=0)
+            archived = time.perf_counter() - started
+            after = active_path_latencies(system, args.rounds * 10)
+            mismatches = system.check_stats()
+            system.close()
+
+    print(f"{args.history} historical bookings (seeded in {seeded:.0f} s); "
+          f"archived {moved} in {archived:.1f} s ({moved / archived:.0f} bookings/sec), "
+          f"{len(mismatches)} statistics mismatches")
+    print(f"  {'':22} {'hot table p50/p99 ms':>24} {'archived p50/p99 ms':>24}")
+    for label in before:
+        (b50, b99), (a50, a99) = before[label], after[label]
+        print(f"  {label:22} {b50 * 1000:11.3f} {b99 * 1000:11.3f}  {a50 * 1000:11.3f} {a99 * 1000:11.3f}")
+
+
+def bench_metrics(args):
+    """Active-path latency with profiling off and on, and what the profile shows"""
+    with scratch_database(200) as db_path:
+        seed_history(db_path, args.bookings, 200)
+        results = {False: [], True: []}
+        with quiet():
+            # Alternate so cache warmth and disk state favour neither side
+            for enabled in (False, True, False, True):
+                metrics = parking_engine.Metrics(enabled=enabled)
+                system = parking_engine.ParkingSystem(db_path, expiry_checker=False, payment_workers=0,
+                                               metrics=metrics)
+                results[enabled].append(active_path_latencies(system, args.rounds * 10))
+                system.close()
+        snapshot = metrics.to_json()
+        exported = len(metrics.to_prometheus().splitlines())
+
+    def best(runs, label):
+        return min(run[label][0] for run in runs), min(run[label][1] for run in runs)
+
+    print(f"{args.bookings} bookings in the history, {args.rounds * 10} rounds per run")
+    print(f"  {'':22} {'off p50/p99 ms':>24} {'on p50/p99 ms':>24} {'p50 overhead':>13}")
+    for label in results[False][0]:
+        (o50, o99), (e50, e99) = best(results[False], label), best(results[True], label)
+        print(f"  {label:22} {o50 * 1000:11.3f} {o99 * 1000:11.3f}  {e50 * 1000:11.3f} {e99 * 1000:11.3f}"
+              f"  {(e50 - o50) * 1e6:9.1f} us")
+    totals = snapshot['totals']
+    print(f"  last profiled run: {totals['operations']} operations, {totals['queries']} queries, "
+          f"{totals['commits']} commits, {totals['slow_queries']} slow; "
+          f"{exported} lines of Prometheus text")
+    slowest = sorted(snapshot['histograms']['query'].items(), key=lambda item: -item[1]['sum'])[:3]
+    for query, histogram in slowest:
+        print(f"  {histogram['sum'] * 1000:8.1f} ms over {histogram['count']:5d}x  {query[:70]}")
+
+
+
+# get_all_bookings before Booking records: plain tuples with ISO text timestamps
+LEGACY_BOOKINGS_QUERY = '''
+SELECT b.booking_id, b.slot_id, b.user_id, b.vehicle_number,
+    b.start_time, b.end_time, b.status, b.amount_paid, b.payment_status
+FROM bookings b
+'''
+
+
+def legacy_materialize(conn):
+    # Every caller parsed the timestamps it needed out of the tuples
+    parse = datetime.fromisoformat
+    return [row[:4] + (parse(row[4]), parse(row[5])) + row[6:]
+            for row in conn.execute(LEGACY_BOOKINGS_QUERY)]
+
+
+def bench_records(args):
+    """Materializing booking rows as tuples + fromisoformat against Booking records,
+    and the prepared statement cache"""
+    with scratch_database() as db_path:
+        seed_history(db_path, args.bookings)
+        conn = sqlite3.connect(db_path)
+        query = parking_engine.queries.ALL_BOOKINGS_QUERY
+        runs = [
+            ("tuples, no parsing", lambda: conn.execute(LEGACY_BOOKINGS_QUERY).fetchall()),
+            ("tuples + fromisoformat (before)", lambda: legacy_materialize(conn)),
+            ("Booking records", lambda: list(map(parking_engine.Booking._make, conn.execute(query)))),
+            ("BookingTable", lambda: parking_engine.BookingTable(conn.execute(query))),
+        ]
+        print(f"{args.bookings} booking rows")
+        for label, materialize in runs:
+            gc.collect()
+            started = time.perf_counter()
+            rows = materialize()
+            elapsed = time.perf_counter() - started
+            del rows
+            gc.collect()
+            tracemalloc.start()
+            rows = materialize()
+            held, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {label:32} {elapsed:7.2f} s  {len(rows) / elapsed:10,.0f} rows/s  "
+                  f"{held / len(rows):6.0f} bytes/row held, {peak / len(rows):4.0f} at peak")
+            if label == "BookingTable":
+                # The price of converting lazily, for a caller that wants every start
+                started = time.perf_counter()
+                for booking in rows:
+                    booking.start_time
+                print(f"  {'  then .start_time on each':32} {time.perf_counter() - started:7.2f} s")
+            del rows
+        conn.close()
+
+        calls = args.rounds * 1000
+        print(f"get_user_bookings query, {calls} calls")
+        for cached in (0, parking_engine.CONFIG['database_pool']['cached_statements']):
+            pool = parking_engine.ConnectionPool(db_path, readers=1, cached_statements=cached)
+            with pool.reader() as conn:
+                started = time.perf_counter()
+                for i in range(calls):
+                    conn.execute(parking_engine.queries.USER_BOOKINGS_QUERY, (f"user{i % 5000}",)).fetchall()
+                elapsed = time.perf_counter() - started
+            pool.close()
+            print(f"  cached_statements={cached:<4} {elapsed / calls * 1e6:8.1f} us per call")
+
+# Arrivals per hour of day, relative; commuter peaks around 8:00 and 17:00
+ARRIVAL_PROFILE = [1, 1, 1, 1, 2, 4, 8, 14, 16, 12, 9, 8, 9, 8, 8, 9, 12, 14, 10, 7, 5, 4, 2, 1]
+
+
+def booking_duration(rng):
+    """Minutes parked: log-normal around 75 minutes, between 10 minutes and a day"""
+    return int(min(24 * 60, max(10, rng.lognormvariate(math.log(75), 0.8))))
+
+
+def workload_user(rng, users):
+    """A user id drawn so a few regulars park far more often than the rest"""
+    return f"user{min(int(rng.paretovariate(1.2)) - 1, users - 1)}"
+
+
+def seed_workload(db_path, slots, bookings, days=365, seed=17):
+    """Give the garage slots slots and bookings finished bookings over the past days.
+
+    Arrivals follow ARRIVAL_PROFILE (halved at weekends), stays
+    booking_duration and users workload_user; about one in eight bookings
+    ran past its end and expired. Returns the number of users.
+    """
+    rng = random.Random(seed)
+    users = max(1, bookings // 20)
+    origin = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=days)
+    hours = [
+        origin + timedelta(hours=hour)
+        for hour in range((days - 1) * 24)
+    ]
+    weights = [
+        ARRIVAL_PROFILE[hour.hour] * (0.5 if hour.weekday() >= 5 else 1.0)
+        for hour in hours
+    ]
+    rate = parking_engine.CONFIG['pricing']['hourly_rate']
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM slots")
+    conn.executemany("INSERT INTO slots (slot_id) VALUES (?)", [(i,) for i in range(1, slots + 1)])
+    rows = []
+    for i, hour in enumerate(rng.choices(hours, weights, k=bookings)):
+        start = hour + timedelta(seconds=rng.randrange(3600))
+        minutes = booking_duration(rng)
+        rows.append((
+            rng.randint(1, slots), workload_user(rng, users), f"W{i}", start.isoformat(),
+            (start + timedelta(minutes=minutes)).isoformat(),
+            "expired" if rng.random() < 0.125 else "completed",
+            round(rate * minutes / 60, 2), "paid",
+        ))
+        if len(rows) == 50000:
+            conn.executemany(
+                "INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, "
+                "status, amount_paid, payment_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            rows = []
+    conn.executemany(
+        "INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, "
+        "status, amount_paid, payment_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return users
+
+
+def database_size(db_path):
+    """Bytes on disk, write-ahead log included"""
+    return sum(
+        os.path.getsize(path) for path in (db_path, db_path + "-wal") if os.path.exists(path)
+    )
+
+
+# The workload's operations and their relative frequency: kiosks checking
+# availability, booking and releasing, looking up their bookings, and the
+# admin screen's statistics (update_stats) and bookings list
+WORKLOAD_MIX = [
+    (25, "get_available_slots"),
+    (20, "book_slot"),
+    (15, "release_slot"),
+    (15, "get_user_bookings"),
+    (10, "get_dashboard_stats"),
+    (10, "get_all_bookings"),
+    (5, "check_expired_bookings"),
+]
+
+
+def replay(system, rng, interval, deadline, users, samples, errors):
+    """Run WORKLOAD_MIX operations every interval seconds until deadline.
+
+    Latencies are measured from when an operation was due, not when it
+    started, so a system falling behind the target rate shows up in the
+    percentiles instead of silently lowering the load. interval 0 runs
+    operations back to back. As at a kiosk, book_slot includes picking a
+    free slot and release_slot looking up the booking to release; with
+    nothing to release it counts as a get_user_bookings. Operations the
+    system does not offer (a RemoteParkingSystem leaves expiry to the
+    server) are left out of the mix.
+    """
+    mix = [(weight, name) for weight, name in WORKLOAD_MIX if hasattr(system, name)]
+    names = [name for _, name in mix]
+    weights = [weight for weight, _ in mix]
+    booked = deque()  # Users this thread booked for, oldest first
+    due = time.perf_counter() + rng.random() * interval
+    while due < deadline:
+        if interval:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            due = time.perf_counter()
+        name = rng.choices(names, weights)[0]
+        user = workload_user(rng, users)
+        ok = True
+        try:
+            if name == "get_available_slots":
+                system.get_available_slots()
+            elif name == "book_slot":
+                # Spread threads over the first few free slots, like people
+                # picking from the grid
+                free = system.get_available_slots()[:8]
+                ok = bool(free) and system.book_slot(
+                    rng.choice(free), user, f"V{rng.randrange(10 ** 6)}", booking_duration(rng)
+                )[0]
+                if ok:
+                    booked.append(user)
+            elif name == "release_slot":
+                active = system.get_user_bookings(booked.popleft()) if booked else []
+                if active:
+                    ok = system.release_slot(active[0].booking_id)[0]
+                else:
+                    name = "get_user_bookings"
+            elif name == "get_user_bookings":
+                system.get_user_bookings(user)
+            elif name == "get_dashboard_stats":
+                system.get_dashboard_stats()
+            elif name == "get_all_bookings":
+                system.get_all_bookings(None, None, parking_engine.CONFIG['admin_page_size'])
+            else:
+                system.check_expired_bookings()
+        except Exception:
+            ok = False
+        samples.setdefault(name, []).append(time.perf_counter() - due)
+        if not ok:
+            errors[name] = errors.get(name, 0) + 1
+        due += interval
+
+
+def replay_process(target, threads, rate, duration, users, seed):
+    """Replay the workload from threads threads sharing one ParkingSystem.
+
+    target is a database path, or a server URL to replay through a
+    RemoteParkingSystem. rate is this process's share of the target, in
+    operations per second (0 for as fast as possible). Returns
+    ({operation: latencies}, {operation: failures}).
+    """
+    with quiet():
+        if target.startswith("http://"):
+            system = parking_engine.RemoteParkingSystem(target)
+            # The admin calls in the mix need a token; the scratch database has the default admin
+            system.authenticate_admin("admin", "admin123")
+        else:
+            system = parking_engine.ParkingSystem(target, expiry_checker=False, payment_workers=0)
+    samples, errors = {}, {}
+    per_thread = [({}, {}) for _ in range(threads)]
+    interval = threads / rate if rate else 0
+    deadline = time.perf_counter() + duration
+    workers = [
+        threading.Thread(target=replay, args=(
+            system, random.Random(seed * 1000 + i), interval, deadline, users, *per_thread[i]
+        ))
+        for i in range(threads)
+    ]
+    with quiet():
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        system.close()
+    for thread_samples, thread_errors in per_thread:
+        for name, latencies in thread_samples.items():
+            samples.setdefault(name, []).extend(latencies)
+        for name, count in thread_errors.items():
+            errors[name] = errors.get(name, 0) + count
+    return samples, errors
+
+
+def git_revision():
+    """The checked-out commit, with '+dirty' for uncommitted changes, or None"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+dirty" if dirty else "")
+
+
+def bench_workload(args):
+    """Mixed kiosk and admin traffic at a target rate, with machine-readable results.
+
+    One process drives a ParkingSystem directly. Several can't share a
+    database file that way (each would keep its own slot index), so they
+    replay through a parking server in a subprocess, like a row of kiosks.
+    """
+    processes = max(1, args.processes)
+    with scratch_database() as db_path:
+        started = time.perf_counter()
+        users = seed_workload(db_path, args.garage, args.bookings, seed=args.seed)
+        seeded = time.perf_counter() - started
+        size_before = database_size(db_path)
+        server = None
+        target = db_path
+        if processes > 1:
+            server, port = start_server(db_path)
+            target = f"http://127.0.0.1:{port}"
+        work = [
+            (target, args.threads, args.rate / processes, args.duration, users, args.seed + i)
+            for i in range(processes)
+        ]
+        started = time.perf_counter()
+        try:
+            if processes == 1:
+                results = [replay_process(*work[0])]
+            else:
+                with multiprocessing.get_context("spawn").Pool(processes) as pool:
+                    results = pool.starmap(replay_process, work)
+        finally:
+            elapsed = time.perf_counter() - started
+            if server:
+                server.terminate()
+                server.wait()
+        size_after = database_size(db_path)
+
+    samples, errors = {}, {}
+    for process_samples, process_errors in results:
+        for name, latencies in process_samples.items():
+            samples.setdefault(name, []).extend(latencies)
+        for name, count in process_errors.items():
+            errors[name] = errors.get(name, 0) + count
+    total = sum(len(latencies) for latencies in samples.values())
+    report = {
+        "benchmark": "workload",
+        "revision": git_revision(),
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "parameters": {
+            "slots": args.garage, "bookings": args.bookings, "rate": args.rate,
+            "duration_s": args.duration, "processes": processes, "threads": args.threads,
+            "via_server": server is not None,
+            "seed": args.seed,
+        },
+        "seed_s": seeded,
+        "elapsed_s": elapsed,
+        "throughput": total / elapsed,
+        "db_size_bytes": {"before": size_before, "after": size_after},
+        "operations": {
+            name: {
+                "count": len(latencies),
+                "errors": errors.get(name, 0),
+                "throughput": len(latencies) / elapsed,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "max_ms": max(latencies) * 1000,
+            }
+            for name, latencies in sorted(samples.items())
+        },
+    }
+
+    target = f"{args.rate:.0f} ops/sec target" if args.rate else "unthrottled"
+    print(f"{args.garage} slots, {args.bookings} historical bookings (seeded in {seeded:.1f} s); "
+          f"{processes} x {args.threads} threads for {args.duration:.0f} s, {target}")
+    print(f"  {total / elapsed:.1f} ops/sec achieved; database {size_before / 2**20:.1f} MiB "
+          f"-> {size_after / 2**20:.1f} MiB")
+    print(f"  {'':24} {'count':>7} {'errors':>6} {'ops/sec':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in report["operations"].items():
+        print(f"  {name:24} {stats['count']:7d} {stats['errors']:6d} {stats['throughput']:8.1f} "
+              f"{stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+def booking_churn(system, threads, duration):
+    """Book and release from threads threads, each on its own slot, for duration seconds.
+
+    Returns (successful calls, latencies in seconds).
+    """
+    per_thread = [[] for _ in range(threads)]
+    deadline = time.perf_counter() + duration
+
+    def churn(number):
+        latencies = per_thread[number]
+        user = f"churn{number}"
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            success, _ = system.book_slot(number + 1, user, "CHURN", 1)
+            latencies.append(time.perf_counter() - started)
+            if not success:
+                continue
+            for booking in system.get_user_bookings(user):
+                started = time.perf_counter()
+                system.release_slot(booking.booking_id)
+                latencies.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=churn, args=(number,)) for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    latencies = [latency for thread_latencies in per_thread for latency in thread_latencies]
+    return len(latencies), latencies
+
+
+def journal_burst(db_path, durability, threads, acks):
+    """Book and release until killed, sending every acknowledged change down the acks pipe"""
+    with quiet():
+        system = parking_engine.JournaledParkingSystem(
+            db_path, durability=durability, expiry_checker=False, payment_workers=0
+        )
+    lock = threading.Lock()
+
+    def burst(number):
+        for n in itertools.count():
+            token = f"burst{number}-{n}"
+            success, _ = system.book_slot(number + 1, token, token)
+            if not success:
+                continue
+            with lock:
+                acks.send(("book", token))
+            for booking in system.get_user_bookings(token):
+                if system.release_slot(booking.booking_id)[0]:
+                    with lock:
+                        acks.send(("release", token))
+
+    workers = [threading.Thread(target=burst, args=(number,), daemon=True) for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def journal_crash_round(db_path, durability, threads, rng):
+    """Kill a journaled burst with SIGKILL, reopen, and count acknowledged changes that were lost"""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=journal_burst, args=(db_path, durability, threads, sender))
+    process.start()
+    sender.close()
+    if not receiver.poll(30):
+        process.kill()
+        raise RuntimeError("the journaled burst acknowledged nothing")
+    acks = [receiver.recv()]
+    kill_at = time.perf_counter() + rng.uniform(0.2, 1.0)
+    while time.perf_counter() < kill_at:
+        acks.append(receiver.recv())
+    process.kill()
+    process.join()
+    # Acknowledgements already in the pipe were made before the kill
+    while True:
+        try:
+            acks.append(receiver.recv())
+        except EOFError:
+            break
+
+    with quiet():
+        system = parking_engine.JournaledParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+    conn = sqlite3.connect(db_path)
+    status = dict(conn.execute("SELECT user_id, status FROM bookings WHERE user_id LIKE 'burst%'"))
+    conn.close()
+    lost = sum(
+        1 for change, token in acks
+        if status.get(token) is None or (change == "release" and status[token] != "completed")
+    )
+    consistent = not system.check_slot_index() and not system.check_stats()
+    with quiet():
+        # Free the slots the killed burst left booked, for the next round
+        system.release_bookings_bulk([
+            booking.booking_id for booking in system.get_all_bookings({'status': 'active'})
+        ])
+        system.close()
+    return len(acks), lost, consistent
+
+
+def bench_journal(args):
+    """Booking throughput with direct commits against the journaled engine, and crash recovery"""
+    threads = args.threads
+    runs = [
+        ("direct commit, synchronous=NORMAL", "NORMAL", None),
+        ("direct commit, synchronous=FULL", "FULL", None),
+        ("journal, durability=fsync", "NORMAL", "fsync"),
+        ("journal, durability=window", "NORMAL", "window"),
+    ]
+    synchronous = parking_engine.CONFIG['database_pool']['synchronous']
+    results = []
+    try:
+        for label, mode, durability in runs:
+            parking_engine.CONFIG['database_pool']['synchronous'] = mode
+            with scratch_database(threads) as db_path, quiet():
+                if durability:
+                    system = parking_engine.JournaledParkingSystem(
+                        db_path, durability=durability, expiry_checker=False, payment_workers=0
+                    )
+                else:
+                    system = parking_engine.ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+                calls, latencies = booking_churn(system, threads, args.duration)
+                commits = system.journal_metrics()["group_commits"] if durability else calls
+                system.close()
+            results.append((label, calls, latencies, commits))
+    finally:
+        parking_engine.CONFIG['database_pool']['synchronous'] = synchronous
+
+    print(f"{threads} threads booking and releasing for {args.duration:.0f} s each")
+    for label, calls, latencies, commits in results:
+        print(f"  {label:36} {calls / args.duration:9.1f} calls/sec  "
+              f"p50 {percentile(latencies, 50) * 1000:6.2f} ms  p99 {percentile(latencies, 99) * 1000:7.2f} ms  "
+              f"{calls / max(commits, 1):6.1f} calls per commit")
+
+    rng = random.Random(args.seed)
+    failed = False
+    print(f"Crash recovery: {args.rounds} SIGKILLs mid-burst per durability setting")
+    for durability in ("fsync", "window"):
+        acknowledged = lost = 0
+        consistent = True
+        with scratch_database(threads) as db_path:
+            for _ in range(args.rounds):
+                acks, round_lost, round_consistent = journal_crash_round(db_path, durability, threads, rng)
+                acknowledged += acks
+                lost += round_lost
+                consistent = consistent and round_consistent
+        # window trades the last commit interval for latency; fsync must lose nothing
+        failed = failed or not consistent or (durability == "fsync" and lost)
+        print(f"  durability={durability:7} {acknowledged:7d} acknowledged changes, {lost} lost, "
+              f"slot index and statistics {'consistent' if consistent else 'INCONSISTENT'} after replay")
+    return 1 if failed else 0
+
+
+def shard_writer(urls, slot_ids, user, start_at, duration):
+    """Book and release slot_ids round robin through a ShardedParkingSystem.
+
+    Starts at the wall-clock time start_at so every writer overlaps, and
+    returns the number of writes (bookings plus releases) made in duration.
+    """
+    with quiet():
+        router = parking_engine.ShardedParkingSystem(urls)
+        time.sleep(max(0.0, start_at - time.time()))
+        writes = 0
+        deadline = time.perf_counter() + duration
+        for slot_id in itertools.cycle(slot_ids):
+            if time.perf_counter() >= deadline:
+                break
+            success, _ = router.book_slot(slot_id, user, "SHARD", 1)
+            if not success:
+                continue
+            # The owning shard alone: a fan-out read would grow with the shard count
+            for booking in router.shard(slot_id).get_user_bookings(user):
+                writes += 1 + router.release_slot(booking.booking_id)[0]
+        router.close()
+    return writes
+
+
+def bench_shards(args):
+    """Write throughput of a sharded garage by shard count, one worker process per shard"""
+    most = max(1, args.shards)
+    counts = sorted({1, most} | {2 ** i for i in range(most.bit_length()) if 2 ** i <= most})
+    writers = max(1, args.processes)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in counts:
+            sites = [{"name": f"bench{count}-{n}", "database": os.path.join(tmp, f"shard{count}-{n}.db")}
+                     for n in range(count)]
+            with quiet_processes():
+                workers = parking_engine.ShardWorkers(sites, base_port=0)
+                urls = workers.start()
+            try:
+                # Every shard is seeded with 20 slots; its writers split them
+                work = []
+                for n in range(count):
+                    first = n * parking_engine.CONFIG['shards']['id_block'] + 1
+                    for w in range(writers):
+                        work.append((urls, list(range(first + w, first + 20, writers)),
+                                     f"writer{n}-{w}", 0, args.duration))
+                with multiprocessing.get_context("spawn").Pool(len(work)) as pool:
+                    # Start once every writer process is up
+                    start_at = time.time() + 1 + 0.2 * len(work)
+                    work = [item[:3] + (start_at,) + item[4:] for item in work]
+                    writes = sum(pool.starmap(shard_writer, work))
+            finally:
+                workers.stop()
+            results.append((count, writes / args.duration))
+
+    print(f"{writers} writer process(es) per shard, {args.duration:.0f} s per run, "
+          f"{os.cpu_count()} CPU(s)")
+    base = results[0][1]
+    for count, rate in results:
+        print(f"  {count:3d} shard(s)  {rate:10.1f} writes/sec  {rate / base:5.2f}x  "
+              f"({rate / base / count * 100:5.1f}% of linear)")
+    if most > (os.cpu_count() or 1):
+        print("  More shards than CPUs: scaling flattens once every core is busy")
+
+
+def bench_booking_cache(args):
+    """Kiosk refreshes and gate plate lookups with the booking cache off, on and undersized"""
+    rng = random.Random(args.seed)
+    settings = parking_engine.CONFIG['booking_cache']
+    lookups = args.rounds * 1000
+    small = max(1, args.garage // 4)
+    runs = [("off", 0), ("on", settings['max_entries']), (f"{small} entries", small)]
+    results = []
+    with scratch_database(args.garage) as db_path:
+        seed_history(db_path, args.bookings, args.garage)
+        with quiet():
+            for label, max_entries in runs:
+                settings['max_entries'] = max_entries
+                system = parking_engine.ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+                active = system.get_all_bookings({'status': 'active'})
+                system.release_bookings_bulk(active.column('booking_id'))
+                # Four fifths of the garage parked by a thousand regulars
+                plates = []
+                for slot_id in system.first_available_slots(args.garage * 4 // 5):
+                    plates.append(f"G{len(plates)}")
+                    system.book_slot(slot_id, f"user{rng.randrange(1000)}", plates[-1])
+                samples = {"get_user_bookings": [], "find_active_booking_by_vehicle": []}
+                for i in range(lookups):
+                    if i % 50 == 0:
+                        # A car leaves and another takes its slot
+                        leaving = plates.pop(rng.randrange(len(plates)))
+                        booking = system.find_active_booking_by_vehicle(leaving)
+                        system.release_slot(booking.booking_id)
+                        plates.append(f"G{i}-{len(plates)}")
+                        system.book_slot(booking.slot_id, f"user{rng.randrange(1000)}", plates[-1])
+                    if rng.random() < 0.5:
+                        # One car in ten at the gate has no booking
+                        plate = rng.choice(plates) if rng.random() < 0.9 else f"X{i}"
+                        started = time.perf_counter()
+                        system.find_active_booking_by_vehicle(plate)
+                        samples["find_active_booking_by_vehicle"].append(time.perf_counter() - started)
+                    else:
+                        user_id = f"user{rng.randrange(1000)}"
+                        started = time.perf_counter()
+                        system.get_user_bookings(user_id)
+                        samples["get_user_bookings"].append(time.perf_counter() - started)
+                # Every cached answer must match the tables
+                stale = sum(
+                    list(system.get_vehicle_bookings(plate)) != system.fetch('vehicle_bookings', (plate,))
+                    for plate in plates
+                ) + sum(
+                    list(system.get_user_bookings(f"user{u}")) != system.fetch('user_bookings', (f"user{u}",))
+                    for u in range(1000)
+                )
+                results.append((label, samples, system.booking_cache.stats(), stale))
+                system.close()
+
+    print(f"{lookups} lookups over {len(plates)} active bookings and {args.bookings} finished ones; "
+          f"a car leaves and another arrives every 50 lookups")
+    print(f"  {'cache':14} {'call':32} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, samples, stats, stale in results:
+        for call, times in samples.items():
+            print(f"  {label:14} {call:32} "
+                  f"{percentile(times, 50) * 1000:8.3f} {percentile(times, 99) * 1000:8.3f}")
+        if stats['max_entries']:
+            print(f"  {'':14} hit ratio {stats['hit_ratio']:.1%}, {stats['evictions']} evictions, "
+                  f"{stats['invalidations']} invalidations, {stale} stale answers")
+        else:
+            print(f"  {'':14} {stale} stale answers")
+
+
+def bench_compare(args):
+    """Compare two workload result files; fails when the second regressed"""
+    if len(args.files) != 2:
+        print("compare needs two result files: baseline.json candidate.json")
+        return 2
+    with open(args.files[0]) as f:
+        baseline = json.load(f)
+    with open(args.files[1]) as f:
+        candidate = json.load(f)
+    if baseline["parameters"] != candidate["parameters"]:
+        print("Warning: the runs used different parameters")
+    print(f"{baseline.get('revision')} -> {candidate.get('revision')}, "
+          f"regression threshold {args.threshold:.0f}%")
+
+    def change(before, after):
+        return (after - before) / before * 100 if before else 0.0
+
+    regressions = []
+    rows = [("throughput", baseline["throughput"], candidate["throughput"], True)]
+    for name, before in baseline["operations"].items():
+        after = candidate["operations"].get(name)
+        if after is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            rows.append((f"{name} {key[:3]}", before[key], after[key], False))
+    for label, before, after, higher_is_better in rows:
+        delta = change(before, after)
+        worse = -delta if higher_is_better else delta
+        flag = "  REGRESSION" if worse > args.threshold else ""
+        if flag:
+            regressions.append(label)
+        print(f"  {label:32} {before:10.2f} {after:10.2f} {delta:+8.1f}%{flag}")
+    return 1 if regressions else 0
+
+
+# Run in a fresh interpreter: import the engine, open a ParkingSystem, read
+# once and close, timing each step
+STARTUP_SCRIPT = """
+import sys, time
+started = time.perf_counter()
+import parking_engine
+imported = time.perf_counter()
+system = parking_engine.ParkingSystem(sys.argv[1], expiry_checker=False, payment_workers=0)
+system.get_available_slots()
+system.close()
+print(imported - started, time.perf_counter() - imported,
+      int("tkinter" in sys.modules), int("asyncio" in sys.modules))
+"""
+
+
+def bench_startup(args):
+    """Cold start of a headless worker: import and open time against a budget, with no Tk"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(PARKING_SCRIPT))
+    with scratch_database() as db_path:
+        empty = os.path.join(os.path.dirname(db_path), "empty")
+        os.mkdir(empty)
+        # Importing must not create or touch anything
+        subprocess.run([sys.executable, "-c", "import parking_engine"], cwd=empty, env=env, check=True)
+        side_effects = os.listdir(empty)
+
+        interpreter, imports, opens, walls = [], [], [], []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+            interpreter.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, db_path], cwd=empty, env=env,
+                                    capture_output=True, text=True, check=True).stdout.split()
+            walls.append(time.perf_counter() - started)
+            imports.append(float(output[0]))
+            opens.append(float(output[1]))
+            tk_loaded, asyncio_loaded = int(output[2]), int(output[3])
+
+        profile = subprocess.run([sys.executable, "-X", "importtime", "-c", "import parking_engine"],
+                                 cwd=empty, env=env, capture_output=True, text=True, check=True).stderr
+        tk_import = subprocess.run([sys.executable, "-X", "importtime", "-c", "import tkinter.ttk"],
+                                   capture_output=True, text=True, check=True).stderr
+
+    def cumulative_us(line):
+        return int(line.split("|")[1])
+
+    modules = [line for line in profile.splitlines() if line.startswith("import time:") and "|" in line[12:]
+               and line.split("|")[1].strip().isdigit()]
+    heaviest = sorted(modules, key=lambda line: -int(line.split("|")[0].split(":")[1]))[:8]
+    tk_lines = [line for line in tk_import.splitlines() if line.rstrip().endswith("| tkinter.ttk")]
+    startup = percentile([i + o for i, o in zip(imports, opens)], 50)
+    within = startup * 1000 <= args.budget_ms
+
+    print(f"Headless worker cold start, median of {args.rounds} runs")
+    print(f"  interpreter alone            {percentile(interpreter, 50) * 1000:7.1f} ms")
+    print(f"  import parking_engine        {percentile(imports, 50) * 1000:7.1f} ms")
+    print(f"  open, first read and close   {percentile(opens, 50) * 1000:7.1f} ms")
+    print(f"  whole process                {percentile(walls, 50) * 1000:7.1f} ms")
+    print(f"  import + open {startup * 1000:.1f} ms against a budget of {args.budget_ms:.0f} ms: "
+          f"{'ok' if within else 'OVER BUDGET'}")
+    print(f"  tkinter loaded: {'yes' if tk_loaded else 'no'} "
+          f"(importing it costs {cumulative_us(tk_lines[0]) / 1000 if tk_lines else 0:.1f} ms); "
+          f"asyncio loaded: {'yes' if asyncio_loaded else 'no'}; "
+          f"files created by importing: {side_effects or 'none'}")
+    print("  heaviest imports (self time):")
+    for line in heaviest:
+        own, total, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        print(f"    {name:32} {int(own) / 1000:6.1f} ms  ({int(total) / 1000:.1f} ms with its imports)")
+    return 0 if within and not tk_loaded and not side_effects else 1
+
+
+BENCHMARKS = {
+    "booking-contention": bench_booking_contention,
+    "read-write-mix": bench_read_write_mix,
+    "expiry-sweep": bench_expiry_sweep,
+    "slot-lookup": bench_slot_lookup,
+    "slot-grid": bench_slot_grid,
+    "ui-stalls": bench_ui_stalls,
+    "http-load": bench_http_load,
+    "bulk-booking": bench_bulk_booking,
+    "tariff": bench_tariff,
+    "payment-outbox": bench_payment_outbox,
+    "reservations": bench_reservations,
+    "export": bench_export,
+    "archive": bench_archive,
+    "metrics": bench_metrics,
+    "records": bench_records,
+    "workload": bench_workload,
+    "shards": bench_shards,
+    "journal": bench_journal,
+    "booking-cache": bench_booking_cache,
+    "compare": bench_compare,
+    "startup": bench_startup,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--bookings", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--payments", type=int, default=200)
+    parser.add_argument("--latency-ms", type=int, default=200)
+    parser.add_argument("--history", type=int, default=1000000,
+                        help="historical bookings for the archive benchmark (10000000 for the full run)")
+    parser.add_argument("--garage", type=int, default=500, help="slots in the workload garage")
+    parser.add_argument("--rate", type=float, default=200,
+                        help="workload operations per second across all threads; 0 for as fast as possible")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of workload")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="processes replaying the workload, each with --threads threads")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1,
+                        help="most shards for the shards benchmark (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--output", metavar="FILE", help="write the workload results to FILE as JSON")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="percent slower that compare reports as a regression")
+    parser.add_argument("--budget-ms", type=float, default=100,
+                        help="most a headless worker may take to import the engine and open it")
+    parser.add_argument("files", nargs="*", help="the two result files for compare")
+    args = parser.parse_args()
+    sys.exit(BENCHMARKS[args.benchmark](args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Parking slot booking engine.
+
+Importing the package does no I/O: nothing opens or migrates a database
+until initialize_database() or open_parking_system() is called. The Tk
+windows, the HTTP server, the thin client, the journaled engine and the
+shard router are imported on first use of one of their names, so a
+headless worker never loads tkinter or asyncio.
+"""
+
+import importlib
+
+from .config import CONFIG
+from .schema import SCHEMA_VERSION, get_schema_version, initialize_database, migrate
+from .records import Booking, BookingTable, Reservation, Slot, epoch_iso, epoch_micros
+from .queries import EXPORT_COLUMNS, NAMED_QUERIES, find_full_scans, hot_query_plans
+from .metrics import Metrics
+from .pool import ConnectionPool
+from .pricing import PaymentService, Tariff, tariff_minutes
+from .payments import FakeGateway, LocalGateway, PaymentError, PaymentOutbox
+from .changes import ChangeBus, change_touches
+from .export import EXPORT_WRITERS, export_bookings, iter_export_batches
+from .system import (
+    BulkItem, BulkResult, ExpirySweep, ParkingSystem, ReservationResult, open_parking_system
+)
+
+# name -> submodule, imported when the name is first looked up
+_LAZY = {
+    'ParkingServer': 'server',
+    'APIError': 'server',
+    'RemoteParkingSystem': 'remote',
+    'JournaledParkingSystem': 'journal',
+    'BookingJournal': 'journal',
+    'ShardedParkingSystem': 'shards',
+    'ShardWorkers': 'shards',
+    'initialize_shard': 'shards',
+    'shard_of': 'shards',
+    'ParkingApp': 'gui',
+    'AdminInterface': 'gui',
+    'UIExecutor': 'gui',
+    'StallMonitor': 'gui',
+    'SlotGrid': 'gui',
+    'VirtualSlotGrid': 'gui',
+    'run_kiosk': 'gui',
+    'main': 'cli',
+}
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,7 @@
+"""``python -m parking_engine``: the same commands as parking.py"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,54 @@
+"""Change notifications published after every commit"""
+
+import logging
+import threading
+from collections import namedtuple
+
+# One change_log entry. entity is 'slot', 'booking', or CHANGE_RESYNC when
+# changes may have been missed and everything should be reloaded.
+Change = namedtuple('Change', ['seq', 'entity', 'entity_id', 'status'])
+
+CHANGE_RESYNC = '*'
+
+log = logging.getLogger(__name__)
+
+class ChangeBus:
+    """In-process publish/subscribe for committed changes.
+
+    Subscribers are called with a list of Change records in seq order, on
+    the thread that committed them, so they should only hand the work off
+    (for example to UIExecutor.call_soon). Nothing runs while nothing changes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.next_token = 0
+        self.published = 0
+    
+    def subscribe(self, callback):
+        """Register callback; returns a token for unsubscribe"""
+        with self.lock:
+            self.next_token += 1
+            self.subscribers[self.next_token] = callback
+            return self.next_token
+    
+    def unsubscribe(self, token):
+        with self.lock:
+            self.subscribers.pop(token, None)
+    
+    def has_subscribers(self):
+        return bool(self.subscribers)
+    
+    def publish(self, changes):
+        with self.lock:
+            subscribers = list(self.subscribers.values())
+            self.published += len(changes)
+        for callback in subscribers:
+            try:
+                callback(changes)
+            except Exception:
+                log.exception("Change subscriber failed")
+
+def change_touches(changes, entity):
+    """True if any change is about entity ('slot', 'booking' or 'reservation')"""
+    return any(change.entity in (entity, CHANGE_RESYNC) for change in changes)
@@ -0,0 +1,239 @@
+"""Command line entry point: the kiosk, the server and maintenance commands.
+
+Tk, the HTTP server and the thin client are imported only by the commands
+that use them, so a maintenance command starts as fast as a headless worker.
+"""
+
+import os
+import sqlite3
+import signal
+import sys
+import argparse
+import getpass
+import json
+import logging
+
+from .config import CONFIG
+from .schema import initialize_database, SCHEMA_VERSION
+from .queries import EXPORT_COLUMNS, find_full_scans
+from .system import ParkingSystem, open_parking_system
+from .export import EXPORT_WRITERS, export_bookings
+
+def remote_admin(args):
+    """A RemoteParkingSystem on args.server logged in as --admin-user, or None if refused.
+
+    The password comes from PARKING_ADMIN_PASSWORD, else from a prompt.
+    """
+    from .remote import RemoteParkingSystem
+    remote = RemoteParkingSystem(args.server)
+    password = os.environ.get('PARKING_ADMIN_PASSWORD')
+    if password is None:
+        password = getpass.getpass(f"Admin password for {args.admin_user}: ")
+    try:
+        authenticated = remote.authenticate_admin(args.admin_user, password)
+    except RuntimeError as e:
+        print(f"Admin login failed: {e}", file=sys.stderr)
+        authenticated = False
+    if not authenticated:
+        print("Admin login refused", file=sys.stderr)
+        remote.close()
+        return None
+    return remote
+
+def run_export_command(args):
+    # With --server the rows are paged from the server instead of the database
+    if args.server:
+        parking_system = remote_admin(args)
+        if parking_system is None:
+            return 1
+    else:
+        parking_system = open_parking_system(args.database, expiry_checker=False, payment_workers=0)
+    filters = {
+        key: getattr(args, key) for key in ('status', 'date_from', 'date_to', 'slot_id', 'user_id')
+        if getattr(args, key) is not None
+    }
+    columns = args.columns.split(",") if args.columns else None
+    
+    def progress(done, total):
+        sys.stderr.write(f"\rExported {done:,} of {total:,} bookings")
+        sys.stderr.flush()
+    
+    try:
+        written = export_bookings(parking_system, args.output, args.format, columns, filters,
+                                  progress=progress)
+    except (ValueError, RuntimeError) as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        parking_system.close()
+    sys.stderr.write("\n")
+    print(f"Exported {written} bookings to {args.output}")
+    return 0
+
+def run_shards_command(args):
+    # The shard databases are migrated by their own workers; --database is not used
+    from .shards import ShardWorkers
+    if args.shard:
+        sites = []
+        for spec in args.shard:
+            name, _, database = spec.partition("=")
+            if not name or not database:
+                print(f"Bad --shard {spec!r}: expected NAME=DATABASE", file=sys.stderr)
+                return 2
+            sites.append({"name": name, "database": database})
+    else:
+        sites = CONFIG['shards']['sites']
+    if not sites:
+        print("No shards: pass --shard NAME=DATABASE or set CONFIG['shards']['sites']", file=sys.stderr)
+        return 2
+    
+    workers = ShardWorkers(sites, args.host, args.base_port)
+    try:
+        urls = workers.start()
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for site, url in zip(sites, urls):
+        print(f"{site['name']}: {site['database']} on {url}")
+    # SIGTERM unwinds like Ctrl-C so the workers are stopped too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        workers.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        workers.stop()
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parking Slot Booking System")
+    parser.add_argument("--database", help="SQLite database file (default: %(default)s)",
+                        default=CONFIG['database'])
+    parser.add_argument("--server", metavar="URL",
+                        help="run the kiosk as a thin client of a parking server, e.g. http://host:8080")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="profile the run and write the metrics to FILE on exit "
+                             "(JSON for .json, otherwise Prometheus text)")
+    parser.add_argument("--admin-user", default="admin",
+                        help="admin account for commands that read a server's admin API "
+                             "(password from PARKING_ADMIN_PASSWORD or a prompt)")
+    parser.add_argument("--journal", action="store_true",
+                        help="book and release in memory behind a group-committed journal "
+                             "(see CONFIG['journal'])")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("init", help="create the database or bring its schema up to date; safe to rerun")
+    serve = commands.add_parser("serve", help="run the headless HTTP/JSON booking server")
+    serve.add_argument("--host", default=CONFIG['server']['host'])
+    serve.add_argument("--port", type=int, default=CONFIG['server']['port'])
+    shards = commands.add_parser("shards", help="serve every shard of a sharded garage from its own process")
+    shards.add_argument("--shard", action="append", metavar="NAME=DATABASE",
+                        help="a shard, in id order; repeat for each (default: CONFIG['shards']['sites'])")
+    shards.add_argument("--host", default=CONFIG['server']['host'])
+    shards.add_argument("--base-port", type=int, default=CONFIG['shards']['base_port'],
+                        help="shard n listens on this port + n (default: %(default)s)")
+    commands.add_parser("check-plans", help="fail if a hot query falls back to a full table scan")
+    commands.add_parser("rebuild-stats", help="recompute the dashboard statistics from scratch")
+    commands.add_parser("check-stats", help="compare the dashboard statistics with the raw bookings")
+    metrics = commands.add_parser("metrics", help="print a running server's metrics (needs --server)")
+    metrics.add_argument("--json", action="store_true", help="the JSON dump instead of Prometheus text")
+    archive = commands.add_parser("archive", help="move old finished bookings into monthly archive tables")
+    archive.add_argument("--older-than-days", type=int, default=CONFIG['archive']['after_days'])
+    archive.add_argument("--batch-size", type=int, default=CONFIG['archive']['batch_size'])
+    archive.add_argument("--max-batches", type=int, help="stop after this many batches; rerun to resume")
+    export = commands.add_parser("export", help="stream the bookings history to a CSV or Parquet file")
+    export.add_argument("output", help="file to write; the format follows its extension")
+    export.add_argument("--format", choices=sorted(EXPORT_WRITERS))
+    export.add_argument("--columns", help=f"comma-separated subset of: {','.join(EXPORT_COLUMNS)}")
+    export.add_argument("--status")
+    export.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD")
+    export.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD")
+    export.add_argument("--slot", dest="slot_id", type=int)
+    export.add_argument("--user", dest="user_id")
+    args = parser.parse_args(argv)
+    # Background threads report their errors through logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+    if args.journal:
+        CONFIG['journal']['enabled'] = True
+    if args.metrics:
+        CONFIG['metrics']['enabled'] = True
+        CONFIG['metrics']['dump_path'] = args.metrics
+    
+    if args.command is None:
+        from .gui import run_kiosk
+        CONFIG['database'] = args.database
+        if args.server:
+            from .remote import RemoteParkingSystem
+            run_kiosk(RemoteParkingSystem(args.server))
+        else:
+            run_kiosk(open_parking_system(args.database))
+        return 0
+    
+    if args.command == "export":
+        return run_export_command(args)
+    
+    if args.command == "shards":
+        return run_shards_command(args)
+    
+    if args.command == "metrics":
+        if not args.server:
+            print("metrics reads a running server; pass --server URL", file=sys.stderr)
+            return 2
+        from .remote import RemoteParkingSystem
+        # The Prometheus text is public; the JSON dump is an admin route
+        remote = remote_admin(args) if args.json else RemoteParkingSystem(args.server)
+        if remote is None:
+            return 1
+        try:
+            if args.json:
+                print(json.dumps(remote.get_server_metrics(), indent=2))
+            else:
+                print(remote.get_server_metrics(prometheus=True), end="")
+        finally:
+            remote.close()
+        return 0
+    
+    applied = initialize_database(args.database)
+    if args.command == "init":
+        print(f"{args.database}: schema version {SCHEMA_VERSION}"
+              + (f", applied {', '.join(map(str, applied))}" if applied else ", already up to date"))
+        return 0
+    
+    if args.command == "check-plans":
+        conn = sqlite3.connect(args.database)
+        offenders = find_full_scans(conn)
+        conn.close()
+        for name, scans in offenders.items():
+            print(f"{name}: {'; '.join(scans)}")
+        return 1 if offenders else 0
+    
+    if args.command == "serve":
+        import asyncio
+        from .server import ParkingServer
+        parking_system = open_parking_system(args.database)
+        try:
+            asyncio.run(ParkingServer(parking_system, args.host, args.port).serve())
+        finally:
+            parking_system.close()
+        return 0
+    
+    parking_system = ParkingSystem(args.database, expiry_checker=False, payment_workers=0)
+    try:
+        if args.command == "rebuild-stats":
+            parking_system.rebuild_stats()
+            print("Statistics rebuilt")
+            return 0
+        if args.command == "archive":
+            moved = parking_system.archive_bookings(
+                args.older_than_days, args.batch_size, args.max_batches,
+                progress=lambda moved: print(f"Archived {moved} bookings", end="\r", flush=True)
+            )
+            print(f"Archived {moved} bookings")
+            for month, table, rows in parking_system.get_archive_summary():
+                print(f"  {month}: {rows} in {table}")
+            return 0
+        mismatches = parking_system.check_stats()
+        for what, rollup, raw in mismatches:
+            print(f"{what}: rollup {rollup}, bookings {raw}")
+        return 1 if mismatches else 0
+    finally:
+        parking_system.close()
@@ -0,0 +1,100 @@
+"""Settings for the parking engine; change CONFIG before opening a ParkingSystem"""
+
+# Configuration
+CONFIG = {
+    "pricing": {
+        "hourly_rate": 5.00,
+        "currency": "$",
+        "tariff": {
+            "version": 1,              # Bump after changing anything below
+            "grace_minutes": 0,        # Stays this short are free
+            "daily_cap": None,         # Most charged per calendar day
+            "weekend_multiplier": 1.0,
+            "bands": [],               # [start_hour, end_hour, multiplier] every day; [22, 6] runs past midnight
+            "vehicle_types": {}        # vehicle_type -> multiplier
+        }
+    },
+    "expiry_batch_size": 1000,    # Bookings expired per sweep transaction
+    "admin_page_size": 200,       # Bookings fetched per admin grid page
+    "ui": {
+        "workers": 2,              # Threads running database calls for the UI
+        "poll_ms": 20,             # How often Tk collects their results
+        "stall_sample_ms": 50      # Main-thread stall sampling interval
+    },
+    "slot_grid": {
+        "columns": 5,
+        "virtual_threshold": 1000  # Draw on the canvas above this many slots
+    },
+    "server": {
+        "host": "127.0.0.1",
+        "port": 8080,
+        "readers": 4,              # Threads serving read requests
+        "pipeline_depth": 32,      # Requests in flight per connection
+        "backlog": 1024,           # Pending connections the listener queues
+        "admin_token_ttl_s": 28800, # An admin login is good for this long
+        "login_attempts": 5,       # Failed logins within login_lockout_s that lock a username out
+        "login_lockout_s": 300     # Seconds a failed login counts against its username
+    },
+    "payments": {
+        "workers": 4,              # Threads settling the payment outbox
+        "batch_size": 10,          # Outbox rows claimed per transaction, capped at lease_s / timeout_s - 1
+        "timeout_s": 10,           # Per charge
+        "max_attempts": 5,
+        "backoff_s": 0.5,          # First retry delay; doubles per attempt
+        "backoff_max_s": 60,
+        "lease_s": 60              # A claimed row is due again after this; must exceed timeout_s
+    },
+    "change_feed": {
+        "retention": 100000,       # Change log entries kept for catching up; applied by initialize_database
+        "long_poll_s": 25,         # Longest a thin client's change request waits
+        "poll_fallback_ms": 5000   # Also re-query on a timer, to see commits from other processes; None relies on notifications
+    },
+    "archive": {
+        "after_days": 90,          # Finished bookings older than this leave the hot table
+        "batch_size": 5000         # Bookings moved per archive transaction
+    },
+    "export": {
+        "batch_size": 5000,        # Rows read per query while exporting
+        "row_group_size": 100000   # Rows per Parquet row group
+    },
+    "reservations": {
+        "lookahead_minutes": 60,   # A slot reserved this soon is not offered as free
+        "check_in_early_minutes": 15,
+        "max_days_ahead": 365
+    },
+    "booking_cache": {
+        "max_entries": 10000,      # Users and plates whose active bookings are cached; 0 turns it off
+        "ttl_s": 30                # Longest an entry is trusted; covers writes by other processes
+    },
+    "metrics": {
+        "enabled": False,          # Profiling is off unless turned on here or with --metrics
+        "slow_query_ms": 50,       # Statements slower than this are logged with their plan
+        "slow_query_log": 100,     # Slow statements kept
+        "vm_step_interval": 1000,  # SQLite VM steps between progress handler calls
+        "dump_path": None          # Write a snapshot here on close (.json, else Prometheus text)
+    },
+    "journal": {
+        "enabled": False,              # Book and release in memory, made durable by the journal
+        "path": None,                  # Segment files are path.000001...; None puts them next to the database
+        "durability": "fsync",         # "fsync" acknowledges after the group commit reaches disk;
+                                       # "window" at once, so a crash can lose one commit interval
+        "commit_interval_ms": 2,       # A group commit waits this long for more writes
+        "checkpoint_interval_ms": 500, # How often the checkpointer writes the journal to the tables
+        "checkpoint_batch": 10000,     # Or sooner, once this many entries are waiting
+        "segment_bytes": 8388608       # Start a new segment file past this size
+    },
+    "database": "parking.db",
+    "shards": {
+        "sites": [],               # {"name": ..., "database": ...} per site or level; append only
+        "base_port": 8101,         # Shard n's worker listens on base_port + n
+        "id_block": 1000000000     # Slot, booking and reservation ids owned by each shard
+    },
+    "database_pool": {
+        "readers": 4,
+        "synchronous": "NORMAL",   # Safe with WAL; FULL fsyncs every commit
+        "cache_size": -16000,      # Negative values are KiB
+        "mmap_size": 268435456,
+        "cached_statements": 256,  # Prepared statements kept per connection
+        "busy_timeout": 5000       # Milliseconds
+    }
+}
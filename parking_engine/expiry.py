@@ -0,0 +1,126 @@
+"""Releases bookings as they end"""
+
+from datetime import datetime
+import logging
+import threading
+import time
+import heapq
+
+log = logging.getLogger(__name__)
+
+class ExpiryScheduler:
+    """Frees slots the moment their bookings end.
+
+    Keeps a min-heap of (end_time, booking_id) for active bookings and sleeps
+    on a condition variable until the earliest one is due, so nothing is
+    queried while no booking is ending. Released bookings are dropped lazily
+    when they reach the top of the heap.
+    """
+    def __init__(self, parking_system):
+        self.parking_system = parking_system
+        self.condition = threading.Condition()
+        self.heap = []
+        self.pending = {}  # booking_id -> deadline of its live heap entry
+        self.shutdown_flag = False
+        self.last_sweep = None
+        self.released_total = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+    
+    def start(self):
+        rows = self.parking_system.execute_query(
+            "SELECT booking_id, end_time FROM bookings WHERE status = 'active'",
+            fetch=True
+        )
+        with self.condition:
+            for booking_id, end_time in rows:
+                self._push(booking_id, datetime.fromisoformat(end_time).timestamp())
+        self.thread.start()
+    
+    def _push(self, booking_id, deadline):
+        self.pending[booking_id] = deadline
+        heapq.heappush(self.heap, (deadline, booking_id))
+    
+    def schedule(self, booking_id, end_time):
+        deadline = end_time.timestamp()
+        with self.condition:
+            self._push(booking_id, deadline)
+            # Only wake the thread if this booking ends before the one it is waiting for
+            if self.heap[0] == (deadline, booking_id):
+                self.condition.notify()
+    
+    def schedule_many(self, booking_ids, end_time):
+        deadline = end_time.timestamp()
+        with self.condition:
+            for booking_id in booking_ids:
+                self._push(booking_id, deadline)
+            self.condition.notify()
+    
+    def cancel(self, booking_id):
+        with self.condition:
+            self.pending.pop(booking_id, None)
+    
+    def cancel_many(self, booking_ids):
+        with self.condition:
+            for booking_id in booking_ids:
+                self.pending.pop(booking_id, None)
+    
+    def next_deadline(self):
+        with self.condition:
+            self._drop_cancelled()
+            return self.heap[0][0] if self.heap else None
+    
+    def _drop_cancelled(self):
+        while self.heap and self.pending.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.shutdown_flag:
+                    self._drop_cancelled()
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    delay = self.heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+                if self.shutdown_flag:
+                    return
+                
+                now = time.time()
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    deadline, booking_id = heapq.heappop(self.heap)
+                    if self.pending.get(booking_id) == deadline:
+                        del self.pending[booking_id]
+                        due.append(booking_id)
+            
+            try:
+                sweep = self.parking_system.check_expired_bookings()
+            except Exception:
+                log.exception("Expiry sweep failed")
+                # Those bookings are still active; try them again shortly
+                with self.condition:
+                    for booking_id in due:
+                        self._push(booking_id, time.time() + 5)
+                continue
+            
+            with self.condition:
+                self.last_sweep = sweep
+                self.released_total += len(sweep.expired)
+                # The sweep may also have caught bookings that were still
+                # queued, e.g. after a clock change
+                for booking_id, _ in sweep.expired:
+                    self.pending.pop(booking_id, None)
+    
+    def stop(self):
+        with self.condition:
+            self.shutdown_flag = True
+            self.condition.notify()
+        if self.thread.is_alive():
+            self.thread.join()
+    
+    def stats(self):
+        with self.condition:
+            return {"released": self.released_total, "scheduled": len(self.pending)}
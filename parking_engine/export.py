@@ -0,0 +1,121 @@
+"""Streaming CSV and Parquet export of the bookings history"""
+
+import os
+import csv
+
+from .config import CONFIG
+from .queries import EXPORT_COLUMNS
+
+def format_timestamp(value):
+    """'2024-05-01T09:30:15.123' -> '2024-05-01 09:30' without parsing"""
+    return value[:16].replace('T', ' ')
+
+class CSVExportWriter:
+    """Writes export batches to a CSV file with a header row"""
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+    
+    def write(self, rows):
+        self.writer.writerows(rows)
+    
+    def close(self):
+        self.file.close()
+
+class ParquetExportWriter:
+    """Writes export batches to a Parquet file, row_group_size rows per row group.
+
+    Needs pyarrow, which is only imported once a Parquet export starts.
+    """
+    def __init__(self, path, columns, row_group_size=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            (column, getattr(pyarrow, EXPORT_COLUMNS[column][1])()) for column in columns
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size or CONFIG['export']['row_group_size']
+        self.pending = []
+        self.pending_rows = 0
+    
+    def write(self, rows):
+        # Converted right away: Arrow columns are far smaller than the tuples
+        self.pending.append(self.pyarrow.record_batch([
+            self.pyarrow.array(values, type=field.type)
+            for values, field in zip(zip(*rows), self.schema)
+        ], schema=self.schema))
+        self.pending_rows += len(rows)
+        if self.pending_rows >= self.row_group_size:
+            self._flush()
+    
+    def _flush(self):
+        if not self.pending:
+            return
+        self.writer.write_table(
+            self.pyarrow.Table.from_batches(self.pending, schema=self.schema),
+            row_group_size=self.row_group_size
+        )
+        self.pending = []
+        self.pending_rows = 0
+    
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+EXPORT_WRITERS = {'csv': CSVExportWriter, 'parquet': ParquetExportWriter}
+
+def iter_export_batches(parking_system, columns=None, filters=None, batch_size=None):
+    """Yield the bookings matching filters as lists of row tuples, oldest first.
+
+    Works with ParkingSystem, RemoteParkingSystem and ShardedParkingSystem
+    alike; the last is oldest first within each shard. Only one batch is
+    held at a time, and no read transaction stays open between batches.
+    """
+    after = None
+    while True:
+        rows, after = parking_system.get_export_batch(columns, filters, after, batch_size)
+        if rows:
+            yield rows
+        if after is None:
+            return
+
+def export_bookings(parking_system, path, fmt=None, columns=None, filters=None,
+                    batch_size=None, progress=None, cancelled=None):
+    """Stream the bookings matching filters to path as CSV or Parquet.
+
+    fmt defaults to the file extension. progress(rows written, total) is
+    called after every batch, and a true cancelled() stops the export. The
+    file is written beside path and only renamed into place once complete.
+    Returns the number of rows written, or None if cancelled.
+    """
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.') or 'csv').lower()
+    if fmt not in EXPORT_WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    columns = list(columns or EXPORT_COLUMNS)
+    total = parking_system.count_export_rows(filters)
+    partial_path = path + ".part"
+    writer = EXPORT_WRITERS[fmt](partial_path, columns)
+    written = 0
+    try:
+        for rows in iter_export_batches(parking_system, columns, filters, batch_size):
+            if cancelled and cancelled():
+                return None
+            writer.write(rows)
+            written += len(rows)
+            if progress:
+                progress(written, max(total, written))
+        writer.close()
+        writer = None
+        os.replace(partial_path, path)
+    finally:
+        if writer is not None:
+            writer.close()
+            os.remove(partial_path)
+    if progress:
+        progress(written, written)
+    return written
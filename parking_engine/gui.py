@@ -0,0 +1,1057 @@
+"""Tk kiosk and admin windows; the only module that imports tkinter"""
+
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from datetime import datetime
+import logging
+import threading
+import time
+import bisect
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .config import CONFIG
+from .queries import booking_matches
+from .system import ParkingSystem
+from .changes import change_touches
+from .export import export_bookings
+from .records import epoch_iso, format_epoch
+
+log = logging.getLogger(__name__)
+
+class UIExecutor:
+    """Runs ParkingSystem calls off the Tk main thread.
+
+    Work runs on a small thread pool; results are queued and handed to their
+    callbacks by a Tk after() poll, so callbacks always run on the main
+    thread. Requests sharing a key are coalesced: while one is queued or
+    running, further submits only make it run once more when it finishes.
+    """
+    def __init__(self, root, workers=None, poll_ms=None):
+        self.root = root
+        self.workers = ThreadPoolExecutor(
+            max_workers=workers or CONFIG['ui']['workers'],
+            thread_name_prefix="parking-ui"
+        )
+        self.poll_ms = poll_ms or CONFIG['ui']['poll_ms']
+        self.results = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.in_flight = {}  # key -> request to rerun once the current one ends, or None
+        self.submitted = 0
+        self.coalesced = 0
+        self.closed = False
+        self.poll_timer = self.root.after(self.poll_ms, self._poll)
+    
+    def submit(self, key, fn, *args, callback=None, errback=None):
+        """Run fn(*args) in the background and pass its result to callback.
+
+        Returns False when the request was folded into one already pending
+        for the same key.
+        """
+        request = (fn, args, callback, errback)
+        with self.lock:
+            if self.closed:
+                return False
+            if key is not None:
+                if key in self.in_flight:
+                    self.in_flight[key] = request
+                    self.coalesced += 1
+                    return False
+                self.in_flight[key] = None
+            self.submitted += 1
+        self.workers.submit(self._run, key, request)
+        return True
+    
+    def call_soon(self, callback, result=None):
+        """Run callback(result) on the main thread; safe to call from any thread"""
+        self.results.put((callback, None, result, None))
+    
+    def _run(self, key, request):
+        fn, args, callback, errback = request
+        try:
+            self.results.put((callback, errback, fn(*args), None))
+        except Exception as e:
+            self.results.put((callback, errback, None, e))
+        if key is None:
+            return
+        with self.lock:
+            rerun = self.in_flight.pop(key)
+            if rerun is None or self.closed:
+                return
+            self.in_flight[key] = None
+        self.workers.submit(self._run, key, rerun)
+    
+    def _poll(self):
+        while True:
+            try:
+                callback, errback, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if error is not None:
+                    if errback:
+                        errback(error)
+                    else:
+                        log.error("Background query failed: %s", error)
+                elif callback:
+                    callback(result)
+            except Exception:
+                log.exception("UI callback failed")
+        if not self.closed:
+            self.poll_timer = self.root.after(self.poll_ms, self._poll)
+    
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.root.after_cancel(self.poll_timer)
+        self.workers.shutdown(wait=True, cancel_futures=True)
+
+class StallMonitor:
+    """Histogram of how long the Tk main thread was busy.
+
+    A timer is scheduled every interval_ms; however late it fires is how
+    long the event loop was blocked by whatever ran before it.
+    """
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+    
+    def __init__(self, root, interval_ms=None, metrics=None):
+        self.root = root
+        self.interval_ms = interval_ms or CONFIG['ui']['stall_sample_ms']
+        self.metrics = metrics if metrics and metrics.enabled else None
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.samples = 0
+        self.max_ms = 0.0
+        self.timer = None
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self.timer = self.root.after(self.interval_ms, self._tick)
+    
+    def _tick(self):
+        now = time.perf_counter()
+        self.record(max(0.0, (now - self._expected) * 1000))
+        self._expected = now + self.interval_ms / 1000
+        self.timer = self.root.after(self.interval_ms, self._tick)
+    
+    def record(self, stall_ms):
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, stall_ms)] += 1
+        self.samples += 1
+        self.max_ms = max(self.max_ms, stall_ms)
+        if self.metrics:
+            self.metrics.observe('ui_stall', None, stall_ms / 1000)
+    
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile stall, in ms"""
+        target = self.samples * pct / 100
+        seen = 0
+        for bound, count in zip(self.BUCKETS_MS + (self.max_ms,), self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max_ms)
+        return 0.0
+    
+    def format_histogram(self):
+        lines = [f"Main-thread stalls ({self.samples} samples, max {self.max_ms:.1f} ms):"]
+        lower = 0
+        for bound, count in zip(self.BUCKETS_MS + (None,), self.counts):
+            label = f"{lower}-{bound} ms" if bound else f">{lower} ms"
+            lines.append(f"  {label:>12} {count}")
+            lower = bound
+        return "\n".join(lines)
+    
+    def stop(self):
+        if self.timer:
+            self.root.after_cancel(self.timer)
+            self.timer = None
+
+class SlotGrid:
+    """Slot buttons that live across refreshes, keyed by slot_id.
+
+    update() takes the current (slot_id, free) list and only creates,
+    destroys, moves or restyles the buttons whose slot changed since the
+    previous call. Booked slots stay on the grid, disabled.
+    """
+    def __init__(self, parent, on_select, columns=None):
+        self.parent = parent
+        self.on_select = on_select
+        self.columns = columns or CONFIG['slot_grid']['columns']
+        self.buttons = {}  # slot_id -> [button, position, free]
+    
+    def update(self, states):
+        seen = set()
+        for position, (slot_id, free) in enumerate(states):
+            seen.add(slot_id)
+            entry = self.buttons.get(slot_id)
+            if entry is None:
+                button = ttk.Button(
+                    self.parent,
+                    text=f"Slot {slot_id}",
+                    command=lambda sid=slot_id: self.on_select(sid)
+                )
+                button.grid(row=position // self.columns, column=position % self.columns, padx=5, pady=5)
+                if not free:
+                    button.state(['disabled'])
+                self.buttons[slot_id] = [button, position, free]
+                continue
+            
+            button, old_position, old_free = entry
+            if old_position != position:
+                button.grid_configure(row=position // self.columns, column=position % self.columns)
+                entry[1] = position
+            if old_free != free:
+                button.state(['!disabled'] if free else ['disabled'])
+                entry[2] = free
+        
+        for slot_id in [slot_id for slot_id in self.buttons if slot_id not in seen]:
+            self.buttons.pop(slot_id)[0].destroy()
+    
+    def clear(self):
+        self.update([])
+
+class VirtualSlotGrid:
+    """Canvas-drawn slot grid for very large garages.
+
+    Only the rows inside the visible part of the canvas are drawn; scrolling
+    redraws the new rows. Clicks are mapped back to slots from coordinates.
+    """
+    CELL_WIDTH = 90
+    CELL_HEIGHT = 34
+    
+    def __init__(self, canvas, on_select, columns=None):
+        self.canvas = canvas
+        self.on_select = on_select
+        self.columns = columns or CONFIG['slot_grid']['columns']
+        self.states = []
+        self.drawn_rows = None
+        self.click_binding = canvas.bind("<Button-1>", self.on_click, add="+")
+        self.configure_binding = canvas.bind("<Configure>", lambda event: self.redraw(), add="+")
+    
+    def update(self, states):
+        states = list(states)
+        if states == self.states:
+            return
+        self.states = states
+        rows = -(-len(states) // self.columns)
+        self.canvas.config(scrollregion=(0, 0, self.columns * self.CELL_WIDTH, rows * self.CELL_HEIGHT))
+        self.drawn_rows = None
+        self.redraw()
+    
+    def visible_rows(self):
+        top = self.canvas.canvasy(0)
+        first = max(0, int(top // self.CELL_HEIGHT))
+        last = int((top + self.canvas.winfo_height()) // self.CELL_HEIGHT) + 1
+        return first, last
+    
+    def redraw(self):
+        rows = self.visible_rows()
+        if rows == self.drawn_rows:
+            return
+        self.drawn_rows = rows
+        self.canvas.delete("slot")
+        first, last = rows
+        for index in range(first * self.columns, min(len(self.states), last * self.columns)):
+            slot_id, free = self.states[index]
+            x = (index % self.columns) * self.CELL_WIDTH
+            y = (index // self.columns) * self.CELL_HEIGHT
+            self.canvas.create_rectangle(
+                x + 4, y + 4, x + self.CELL_WIDTH - 4, y + self.CELL_HEIGHT - 4,
+                fill="#d9f2d9" if free else "#e0e0e0", outline="#808080", tags=("slot",)
+            )
+            self.canvas.create_text(
+                x + self.CELL_WIDTH / 2, y + self.CELL_HEIGHT / 2,
+                text=f"Slot {slot_id}", fill="black" if free else "#808080", tags=("slot",)
+            )
+    
+    def on_click(self, event):
+        column = int(self.canvas.canvasx(event.x) // self.CELL_WIDTH)
+        index = int(self.canvas.canvasy(event.y) // self.CELL_HEIGHT) * self.columns + column
+        if column < self.columns and 0 <= index < len(self.states):
+            slot_id, free = self.states[index]
+            if free:
+                self.on_select(slot_id)
+    
+    def clear(self):
+        self.canvas.delete("slot")
+        self.canvas.unbind("<Button-1>", self.click_binding)
+        self.canvas.unbind("<Configure>", self.configure_binding)
+        self.states = []
+
+# Main-thread refreshes and callbacks timed when metrics are enabled
+ADMIN_UI_HANDLERS = ('load_data', 'on_page_loaded', 'on_changes_published', 'on_changes_loaded',
+                     'show_stats')
+KIOSK_UI_HANDLERS = ('update_slot_display', 'show_slot_states', 'update_bookings_display',
+                     'show_user_bookings', 'on_changes_published', 'on_slot_booked', 'on_slot_released')
+
+class AdminInterface(tk.Toplevel):
+    def __init__(self, parent, parking_system, executor=None):
+        super().__init__(parent)
+        self.title("Admin Dashboard")
+        self.geometry("1200x800")
+        self.parking_system = parking_system
+        # Database calls run off the main thread
+        self.owns_executor = executor is None
+        self.executor = executor or UIExecutor(self)
+        self.generation = 0
+        self.closed = False
+        
+        # Initialize refresh_timer attribute
+        self.refresh_timer = None
+        self.export_thread = None
+        self.export_cancelled = threading.Event()
+        self.parking_system.metrics.instrument(self, 'ui', ADMIN_UI_HANDLERS)
+        
+        self.create_widgets()
+        self.load_data()
+        
+        # Bookings and expiries show up as they are committed
+        self.change_token = self.parking_system.change_bus.subscribe(
+            lambda changes: self.executor.call_soon(self.on_changes_published, changes)
+        )
+        self.schedule_refresh()
+    
+    def create_widgets(self):
+        main_frame = ttk.Frame(self, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        filter_frame = ttk.Frame(main_frame)
+        filter_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(filter_frame, text="Status:").pack(side=tk.LEFT, padx=5)
+        self.status_var = tk.StringVar(value='all')
+        ttk.OptionMenu(filter_frame, self.status_var, 'all', 'all', 'active', 'completed', 'expired').pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_frame, text="Date:").pack(side=tk.LEFT, padx=5)
+        self.date_entry = ttk.Entry(filter_frame)
+        self.date_entry.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(filter_frame, text="Apply Filters", command=self.load_data).pack(side=tk.LEFT, padx=5)
+        
+        tree_frame = ttk.Frame(main_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.tree = ttk.Treeview(tree_frame, columns=(
+            "booking_id", "slot_id", "user_id", "vehicle", 
+            "start_time", "end_time", "status", "amount", "payment"
+        ), show="headings")
+        
+        # Pages are fetched as the list is scrolled towards its end
+        self.tree_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        self.tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+        
+        columns = [
+            ("booking_id", "Booking ID", 80),
+            ("slot_id", "Slot", 60),
+            ("user_id", "User ID", 100),
+            ("vehicle", "Vehicle", 120),
+            ("start_time", "Start Time", 150),
+            ("end_time", "End Time", 150),
+            ("status", "Status", 80),
+            ("amount", "Amount", 80),
+            ("payment", "Payment", 80)
+        ]
+        
+        for col, heading, width in columns:
+            self.tree.heading(col, text=heading)
+            self.tree.column(col, width=width, anchor="center")
+        
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+        stats_frame = ttk.Frame(main_frame)
+        stats_frame.pack(fill=tk.X, pady=10)
+        
+        self.total_label = ttk.Label(stats_frame, text="Total Bookings: 0")
+        self.total_label.pack(side=tk.LEFT, padx=10)
+        
+        self.active_label = ttk.Label(stats_frame, text="Active: 0")
+        self.active_label.pack(side=tk.LEFT, padx=10)
+        
+        self.revenue_label = ttk.Label(stats_frame, text="Today's Revenue: $0.00")
+        self.revenue_label.pack(side=tk.LEFT, padx=10)
+        
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Button(btn_frame, text="Refresh", command=self.load_data).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Manage Slots", command=self.open_slot_management).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Export...", command=self.export_bookings).pack(side=tk.LEFT, padx=5)
+        
+        # Shown while an export runs
+        self.export_progress = ttk.Progressbar(btn_frame, length=200, mode='determinate')
+        self.export_label = ttk.Label(btn_frame, text="")
+        self.export_cancel_button = ttk.Button(btn_frame, text="Cancel Export", command=self.export_cancelled.set)
+    
+    def load_data(self):
+        filters = {}
+        if self.status_var.get() != 'all':
+            filters['status'] = self.status_var.get()
+        if self.date_entry.get():
+            filters['date'] = self.date_entry.get()
+        self.filters = filters
+        
+        self.tree.delete(*self.tree.get_children())
+        # (start_time, booking_id) of every row in the tree, ascending, and
+        # the same key by tree item id
+        self.loaded_keys = []
+        self.loaded_rows = {}
+        self.page_cursor = None
+        self.all_pages_loaded = False
+        self.page_pending = True
+        # Unknown until the first page is in; changes published before then
+        # are fetched once it is
+        self.change_seq = None
+        self.changes_missed = False
+        # Results of requests made before this reload are ignored
+        self.generation += 1
+        self.executor.submit(
+            'admin_load', self.fetch_first_page, filters,
+            callback=partial(self.on_page_loaded, self.generation)
+        )
+        
+        self.update_stats()
+        # Reschedule the next refresh
+        self.schedule_refresh()
+    
+    def fetch_first_page(self, filters):
+        # Runs on a worker thread. The change sequence is taken before the
+        # first page so nothing committed meanwhile is missed.
+        change_seq = self.parking_system.get_booking_change_seq()
+        bookings = self.parking_system.get_all_bookings(
+            filters, page_size=CONFIG['admin_page_size']
+        )
+        return bookings, change_seq
+    
+    def load_next_page(self):
+        if self.all_pages_loaded:
+            self.page_pending = False
+            return
+        self.executor.submit(
+            'admin_page', self.fetch_next_page, self.filters, self.page_cursor,
+            callback=partial(self.on_page_loaded, self.generation)
+        )
+    
+    def fetch_next_page(self, filters, cursor):
+        bookings = self.parking_system.get_all_bookings(
+            filters, after=(epoch_iso(cursor[0]), cursor[1]), page_size=CONFIG['admin_page_size']
+        )
+        return bookings, None
+    
+    def on_page_loaded(self, generation, result):
+        if self.closed or generation != self.generation:
+            return
+        bookings, change_seq = result
+        first_page = change_seq is not None
+        if first_page:
+            self.change_seq = change_seq
+        self.page_pending = False
+        # Move the cursor first so show_booking accepts this page's rows
+        if bookings:
+            self.page_cursor = (bookings[-1].start, bookings[-1].booking_id)
+        if len(bookings) < CONFIG['admin_page_size']:
+            self.all_pages_loaded = True
+        for booking in bookings:
+            self.show_booking(booking)
+        if first_page and self.changes_missed:
+            self.refresh_changes()
+    
+    def on_tree_scroll(self, first, last):
+        self.tree_scrollbar.set(first, last)
+        if float(last) > 0.9 and not self.all_pages_loaded and not self.page_pending:
+            self.page_pending = True
+            self.after_idle(self.load_next_page)
+    
+    def show_booking(self, booking):
+        """Insert, update or drop one booking row, keeping the tree newest first"""
+        iid = str(booking.booking_id)
+        key = (booking.start, booking.booking_id)
+        if iid in self.loaded_rows:
+            self.tree.delete(iid)
+            old_key = self.loaded_rows.pop(iid)
+            del self.loaded_keys[bisect.bisect_left(self.loaded_keys, old_key)]
+        if not booking_matches(booking, self.filters):
+            return
+        # Older than the loaded pages: it will arrive with its page
+        if not self.all_pages_loaded and self.page_cursor and key < self.page_cursor:
+            return
+        
+        position = bisect.bisect_left(self.loaded_keys, key)
+        self.tree.insert("", len(self.loaded_keys) - position, iid=iid, values=(
+            booking.booking_id, booking.slot_id, booking.user_id,
+            booking.vehicle_number, format_epoch(booking.start), format_epoch(booking.end),
+            booking.status, f"{CONFIG['pricing']['currency']}{booking.amount_paid}", booking.payment_status
+        ))
+        self.loaded_keys.insert(position, key)
+        self.loaded_rows[iid] = key
+    
+    def refresh_changes(self):
+        if self.change_seq is None:
+            self.changes_missed = True
+        else:
+            # Only rows inserted or updated since the last refresh are
+            # fetched, a page at a time
+            self.changes_missed = False
+            self.executor.submit(
+                'admin_changes', self.parking_system.get_bookings_changed_since,
+                self.change_seq, CONFIG['admin_page_size'],
+                callback=partial(self.on_changes_loaded, self.generation)
+            )
+        self.update_stats()
+        self.schedule_refresh()
+    
+    def on_changes_published(self, changes):
+        if not self.closed and change_touches(changes, 'booking'):
+            self.refresh_changes()
+    
+    def on_changes_loaded(self, generation, result):
+        if self.closed or generation != self.generation:
+            return
+        bookings, change_seq = result
+        self.change_seq = max(self.change_seq, change_seq)
+        for booking in bookings:
+            self.show_booking(booking)
+        if len(bookings) >= CONFIG['admin_page_size']:
+            # More changes than one page: fetch the next
+            self.refresh_changes()
+    
+    def schedule_refresh(self):
+        # Cancel any existing timer
+        if self.refresh_timer:
+            self.after_cancel(self.refresh_timer)
+            self.refresh_timer = None
+        # Change notifications drive refreshes; polling is only a fallback
+        if CONFIG['change_feed']['poll_fallback_ms']:
+            self.refresh_timer = self.after(CONFIG['change_feed']['poll_fallback_ms'], self.refresh_changes)
+    
+    def update_stats(self):
+        self.executor.submit(
+            'admin_stats', self.parking_system.get_dashboard_stats,
+            callback=self.show_stats
+        )
+    
+    def show_stats(self, stats):
+        if self.closed:
+            return
+        total, active, revenue = stats
+        self.total_label.config(text=f"Total Bookings: {total}")
+        self.active_label.config(text=f"Active: {active}")
+        self.revenue_label.config(text=f"Today's Revenue: {CONFIG['pricing']['currency']}{revenue:.2f}")
+    
+    def open_slot_management(self):
+        SlotManagementWindow(self, self.parking_system, self.executor)
+    
+    def export_bookings(self):
+        """Export the bookings matching the current filters in the background"""
+        if self.export_thread and self.export_thread.is_alive():
+            messagebox.showinfo("Export", "An export is already running", parent=self)
+            return
+        path = filedialog.asksaveasfilename(
+            parent=self, title="Export Bookings", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Parquet", "*.parquet")]
+        )
+        if not path:
+            return
+        filters = {}
+        if self.filters.get('status'):
+            filters['status'] = self.filters['status']
+        if self.filters.get('date'):
+            filters['date_from'] = filters['date_to'] = self.filters['date']
+        
+        self.export_cancelled.clear()
+        self.export_progress.configure(value=0, maximum=1)
+        self.export_label.config(text="Exporting...")
+        self.export_progress.pack(side=tk.LEFT, padx=5)
+        self.export_label.pack(side=tk.LEFT, padx=5)
+        self.export_cancel_button.pack(side=tk.LEFT, padx=5)
+        # Its own thread: an export can run for minutes and must not hold up
+        # the UI workers
+        self.export_thread = threading.Thread(
+            target=self.run_export, args=(path, filters), name="parking-export", daemon=True
+        )
+        self.export_thread.start()
+    
+    def run_export(self, path, filters):
+        try:
+            written = export_bookings(
+                self.parking_system, path, filters=filters,
+                progress=lambda done, total: self.executor.call_soon(
+                    self.show_export_progress, (done, total)
+                ),
+                cancelled=self.export_cancelled.is_set
+            )
+            result = (path, written, None)
+        except Exception as e:
+            result = (path, None, str(e))
+        self.executor.call_soon(self.on_export_done, result)
+    
+    def show_export_progress(self, progress):
+        if self.closed:
+            return
+        done, total = progress
+        self.export_progress.configure(value=done, maximum=max(total, 1))
+        self.export_label.config(text=f"Exported {done:,} of {total:,}")
+    
+    def on_export_done(self, result):
+        if self.closed:
+            return
+        path, written, error = result
+        self.export_progress.pack_forget()
+        self.export_label.pack_forget()
+        self.export_cancel_button.pack_forget()
+        if error:
+            messagebox.showerror("Export", f"Export failed: {error}", parent=self)
+        elif written is None:
+            messagebox.showinfo("Export", "Export cancelled", parent=self)
+        else:
+            messagebox.showinfo("Export", f"Exported {written:,} bookings to {path}", parent=self)
+    
+    def destroy(self):
+        # Cancel any pending timer before destroying
+        if self.refresh_timer:
+            self.after_cancel(self.refresh_timer)
+        self.export_cancelled.set()
+        # Results still in flight are dropped
+        self.closed = True
+        self.parking_system.change_bus.unsubscribe(self.change_token)
+        if self.owns_executor:
+            self.executor.close()
+        super().destroy()
+
+class SlotManagementWindow(tk.Toplevel):
+    def __init__(self, parent, parking_system, executor):
+        super().__init__(parent)
+        self.title("Slot Management")
+        self.geometry("600x400")
+        self.parking_system = parking_system
+        # Shared with the admin window; calls to a server may take seconds
+        self.executor = executor
+        self.slot_active = {}
+        self.requested_active = {}  # slot_id -> state asked for but not yet confirmed
+        
+        self.create_widgets()
+        self.load_slots()
+    
+    def create_widgets(self):
+        main_frame = ttk.Frame(self, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.tree = ttk.Treeview(main_frame, columns=("slot_id", "status", "vehicle_type", "actions"), show="headings")
+        self.tree.heading("slot_id", text="Slot ID")
+        self.tree.heading("status", text="Status")
+        self.tree.heading("vehicle_type", text="Vehicle Type")
+        self.tree.heading("actions", text="Actions")
+        
+        self.tree.column("slot_id", width=80, anchor="center")
+        self.tree.column("status", width=100, anchor="center")
+        self.tree.column("vehicle_type", width=100, anchor="center")
+        self.tree.column("actions", width=150, anchor="center")
+        
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<Button-1>", self.on_slot_click)
+        
+        ttk.Button(main_frame, text="Add New Slot", command=self.add_slot).pack(pady=5)
+    
+    def load_slots(self):
+        self.executor.submit(
+            'slot_management', self.parking_system.get_slots,
+            callback=self.show_slots, errback=self.on_error
+        )
+    
+    def show_slots(self, slots):
+        if not self.winfo_exists():
+            return
+        self.slot_active = {str(slot.slot_id): slot.is_active for slot in slots}
+        
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        
+        for slot in slots:
+            self.tree.insert("", "end", values=(
+                slot.slot_id, slot.status, slot.vehicle_type, "Toggle Status"
+            ))
+    
+    def on_slot_click(self, event):
+        item = self.tree.identify_row(event.y)
+        column = self.tree.identify_column(event.x)
+        
+        if item and column == "#4":
+            slot_id = self.tree.item(item, "values")[0]
+            self.toggle_slot_status(slot_id)
+    
+    def toggle_slot_status(self, slot_id):
+        # Clicks can outpace the updates: each one flips the newest requested
+        # state, and coalescing on the slot keeps only the newest request
+        target = not self.requested_active.get(slot_id, self.slot_active[slot_id])
+        self.requested_active[slot_id] = target
+        
+        self.executor.submit(
+            ('set_slot_active', slot_id), self.parking_system.set_slot_active,
+            slot_id, target,
+            callback=lambda _: self.on_slot_updated(slot_id, target),
+            errback=lambda error: self.on_slot_update_failed(slot_id, error)
+        )
+    
+    def on_slot_updated(self, slot_id, is_active):
+        if self.requested_active.get(slot_id) == is_active:
+            del self.requested_active[slot_id]
+        self.on_slot_changed(f"Slot {slot_id} status updated")
+    
+    def on_slot_update_failed(self, slot_id, error):
+        self.requested_active.pop(slot_id, None)
+        self.on_error(error)
+    
+    def add_slot(self):
+        self.executor.submit(
+            None, self.parking_system.add_slot,
+            callback=lambda new_slot_id: self.on_slot_changed(f"Added new slot {new_slot_id}"),
+            errback=self.on_error
+        )
+    
+    def on_slot_changed(self, message):
+        if not self.winfo_exists():
+            return
+        self.load_slots()
+        messagebox.showinfo("Success", message, parent=self)
+    
+    def on_error(self, error):
+        if self.winfo_exists():
+            messagebox.showerror("Error", f"Slot update failed: {error}", parent=self)
+
+class ParkingApp:
+    def __init__(self, root, parking_system=None):
+        self.root = root
+        self.root.title("Parking Slot Booking System")
+        self.root.geometry("1000x1000")
+        # A RemoteParkingSystem turns the kiosk into a thin client
+        self.parking_system = parking_system or ParkingSystem()
+        # Database calls run off the main thread; the monitor records how
+        # long the main thread is ever blocked
+        self.executor = UIExecutor(self.root)
+        self.stall_monitor = StallMonitor(self.root, metrics=self.parking_system.metrics)
+        self.parking_system.metrics.instrument(self, 'ui', KIOSK_UI_HANDLERS)
+        
+        # Initialize refresh_timer attribute
+        self.refresh_timer = None
+        
+        self.create_widgets()
+        self.update_slot_display()
+        
+        # Redraw when slots or bookings change instead of on a timer
+        self.change_token = self.parking_system.change_bus.subscribe(
+            lambda changes: self.executor.call_soon(self.on_changes_published, changes)
+        )
+        self.schedule_refresh()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    def create_widgets(self):
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Button(
+            main_frame, 
+            text="Admin Login", 
+            command=self.show_admin_login
+        ).pack(anchor="ne", padx=10, pady=5)
+        
+        slots_frame = ttk.LabelFrame(main_frame, text="Parking Slots", padding="10")
+        slots_frame.pack(fill=tk.X, pady=5)
+        
+        self.slots_canvas = tk.Canvas(slots_frame)
+        
+        y_scrollbar = ttk.Scrollbar(slots_frame, orient="vertical", command=self.slots_canvas.yview)
+        y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.slots_canvas.pack(fill=tk.X, expand=True)
+        
+        scrollbar = ttk.Scrollbar(slots_frame, orient="horizontal", command=self.slots_canvas.xview)
+        scrollbar.pack(fill=tk.X)
+        
+        self.slots_canvas.configure(xscrollcommand=scrollbar.set, yscrollcommand=self.on_slots_scroll(y_scrollbar))
+        self.slots_frame = ttk.Frame(self.slots_canvas)
+        self.slots_window = self.slots_canvas.create_window((0, 0), window=self.slots_frame, anchor="nw")
+        self.slot_grid = None
+        
+        booking_frame = ttk.LabelFrame(main_frame, text="Book a Slot", padding="10")
+        booking_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(booking_frame, text="User ID:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
+        self.user_id_entry = ttk.Entry(booking_frame)
+        self.user_id_entry.grid(row=0, column=1, padx=5, pady=5, sticky="we")
+        
+        ttk.Label(booking_frame, text="Vehicle Number:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        self.vehicle_entry = ttk.Entry(booking_frame)
+        self.vehicle_entry.grid(row=1, column=1, padx=5, pady=5, sticky="we")
+        
+        ttk.Label(booking_frame, text="Duration (minutes):").grid(row=2, column=0, padx=5, pady=5, sticky="e")
+        self.duration_entry = ttk.Entry(booking_frame)
+        self.duration_entry.insert(0, "60")
+        self.duration_entry.grid(row=2, column=1, padx=5, pady=5, sticky="we")
+        
+        self.book_button = ttk.Button(booking_frame, text="Book Selected Slot", command=self.book_slot)
+        self.book_button.grid(row=3, column=0, columnspan=2, pady=10)
+        
+        bookings_frame = ttk.LabelFrame(main_frame, text="Your Active Bookings", padding="10")
+        bookings_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        
+        columns = [
+            ("booking_id", "Booking ID"),
+            ("slot_id", "Slot"),
+            ("vehicle", "Vehicle"),
+            ("start_time", "Start Time"),
+            ("end_time", "End Time"), 
+            ("amount", "Amount"),
+            ("payment", "Payment"),
+            ("actions", "Actions")
+        ]
+        
+        self.bookings_tree = ttk.Treeview(bookings_frame, columns=[col[0] for col in columns], show="headings")
+        
+        for col, heading in columns:
+            self.bookings_tree.heading(col, text=heading)
+            width = 100 if col not in ["actions", "vehicle"] else 120
+            anchor = "center" if col != "actions" else "center"
+            self.bookings_tree.column(col, width=width, anchor=anchor)
+        
+        self.bookings_tree.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Button(
+            bookings_frame, 
+            text="Refresh Bookings", 
+            command=self.update_bookings_display
+        ).pack(pady=5)
+        
+        # Add a status label to show automatic slot release information
+        self.status_label = ttk.Label(main_frame, text="Expired bookings are released automatically")
+        self.status_label.pack(pady=5)
+        
+        booking_frame.columnconfigure(1, weight=1)
+    
+    def schedule_refresh(self):
+        # Cancel any existing timer
+        if hasattr(self, 'refresh_timer') and self.refresh_timer:
+            self.root.after_cancel(self.refresh_timer)
+            self.refresh_timer = None
+        # Change notifications drive refreshes; polling is only a fallback
+        if CONFIG['change_feed']['poll_fallback_ms']:
+            self.refresh_timer = self.root.after(
+                CONFIG['change_feed']['poll_fallback_ms'], self.update_slot_display
+            )
+    
+    def on_changes_published(self, changes):
+        if change_touches(changes, 'slot') or change_touches(changes, 'reservation'):
+            self.update_slot_display()
+        elif change_touches(changes, 'booking'):
+            self.update_bookings_display()
+    
+    def update_slot_display(self):
+        # Make sure we have the slots frame
+        if not hasattr(self, 'slots_frame'):
+            return
+            
+        self.update_expiry_status()
+        
+        # Repeated refreshes while one is running collapse into one more
+        self.executor.submit('slot_states', self.parking_system.get_slot_states,
+                             callback=self.show_slot_states)
+        # Schedule the next refresh
+        self.schedule_refresh()
+    
+    def show_slot_states(self, slot_states):
+        virtual = len(slot_states) > CONFIG['slot_grid']['virtual_threshold']
+        if self.slot_grid is None or isinstance(self.slot_grid, VirtualSlotGrid) != virtual:
+            if self.slot_grid:
+                self.slot_grid.clear()
+            if virtual:
+                self.slots_canvas.itemconfigure(self.slots_window, state="hidden")
+                self.slot_grid = VirtualSlotGrid(self.slots_canvas, self.select_slot)
+            else:
+                self.slots_canvas.itemconfigure(self.slots_window, state="normal")
+                self.slot_grid = SlotGrid(self.slots_frame, self.select_slot)
+        
+        self.slot_grid.update(slot_states)
+        
+        if not virtual:
+            self.slots_frame.update_idletasks()
+            self.slots_canvas.config(scrollregion=self.slots_canvas.bbox("all"))
+        
+        self.update_bookings_display()
+    
+    def on_slots_scroll(self, scrollbar):
+        def scrolled(*args):
+            scrollbar.set(*args)
+            # The canvas-drawn grid draws only what is on screen
+            if isinstance(self.slot_grid, VirtualSlotGrid):
+                self.slot_grid.redraw()
+        return scrolled
+    
+    def update_expiry_status(self):
+        # Expired bookings are released by the scheduler; only report on it
+        scheduler = self.parking_system.expiry_scheduler
+        if not scheduler:
+            return
+        text = f"Auto-released {scheduler.released_total} expired bookings"
+        next_deadline = scheduler.next_deadline()
+        if next_deadline:
+            text += f" (Next release: {datetime.fromtimestamp(next_deadline).strftime('%H:%M:%S')})"
+        self.status_label.config(text=text)
+    
+    def select_slot(self, slot_id):
+        self.selected_slot = slot_id
+        messagebox.showinfo("Slot Selected", f"Slot {slot_id} selected for booking")
+    
+    def book_slot(self):
+        if not hasattr(self, 'selected_slot'):
+            messagebox.showerror("Error", "Please select a slot first")
+            return
+        
+        user_id = self.user_id_entry.get().strip()
+        vehicle_number = self.vehicle_entry.get().strip()
+        duration = self.duration_entry.get().strip()
+        
+        if not all([user_id, vehicle_number]):
+            messagebox.showerror("Error", "Please fill all required fields")
+            return
+        
+        try:
+            duration = int(duration)
+            if duration <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid positive number for duration")
+            return
+        
+        # Disabled until the booking comes back, so it cannot be sent twice
+        self.book_button.state(['disabled'])
+        self.executor.submit(
+            'book_slot', self.parking_system.book_slot,
+            self.selected_slot, user_id, vehicle_number, duration,
+            callback=self.on_slot_booked,
+            errback=self.on_booking_error
+        )
+    
+    def on_slot_booked(self, result):
+        self.book_button.state(['!disabled'])
+        success, message = result
+        
+        if success:
+            messagebox.showinfo("Success", message)
+            # First update bookings, then schedule refresh
+            self.update_bookings_display()
+            self.update_slot_display()
+            if hasattr(self, 'selected_slot'):
+                delattr(self, 'selected_slot')
+        else:
+            messagebox.showerror("Error", message)
+    
+    def on_booking_error(self, error):
+        self.book_button.state(['!disabled'])
+        messagebox.showerror("Error", f"Booking failed: {error}")
+    
+    def update_bookings_display(self):
+        user_id = self.user_id_entry.get().strip()
+        if not user_id:
+            self.bookings_tree.delete(*self.bookings_tree.get_children())
+            return
+        
+        # Repeated refreshes while one is running collapse into one more
+        self.executor.submit(
+            'user_bookings', self.parking_system.get_user_bookings, user_id,
+            callback=partial(self.show_user_bookings, user_id)
+        )
+    
+    def show_user_bookings(self, user_id, bookings):
+        # The user ID may have changed while the query ran
+        if user_id != self.user_id_entry.get().strip():
+            return
+        self.bookings_tree.delete(*self.bookings_tree.get_children())
+        
+        for booking in bookings:
+            self.bookings_tree.insert("", "end", values=(
+                booking.booking_id,
+                booking.slot_id,
+                booking.vehicle_number,
+                format_epoch(booking.start),
+                format_epoch(booking.end),
+                f"{CONFIG['pricing']['currency']}{booking.amount_paid}",
+                booking.payment_status.capitalize(),
+                "Release"
+            ))
+        
+        self.bookings_tree.bind("<Button-1>", self.on_booking_click)
+    
+    def on_booking_click(self, event):
+        item = self.bookings_tree.identify_row(event.y)
+        column = self.bookings_tree.identify_column(event.x)
+        
+        if item and column == "#8":
+            booking_id = self.bookings_tree.item(item, "values")[0]
+            self.release_booking(booking_id)
+    
+    def release_booking(self, booking_id):
+        if messagebox.askyesno("Confirm", "Are you sure you want to release this booking?"):
+            self.executor.submit(
+                ('release_slot', booking_id), self.parking_system.release_slot, booking_id,
+                callback=self.on_slot_released
+            )
+    
+    def on_slot_released(self, result):
+        success, message = result
+        if success:
+            messagebox.showinfo("Success", message)
+            self.update_slot_display()
+        else:
+            messagebox.showerror("Error", message)
+    
+    def show_admin_login(self):
+        login_window = tk.Toplevel(self.root)
+        login_window.title("Admin Login")
+        login_window.geometry("300x200")
+        
+        ttk.Label(login_window, text="Username:").pack(pady=5)
+        self.admin_user_entry = ttk.Entry(login_window)
+        self.admin_user_entry.pack(pady=5)
+        
+        ttk.Label(login_window, text="Password:").pack(pady=5)
+        self.admin_pass_entry = ttk.Entry(login_window, show="*")
+        self.admin_pass_entry.pack(pady=5)
+        
+        ttk.Button(
+            login_window, 
+            text="Login", 
+            command=self.authenticate_admin
+        ).pack(pady=10)
+    
+    def authenticate_admin(self):
+        username = self.admin_user_entry.get()
+        password = self.admin_pass_entry.get()
+        
+        self.executor.submit(
+            'authenticate_admin', self.parking_system.authenticate_admin, username, password,
+            callback=partial(self.on_admin_authenticated, self.admin_user_entry.master)
+        )
+    
+    def on_admin_authenticated(self, login_window, admin):
+        if not login_window.winfo_exists():
+            return
+        if admin:
+            login_window.destroy()
+            AdminInterface(self.root, self.parking_system, self.executor)
+        else:
+            messagebox.showerror("Error", "Invalid admin credentials")
+    
+    def on_close(self):
+        # Cancel any pending timer
+        if hasattr(self, 'refresh_timer') and self.refresh_timer:
+            self.root.after_cancel(self.refresh_timer)
+        self.parking_system.change_bus.unsubscribe(self.change_token)
+        self.executor.close()
+        self.stall_monitor.stop()
+        # Only asked for with --metrics, whose dump also holds the samples as ui_stall
+        if self.stall_monitor.metrics:
+            print(self.stall_monitor.format_histogram())
+        self.parking_system.close()
+        self.root.destroy()
+
+def run_kiosk(parking_system=None):
+    """Open the kiosk window on parking_system and run Tk until it is closed"""
+    root = tk.Tk()
+    ParkingApp(root, parking_system)
+    root.mainloop()
@@ -0,0 +1,369 @@
+"""In-memory slot availability and reservation indexes, and the booking lookup cache"""
+
+from datetime import datetime
+import threading
+import time
+import heapq
+import bisect
+from collections import OrderedDict
+
+from .config import CONFIG
+from .pricing import tariff_minutes
+
+class SlotIndex:
+    """In-memory availability of every slot, so slot lookups never touch SQLite.
+
+    A slot is free when its status is 'available' and it is active, exactly
+    like the old get_available_slots query. Free slots are tracked in a byte
+    array indexed by slot_id - base, plus a min-heap free list, once for all
+    slots (key None) and once per vehicle_type. Booking a slot only clears
+    its byte; the heap entry is dropped lazily when it reaches the top.
+    base is the lowest slot_id, so a shard whose ids start high up its id
+    block does not pay for the bytes below them.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {}  # slot_id -> [vehicle_type, available, is_active]
+        self.bitmaps = {}
+        self.free_lists = {}
+        self.counts = {}
+        self.base = 0
+    
+    def load(self, rows):
+        """Rebuild from (slot_id, status, vehicle_type, is_active) rows"""
+        rows = list(rows)
+        with self.lock:
+            self.slots = {}
+            self.bitmaps = {}
+            self.free_lists = {}
+            self.counts = {}
+            self.base = min(row[0] for row in rows) if rows else 0
+            for slot_id, status, vehicle_type, is_active in rows:
+                self._set(slot_id, vehicle_type, status == 'available', bool(is_active))
+    
+    def _keys(self, vehicle_type):
+        for key in (None, vehicle_type):
+            if key not in self.bitmaps:
+                self.bitmaps[key] = bytearray()
+                self.free_lists[key] = []
+                self.counts[key] = 0
+            yield key
+    
+    def _set(self, slot_id, vehicle_type, available, is_active):
+        old = self.slots.get(slot_id)
+        if old and old[0] != vehicle_type:
+            self._set(slot_id, old[0], False, False)
+            del self.slots[slot_id]
+        self.slots[slot_id] = [vehicle_type, available, is_active]
+        free = available and is_active
+        if not self.bitmaps:
+            self.base = slot_id
+        elif slot_id < self.base:
+            # A slot below every loaded one: shift the bitmaps up to make room
+            for bitmap in self.bitmaps.values():
+                bitmap[0:0] = bytes(self.base - slot_id)
+            self.base = slot_id
+        position = slot_id - self.base
+        for key in self._keys(vehicle_type):
+            bitmap = self.bitmaps[key]
+            if position >= len(bitmap):
+                bitmap.extend(bytes(max(position + 1 - len(bitmap), len(bitmap))))
+            if bitmap[position] == free:
+                continue
+            bitmap[position] = free
+            if free:
+                self.counts[key] += 1
+                heapq.heappush(self.free_lists[key], slot_id)
+            else:
+                self.counts[key] -= 1
+    
+    def update(self, slot_id, vehicle_type=None, available=None, is_active=None):
+        with self.lock:
+            old = self.slots.get(slot_id, ['regular', True, True])
+            self._set(
+                slot_id,
+                old[0] if vehicle_type is None else vehicle_type,
+                old[1] if available is None else available,
+                old[2] if is_active is None else is_active
+            )
+    
+    def vehicle_type(self, slot_id):
+        state = self.slots.get(slot_id)
+        return state[0] if state else None
+    
+    def mark_booked(self, slot_id):
+        self.update(slot_id, available=False)
+    
+    def mark_booked_many(self, slot_ids):
+        with self.lock:
+            for slot_id in slot_ids:
+                vehicle_type, _, is_active = self.slots.get(slot_id, ['regular', True, True])
+                self._set(slot_id, vehicle_type, False, is_active)
+    
+    def mark_available(self, slot_ids):
+        with self.lock:
+            for slot_id in slot_ids:
+                vehicle_type, _, is_active = self.slots.get(slot_id, ['regular', True, True])
+                self._set(slot_id, vehicle_type, True, is_active)
+    
+    def is_free(self, slot_id):
+        bitmap = self.bitmaps.get(None, b'')
+        position = slot_id - self.base
+        return 0 <= position < len(bitmap) and bitmap[position] == 1
+    
+    def count_free(self, vehicle_type=None):
+        return self.counts.get(vehicle_type, 0)
+    
+    def next_free(self, vehicle_type=None):
+        """Lowest free slot_id, or None"""
+        with self.lock:
+            if vehicle_type not in self.bitmaps:
+                return None
+            bitmap = self.bitmaps[vehicle_type]
+            heap = self.free_lists[vehicle_type]
+            while heap and not bitmap[heap[0] - self.base]:
+                heapq.heappop(heap)
+            # Stale and duplicate entries pile up under heavy churn
+            if len(heap) > 2 * self.counts[vehicle_type] + 64:
+                heap[:] = self._scan(bitmap, 0, None)
+            return heap[0] if heap else None
+    
+    def first_free(self, n, vehicle_type=None):
+        with self.lock:
+            bitmap = self.bitmaps.get(vehicle_type)
+            return self._scan(bitmap, 0, n) if bitmap else []
+    
+    def available_slots(self, vehicle_type=None):
+        return self.first_free(None, vehicle_type)
+    
+    def active_slots(self, vehicle_type=None):
+        """Every active slot_id (of vehicle_type, when given), free or not"""
+        with self.lock:
+            return sorted(
+                slot_id for slot_id, (slot_type, _, is_active) in self.slots.items()
+                if is_active and vehicle_type in (None, slot_type)
+            )
+    
+    def free_run(self, n, vehicle_type=None):
+        """Lowest n consecutive free slot_ids, or [] if there is no such run"""
+        with self.lock:
+            bitmap = self.bitmaps.get(vehicle_type)
+            start = bitmap.find(b'\x01' * n) if bitmap and n > 0 else -1
+            return list(range(self.base + start, self.base + start + n)) if start != -1 else []
+    
+    def _scan(self, bitmap, start, limit):
+        found = []
+        position = bitmap.find(1, start)
+        while position != -1 and (limit is None or len(found) < limit):
+            found.append(self.base + position)
+            position = bitmap.find(1, position + 1)
+        return found
+    
+    def snapshot(self):
+        with self.lock:
+            return {slot_id: tuple(state) for slot_id, state in self.slots.items()}
+    
+    def slot_states(self):
+        """(slot_id, free) for every active slot, in slot_id order"""
+        with self.lock:
+            return [
+                (slot_id, available)
+                for slot_id, (_, available, is_active) in sorted(self.slots.items())
+                if is_active
+            ]
+
+class ReservationIndex:
+    """Reserved windows of every slot, kept in memory next to the reservations table.
+
+    Windows on one slot never overlap (conflicting reservations are
+    refused), so each slot keeps them as parallel lists sorted by start and
+    the ends come out sorted too. Whether [start, end) is free is then one
+    bisect: only the last window starting before end can reach past start.
+    Times are minutes since TARIFF_EPOCH; windows that have ended are
+    dropped as new ones are added.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slots = {}  # slot_id -> (starts, ends, reservation_ids)
+        self.count = 0
+    
+    def load(self, rows):
+        """Rebuild from (reservation_id, slot_id, start_time, end_time) rows"""
+        with self.lock:
+            self.slots = {}
+            self.count = 0
+            for reservation_id, slot_id, start, end in sorted(rows, key=lambda row: row[2]):
+                self._add(reservation_id, slot_id, tariff_minutes(start), tariff_minutes(end))
+    
+    def _add(self, reservation_id, slot_id, start, end):
+        starts, ends, ids = self.slots.setdefault(slot_id, ([], [], []))
+        i = bisect.bisect_left(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, end)
+        ids.insert(i, reservation_id)
+        self.count += 1
+    
+    def add(self, reservation_id, slot_id, start, end, now=None):
+        with self.lock:
+            self._add(reservation_id, slot_id, tariff_minutes(start), tariff_minutes(end))
+            self._prune(slot_id, tariff_minutes(now or datetime.now()))
+    
+    def remove(self, reservation_id, slot_id):
+        with self.lock:
+            starts, ends, ids = self.slots.get(slot_id, ([], [], []))
+            if reservation_id in ids:
+                i = ids.index(reservation_id)
+                del starts[i], ends[i], ids[i]
+                self.count -= 1
+    
+    def _prune(self, slot_id, now):
+        starts, ends, ids = self.slots[slot_id]
+        ended = bisect.bisect_right(ends, now)
+        if ended:
+            del starts[:ended], ends[:ended], ids[:ended]
+            self.count -= ended
+    
+    def _conflict(self, slot_id, start, end):
+        windows = self.slots.get(slot_id)
+        if not windows:
+            return None
+        starts, ends, ids = windows
+        i = bisect.bisect_left(starts, end)
+        return ids[i - 1] if i and ends[i - 1] > start else None
+    
+    def conflict(self, slot_id, start, end):
+        """reservation_id of a window overlapping [start, end) on slot_id, or None"""
+        with self.lock:
+            return self._conflict(slot_id, tariff_minutes(start), tariff_minutes(end))
+    
+    def free_slots(self, slot_ids, start, end):
+        """The slot_ids with no reserved window overlapping [start, end), in order"""
+        start, end = tariff_minutes(start), tariff_minutes(end)
+        bisect_left = bisect.bisect_left
+        taken = set()
+        with self.lock:
+            slots = self.slots
+            if len(slot_ids) < len(slots):
+                windows = [(slot_id, slots[slot_id]) for slot_id in slot_ids if slot_id in slots]
+            else:
+                windows = slots.items()
+            for slot_id, (starts, ends, _) in windows:
+                i = bisect_left(starts, end)
+                if i and ends[i - 1] > start:
+                    taken.add(slot_id)
+        return [slot_id for slot_id in slot_ids if slot_id not in taken] if taken else list(slot_ids)
+    
+    def snapshot(self, after=None):
+        """{reservation_id: (slot_id, start, end)} for windows ending after after"""
+        after = tariff_minutes(after) if after is not None else float('-inf')
+        with self.lock:
+            return {
+                reservation_id: (slot_id, start, end)
+                for slot_id, (starts, ends, ids) in self.slots.items()
+                for reservation_id, start, end in zip(ids, starts, ends)
+                if end > after
+            }
+
+class BookingCache:
+    """Recently read active bookings by user_id and by vehicle_number.
+
+    A read-through LRU of at most max_entries lists: get() returns the
+    cached bookings or loads, stores and returns them. Commits drop exactly
+    the entries they change. A new booking names its user and plate
+    (invalidate_owners); a release, expiry or payment names its bookings
+    (invalidate_bookings), found through holders. A booking in no entry is
+    in no cached answer, so nothing else needs dropping. A load that
+    overlaps an invalidation is returned but not stored, and ttl_s bounds
+    how long a change committed by another process can go unseen.
+    """
+    kinds = ('user', 'vehicle')
+    
+    def __init__(self, max_entries=None, ttl_s=None):
+        settings = CONFIG['booking_cache']
+        self.max_entries = settings['max_entries'] if max_entries is None else max_entries
+        self.ttl = settings['ttl_s'] if ttl_s is None else ttl_s
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (kind, key) -> (expires, bookings), least recent first
+        self.holders = {}             # booking_id -> {(kind, key)} of the entries holding it
+        self.generation = 0           # Bumped by every invalidation
+        self.hits = dict.fromkeys(self.kinds, 0)
+        self.misses = dict.fromkeys(self.kinds, 0)
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, kind, key, load):
+        """The bookings cached under (kind, key), else load() stored there"""
+        if not self.max_entries:
+            return load()
+        entry_key = (kind, key)
+        with self.lock:
+            entry = self.entries.get(entry_key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(entry_key)
+                    self.hits[kind] += 1
+                    return list(entry[1])
+                self._drop(entry_key)
+                self.expirations += 1
+            self.misses[kind] += 1
+            generation = self.generation
+        bookings = load()
+        with self.lock:
+            # Whatever was invalidated meanwhile may or may not be in bookings
+            if generation == self.generation:
+                self._store(entry_key, bookings)
+        return bookings
+    
+    def _store(self, entry_key, bookings):
+        if entry_key in self.entries:
+            self._drop(entry_key)
+        bookings = tuple(bookings)
+        self.entries[entry_key] = (time.monotonic() + self.ttl, bookings)
+        for booking in bookings:
+            self.holders.setdefault(booking.booking_id, set()).add(entry_key)
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+    
+    def _drop(self, entry_key):
+        _, bookings = self.entries.pop(entry_key)
+        for booking in bookings:
+            holders = self.holders.get(booking.booking_id)
+            if holders is not None:
+                holders.discard(entry_key)
+                if not holders:
+                    del self.holders[booking.booking_id]
+    
+    def invalidate_owners(self, user_ids=(), vehicle_numbers=()):
+        """Drop the entries that new bookings for these users and plates belong in"""
+        with self.lock:
+            self.generation += 1
+            for entry_key in ([('user', user_id) for user_id in user_ids]
+                              + [('vehicle', vehicle_number) for vehicle_number in vehicle_numbers]):
+                if entry_key in self.entries:
+                    self._drop(entry_key)
+                    self.invalidations += 1
+    
+    def invalidate_bookings(self, booking_ids):
+        """Drop the entries holding any of these bookings"""
+        with self.lock:
+            self.generation += 1
+            for booking_id in booking_ids:
+                for entry_key in list(self.holders.get(int(booking_id), ())):
+                    self._drop(entry_key)
+                    self.invalidations += 1
+    
+    def stats(self):
+        with self.lock:
+            lookups = sum(self.hits.values()) + sum(self.misses.values())
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "hit_ratio": round(sum(self.hits.values()) / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
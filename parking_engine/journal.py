@@ -0,0 +1,518 @@
+"""Write-ahead booking journal and the in-memory booking engine built on it"""
+
+from datetime import datetime, timedelta
+import logging
+import threading
+import json
+import glob
+import zlib
+import os
+import time
+
+from .config import CONFIG
+from .system import ParkingSystem
+from .expiry import ExpiryScheduler
+from .pricing import PaymentService
+from .records import Booking, epoch_micros
+
+log = logging.getLogger(__name__)
+
+class JournalError(Exception):
+    """The journal could not be written; nothing more is acknowledged"""
+
+def encode_entry(entry):
+    """One journal line: the CRC32 of the JSON entry, then the entry"""
+    payload = json.dumps(entry, separators=(',', ':')).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+def read_segment(path):
+    """The entries of one segment file, up to the first torn or corrupt line"""
+    entries = []
+    with open(path, 'rb') as f:
+        for line in f:
+            crc, _, payload = line.rstrip(b"\n").partition(b" ")
+            # A crash mid-write leaves a partial last line; nothing after it
+            # was acknowledged
+            if not line.endswith(b"\n") or crc != b"%08x" % zlib.crc32(payload):
+                break
+            entries.append(json.loads(payload))
+    return entries
+
+class BookingJournal:
+    """Append-only, group-committed log of booking mutations.
+    
+    Writers append entries (lists starting with their sequence number) to a
+    buffer; one flusher thread writes whatever has gathered as a single
+    write and fsync, so a burst of bookings shares each disk flush. The
+    journal is a series of segment files; a segment is deleted once the
+    checkpointer has applied every entry in it.
+    """
+    def __init__(self, path, next_seq=1, commit_interval_ms=None, segment_bytes=None,
+                 on_backlog=None, backlog=None):
+        settings = CONFIG['journal']
+        self.path = path
+        self.commit_interval = (settings['commit_interval_ms'] if commit_interval_ms is None
+                                else commit_interval_ms) / 1000
+        self.segment_bytes = segment_bytes or settings['segment_bytes']
+        self.on_backlog = on_backlog
+        self.backlog = backlog or settings['checkpoint_batch']
+        self.condition = threading.Condition()
+        self.next_seq = next_seq
+        self.durable_seq = next_seq - 1
+        self.buffer = []       # Encoded lines not yet written
+        self.entries = []      # Their entries, in sequence order
+        self.unapplied = []    # Durable entries the checkpointer has not applied
+        self.segments = []     # (path, last seq) of full segment files
+        self.error = None
+        self.stopping = False
+        self.batches = 0
+        segment_number = max([self._segment_number(path) for path in self.segment_paths(path)] + [0])
+        self.segment_number = segment_number + 1
+        self.file = self._open_segment()
+        self.thread = threading.Thread(target=self._run, name="parking-journal", daemon=True)
+        self.thread.start()
+    
+    @staticmethod
+    def segment_paths(path):
+        """Existing segment files of the journal at path, oldest first"""
+        return sorted(glob.glob(glob.escape(path) + ".[0-9]*"))
+    
+    @staticmethod
+    def _segment_number(segment_path):
+        return int(segment_path.rsplit(".", 1)[1])
+    
+    def _segment_path(self, number):
+        return f"{self.path}.{number:06d}"
+    
+    def _open_segment(self):
+        # Unbuffered, so a failed batch leaves no bytes behind in Python to
+        # be written later
+        segment = open(self._segment_path(self.segment_number), 'ab', buffering=0)
+        # A new file only survives a crash once its directory entry is on disk
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        return segment
+    
+    def append(self, entry):
+        """Buffer entry (its seq is filled in) and return the seq to wait for"""
+        with self.condition:
+            if self.error:
+                raise JournalError(self.error)
+            seq = self.next_seq
+            self.next_seq += 1
+            entry[0] = seq
+            self.buffer.append(encode_entry(entry))
+            self.entries.append(entry)
+            if len(self.buffer) == 1:
+                self.condition.notify_all()
+            return seq
+    
+    def wait_durable(self, seq):
+        """Block until every entry up to seq is on disk"""
+        with self.condition:
+            while self.durable_seq < seq and not self.error:
+                self.condition.wait()
+            if self.error:
+                raise JournalError(self.error)
+    
+    def sync(self):
+        """Block until everything appended so far is on disk"""
+        with self.condition:
+            last = self.next_seq - 1
+        self.wait_durable(last)
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.buffer and not self.stopping:
+                    self.condition.wait()
+                if not self.buffer:
+                    return
+            if self.commit_interval and not self.stopping:
+                # Let the rest of a burst join this commit
+                time.sleep(self.commit_interval)
+            with self.condition:
+                lines, self.buffer = self.buffer, []
+                entries, self.entries = self.entries, []
+            offset = self.file.tell()
+            try:
+                data = memoryview(b"".join(lines))
+                while data:
+                    data = data[self.file.write(data):]
+                os.fsync(self.file.fileno())
+            except OSError as e:
+                self._fail(f"Booking journal unwritable: {e}", offset)
+                return
+            with self.condition:
+                self.durable_seq = entries[-1][0]
+                self.unapplied.extend(entries)
+                self.batches += 1
+                backlog = len(self.unapplied)
+                self.condition.notify_all()
+            if self.file.tell() >= self.segment_bytes:
+                try:
+                    self._next_segment(entries[-1][0])
+                except OSError as e:
+                    self._fail(f"Booking journal unwritable: {e}")
+                    return
+            if self.on_backlog and backlog >= self.backlog:
+                self.on_backlog()
+    
+    def _fail(self, error, offset=None):
+        # Nothing more is acknowledged. A batch that failed was never
+        # acknowledged, so it is cut off the segment again: replaying it
+        # after a restart would apply bookings their callers saw fail.
+        log.error(error)
+        if offset is not None:
+            try:
+                os.ftruncate(self.file.fileno(), offset)
+                os.fsync(self.file.fileno())
+            except OSError as e:
+                log.error("Could not cut the failed batch off the journal: %s", e)
+        with self.condition:
+            self.error = error
+            self.condition.notify_all()
+    
+    def _next_segment(self, last_seq):
+        # Only the flusher writes, so it can switch files between batches
+        self.file.close()
+        with self.condition:
+            self.segments.append((self._segment_path(self.segment_number), last_seq))
+            self.segment_number += 1
+        self.file = self._open_segment()
+    
+    def pending_entries(self):
+        """Durable entries not yet applied, oldest first"""
+        with self.condition:
+            return list(self.unapplied)
+    
+    def applied(self, seq):
+        """The checkpointer has committed everything up to seq: forget it and drop full segments"""
+        with self.condition:
+            self.unapplied = [entry for entry in self.unapplied if entry[0] > seq]
+            done = [path for path, last in self.segments if last <= seq]
+            self.segments = [(path, last) for path, last in self.segments if last > seq]
+        for path in done:
+            os.remove(path)
+    
+    def close(self):
+        """Write what is buffered and stop; the segment files stay for replay"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.file.close()
+
+class JournaledParkingSystem(ParkingSystem):
+    """ParkingSystem that books and releases in memory behind a write-ahead journal.
+    
+    book_slot and release_slot check the in-memory slot index and pending
+    bookings, append one journal entry and return once the group commit
+    holding it is on disk (or at once with durability 'window'). A
+    checkpointer thread writes the journal to the bookings and slots tables
+    in one transaction per checkpoint, where the statistics, change feed and
+    payment outbox pick the changes up as usual. Opening replays whatever
+    the last run journaled but never checkpointed.
+    
+    Every other mutation still commits straight to SQLite, after a
+    checkpoint so it sees every journaled booking. Reads of the tables
+    (admin lists, statistics) lag by up to one checkpoint interval; slot
+    availability and the bookings of a user or plate are always current.
+    """
+    # Concurrent book_slot and release_slot calls share a group commit, so
+    # the server need not run them one at a time
+    group_commits = True
+    # Direct mutations, and the checks that compare memory with the tables
+    CHECKPOINTED_CALLS = (
+        'book_slots_bulk', 'release_bookings_bulk', 'reserve_slot', 'cancel_reservation',
+        'check_in_reservation', 'set_slot_active', 'add_slot', 'check_expired_bookings',
+        'reprice_bookings', 'rebuild_stats', 'archive_bookings', 'check_stats', 'check_slot_index',
+    )
+    
+    def __init__(self, db_path=None, expiry_checker=True, journal_path=None, durability=None, **options):
+        settings = CONFIG['journal']
+        # Expiry starts after replay, so it also schedules the replayed bookings
+        super().__init__(db_path, expiry_checker=False, **options)
+        self.durability = durability or settings['durability']
+        if self.durability not in ('fsync', 'window'):
+            raise ValueError(f"Unknown journal durability: {self.durability}")
+        self.journal_path = journal_path or settings['path'] or f"{self.db_path}-booklog"
+        # Lock order: lock, then checkpoint_lock, then pending_lock
+        self.lock = threading.RLock()
+        self.checkpoint_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.pending_bookings = {}  # booking_id -> (seq, Booking) journaled, not yet in the tables
+        self.pending_releases = {}  # booking_id -> seq
+        
+        last_seq = self._replay()
+        self.next_booking_id = self._last_booking_id() + 1
+        self.checkpoint_wakeup = threading.Event()
+        self.journal = BookingJournal(self.journal_path, last_seq + 1,
+                                      on_backlog=self.checkpoint_wakeup.set)
+        self.metrics.add_collector('journal', self.journal_metrics)
+        for name in self.CHECKPOINTED_CALLS:
+            setattr(self, name, self._after_checkpoint(getattr(self, name)))
+        
+        self.checkpoints = 0
+        self.stopping = False
+        self.checkpointer = threading.Thread(target=self._run_checkpoints, name="parking-checkpoint",
+                                             daemon=True)
+        self.checkpointer.start()
+        if expiry_checker:
+            self.expiry_scheduler = ExpiryScheduler(self)
+            self.expiry_scheduler.start()
+            self.metrics.add_collector('expiry', self.expiry_scheduler.stats)
+    
+    def _replay(self):
+        """Apply the journal entries the last run left unapplied; returns the last seq seen"""
+        applied_seq = self.execute_query(
+            "SELECT applied_seq FROM journal_state WHERE id = 1", fetch=True
+        )[0][0]
+        segments = BookingJournal.segment_paths(self.journal_path)
+        entries = [entry for path in segments for entry in read_segment(path)]
+        replay = [entry for entry in entries if entry[0] > applied_seq]
+        if replay:
+            # Durable before the segments holding these entries are removed
+            with self.pool.transaction(durable=True) as cursor:
+                self._apply(cursor, replay)
+            self.rebuild_slot_index()
+            log.info("Replayed %d journaled booking changes", len(replay))
+        # Everything is in the tables now; later segments start from scratch
+        for path in segments:
+            os.remove(path)
+        return max([applied_seq] + [entry[0] for entry in entries])
+    
+    def _last_booking_id(self):
+        return self.execute_query(
+            "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'bookings'), 0)", fetch=True
+        )[0][0]
+    
+    def _apply(self, cursor, entries):
+        """Write journal entries to the tables inside the caller's transaction"""
+        user_ids, vehicle_numbers, released = set(), set(), []
+        for entry in entries:
+            if entry[1] == 'book':
+                booking_id, slot_id, user_id, vehicle_number, start, end, amount = entry[2:9]
+                # Entries journaled before the type was recorded take the slot's
+                vehicle_type = entry[9] if len(entry) > 9 else self.slot_index.vehicle_type(slot_id)
+                user_ids.add(user_id)
+                vehicle_numbers.add(vehicle_number)
+                cursor.execute("UPDATE slots SET status = 'booked' WHERE slot_id = ?", (slot_id,))
+                cursor.execute('''
+                INSERT INTO bookings (
+                    booking_id, slot_id, user_id, vehicle_number,
+                    start_time, end_time, amount_paid, payment_status, vehicle_type
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (booking_id, slot_id, user_id, vehicle_number, start, end, amount,
+                      'pending' if amount > 0 else 'paid', vehicle_type))
+                self._queue_payment(cursor, [booking_id], amount)
+            else:
+                _, _, booking_id = entry
+                released.append(booking_id)
+                cursor.execute('''
+                UPDATE slots SET status = 'available'
+                WHERE slot_id = (
+                    SELECT slot_id FROM bookings WHERE booking_id = ? AND status = 'active'
+                )
+                ''', (booking_id,))
+                cursor.execute(
+                    "UPDATE bookings SET status = 'completed' WHERE booking_id = ? AND status = 'active'",
+                    (booking_id,)
+                )
+        cursor.execute("UPDATE journal_state SET applied_seq = ? WHERE id = 1", (entries[-1][0],))
+        # Cached table reads change here, before the entries leave pending
+        self.pool.after_commit(lambda: self.booking_cache.invalidate_owners(user_ids, vehicle_numbers))
+        self.pool.after_commit(lambda: self.booking_cache.invalidate_bookings(released))
+    
+    def checkpoint(self):
+        """Write every journaled change to the tables; returns how many were applied"""
+        with self.checkpoint_lock:
+            # Appended entries still on their way to disk are included
+            self.journal.sync()
+            entries = self.journal.pending_entries()
+            if not entries:
+                return 0
+            # Under WAL with synchronous=NORMAL a commit survives a crash of
+            # the process but not a power loss; the journal is the only
+            # fsynced copy of these entries until this commit is on disk
+            with self.pool.transaction(durable=True) as cursor:
+                self._apply(cursor, entries)
+            seq = entries[-1][0]
+            self.journal.applied(seq)
+            with self.pending_lock:
+                for booking_id, (booked_seq, _) in list(self.pending_bookings.items()):
+                    if booked_seq <= seq:
+                        del self.pending_bookings[booking_id]
+                for booking_id, released_seq in list(self.pending_releases.items()):
+                    if released_seq <= seq:
+                        del self.pending_releases[booking_id]
+            self.checkpoints += 1
+            return len(entries)
+    
+    def _run_checkpoints(self):
+        interval = CONFIG['journal']['checkpoint_interval_ms'] / 1000
+        while not self.stopping:
+            self.checkpoint_wakeup.wait(interval)
+            self.checkpoint_wakeup.clear()
+            try:
+                self.checkpoint()
+            except JournalError:
+                return
+            except Exception:
+                log.exception("Checkpoint failed, retrying")
+    
+    def _after_checkpoint(self, method):
+        def call(*args, **kwargs):
+            with self.lock:
+                self.checkpoint()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    # Bulk and reservation bookings take ids from SQLite
+                    self.next_booking_id = max(self.next_booking_id, self._last_booking_id() + 1)
+        call.__name__ = method.__name__
+        call.__doc__ = method.__doc__
+        return call
+    
+    def _acknowledge(self, seq):
+        if self.durability == 'fsync':
+            self.journal.wait_durable(seq)
+    
+    def book_slot(self, slot_id, user_id, vehicle_number, duration_minutes=60):
+        start_time = datetime.now()
+        end_time = start_time + timedelta(minutes=duration_minutes)
+        slot_id = int(slot_id)
+        
+        seq = None
+        try:
+            with self.lock:
+                if not self.slot_index.is_free(slot_id):
+                    return False, "Slot is not available"
+                if self.reservations.count and self.reservations.conflict(slot_id, start_time, end_time):
+                    # Rare: the direct path words the refusal
+                    return self._after_checkpoint(super().book_slot)(
+                        slot_id, user_id, vehicle_number, duration_minutes
+                    )
+                vehicle_type = self.slot_index.vehicle_type(slot_id)
+                amount = PaymentService.calculate_charge(start_time, end_time, vehicle_type)
+                booking_id = self.next_booking_id
+                start, end = start_time.isoformat(), end_time.isoformat()
+                seq = self.journal.append([
+                    0, 'book', booking_id, slot_id, user_id, vehicle_number, start, end, amount, vehicle_type
+                ])
+                self.next_booking_id += 1
+                self.slot_index.mark_booked(slot_id)
+                with self.pending_lock:
+                    self.pending_bookings[booking_id] = (seq, Booking(
+                        booking_id, slot_id, user_id, vehicle_number, epoch_micros(start_time),
+                        epoch_micros(end_time), 'active', amount, 'pending' if amount > 0 else 'paid',
+                        vehicle_type
+                    ))
+            self._acknowledge(seq)
+        except JournalError as e:
+            log.error("Journaled booking failed: %s", e)
+            if seq is not None:
+                # Never durable, so never applied: give the slot back
+                with self.lock:
+                    with self.pending_lock:
+                        self.pending_bookings.pop(booking_id, None)
+                    self.slot_index.mark_available([slot_id])
+            return False, "Booking failed, please try again"
+        
+        if self.expiry_scheduler:
+            self.expiry_scheduler.schedule(booking_id, end_time)
+        
+        return True, f"Slot {slot_id} booked successfully until {end_time.strftime('%Y-%m-%d %H:%M:%S')}"
+    
+    def release_slot(self, booking_id):
+        booking_id = int(booking_id)
+        seq = None
+        try:
+            with self.lock:
+                with self.pending_lock:
+                    released = booking_id in self.pending_releases
+                    pending = self.pending_bookings.get(booking_id)
+                if released:
+                    return False, "Booking not found or already released"
+                if pending:
+                    slot_id = pending[1].slot_id
+                else:
+                    rows = self.execute_query(
+                        "SELECT slot_id FROM bookings WHERE booking_id = ? AND status = 'active'",
+                        (booking_id,), fetch=True
+                    )
+                    if not rows:
+                        return False, "Booking not found or already released"
+                    slot_id = rows[0][0]
+                seq = self.journal.append([0, 'release', booking_id])
+                self.slot_index.mark_available([slot_id])
+                with self.pending_lock:
+                    self.pending_releases[booking_id] = seq
+            self._acknowledge(seq)
+        except JournalError as e:
+            log.error("Journaled release failed: %s", e)
+            if seq is not None:
+                # The booking still holds its slot
+                with self.lock:
+                    with self.pending_lock:
+                        self.pending_releases.pop(booking_id, None)
+                    self.slot_index.mark_booked(slot_id)
+            return False, "Release failed, please try again"
+        
+        if self.expiry_scheduler:
+            self.expiry_scheduler.cancel(booking_id)
+        
+        return True, f"Slot {slot_id} released successfully"
+    
+    def _with_pending(self, read, field, value):
+        # The tables and the pending changes are read without a checkpoint
+        # landing in between
+        with self.checkpoint_lock:
+            bookings = read(value)
+            with self.pending_lock:
+                released = set(self.pending_releases)
+                pending = [booking for _, booking in self.pending_bookings.values()
+                           if getattr(booking, field) == value]
+        bookings = [booking for booking in bookings + pending if booking.booking_id not in released]
+        bookings.sort(key=lambda booking: booking.end)
+        return bookings
+    
+    def get_user_bookings(self, user_id):
+        return self._with_pending(super().get_user_bookings, 'user_id', user_id)
+    
+    def get_vehicle_bookings(self, vehicle_number):
+        return self._with_pending(super().get_vehicle_bookings, 'vehicle_number', vehicle_number)
+    
+    def journal_metrics(self):
+        with self.journal.condition:
+            return {
+                "durability": self.durability,
+                "appended_seq": self.journal.next_seq - 1,
+                "durable_seq": self.journal.durable_seq,
+                "group_commits": self.journal.batches,
+                "unapplied": len(self.journal.unapplied),
+                "checkpoints": self.checkpoints,
+            }
+    
+    def close(self):
+        self.stopping = True
+        self.checkpoint_wakeup.set()
+        self.checkpointer.join()
+        if self.expiry_scheduler:
+            self.expiry_scheduler.stop()
+            self.expiry_scheduler = None
+        try:
+            self.checkpoint()
+            checkpointed = True
+        except Exception:
+            log.exception("Final checkpoint failed")
+            checkpointed = False
+        self.journal.close()
+        if checkpointed and not self.journal.error:
+            # Checkpointed in full, every checkpoint durable: nothing to replay
+            for path in BookingJournal.segment_paths(self.journal_path):
+                os.remove(path)
+        super().close()
@@ -0,0 +1,350 @@
+"""Opt-in profiling: latency histograms, counters and the slow-query log"""
+
+import logging
+import sqlite3
+from datetime import datetime
+import threading
+import time
+import json
+import bisect
+from collections import deque
+from functools import wraps
+
+from .config import CONFIG
+
+log = logging.getLogger(__name__)
+
+# Profiling
+#
+# Metrics is off unless CONFIG['metrics']['enabled'] (or --metrics) turns it
+# on before the ParkingSystem is created. Disabled, nothing is wrapped: the
+# pool hands out plain sqlite3 connections and every method is the class's
+# own, so the hot paths run exactly as they would without it.
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+class Histogram:
+    """Latency histogram over fixed bucket bounds, in seconds"""
+    BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+              0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile, in seconds"""
+        target = self.count * pct / 100
+        seen = 0
+        for bound, count in zip(self.BOUNDS + (self.max,), self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max)
+        return 0.0
+    
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets': dict(zip([str(bound) for bound in self.BOUNDS] + ['+Inf'], self.counts)),
+        }
+
+class Metrics:
+    """Latency histograms, counters and a slow-query log for ParkingSystem.
+
+    Histograms and counters are keyed by (metric, label) and described in
+    HISTOGRAMS and COUNTERS, which also name their label for the Prometheus
+    export. Collectors are callables returning {name: number} (or one level
+    of nested dicts), only read when a snapshot is taken.
+    """
+    # metric -> (label name or None, help); histograms are in seconds
+    HISTOGRAMS = {
+        'operation': ('operation', "ParkingSystem call latency"),
+        'query': ('query', "Statement latency up to its first row"),
+        'fetch': ('query', "Time fetching the rest of a query's rows"),
+        'transaction': (None, "Time the writer was held per transaction, commit included"),
+        'commit': (None, "COMMIT latency"),
+        'lock_wait': ('pool', "Time waiting to check out a pooled connection"),
+        'http': ('route', "Server request latency"),
+        'ui': ('handler', "UI refresh and callback time on the Tk main thread"),
+        'ui_stall': (None, "How late Tk main-thread timers fired"),
+    }
+    COUNTERS = {
+        'errors': ('operation', "Calls that raised or failed"),
+        'vm_steps': ('query', "SQLite VM steps sampled by the progress handler; a proxy for rows scanned"),
+        'slow_queries': ('query', "Statements slower than slow_query_ms"),
+        'rollbacks': (None, "Transactions rolled back"),
+    }
+    
+    def __init__(self, enabled=None, slow_query_ms=None):
+        settings = CONFIG['metrics']
+        self.enabled = settings['enabled'] if enabled is None else enabled
+        if slow_query_ms is None:
+            slow_query_ms = settings['slow_query_ms']
+        self.slow_query_s = slow_query_ms / 1000
+        self.vm_step_interval = settings['vm_step_interval']
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = {}
+        self.slow_queries = deque(maxlen=settings['slow_query_log'])
+        self.labels = {}  # SQL -> query label
+        self.plans = {}   # SQL -> EXPLAIN QUERY PLAN lines
+        self.started = time.time()
+    
+    def observe(self, metric, label, seconds):
+        with self.lock:
+            histogram = self.histograms.get((metric, label))
+            if histogram is None:
+                histogram = self.histograms[(metric, label)] = Histogram()
+            histogram.observe(seconds)
+    
+    def inc(self, metric, label=None, amount=1):
+        with self.lock:
+            self.counters[(metric, label)] = self.counters.get((metric, label), 0) + amount
+    
+    def add_collector(self, name, collect):
+        self.collectors[name] = collect
+    
+    def wrap(self, metric, label, fn):
+        """fn, timing every call into the metric histogram and counting the ones that raise"""
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                self.inc('errors', label)
+                raise
+            finally:
+                self.observe(metric, label, time.perf_counter() - started)
+        return timed
+    
+    def instrument(self, obj, metric, names):
+        """Replace obj's methods names with timed ones, when enabled.
+
+        The wrappers are instance attributes, so call this before any of
+        the methods is handed out as a callback.
+        """
+        if self.enabled:
+            for name in names:
+                setattr(obj, name, self.wrap(metric, name, getattr(obj, name)))
+    
+    def query_label(self, sql):
+        label = self.labels.get(sql)
+        if label is None:
+            label = " ".join(sql.split())
+            if len(label) > 120:
+                label = label[:117] + "..."
+            self.labels[sql] = label
+        return label
+    
+    def record_query(self, conn, sql, params, seconds, vm_ticks):
+        label = self.query_label(sql)
+        self.observe('query', label, seconds)
+        if vm_ticks:
+            self.inc('vm_steps', label, vm_ticks * self.vm_step_interval)
+        if seconds >= self.slow_query_s:
+            self._log_slow_query(conn, sql, label, params, seconds)
+    
+    def _log_slow_query(self, conn, sql, label, params, seconds):
+        # Plans are looked up once per statement, on the connection that ran
+        # it; executemany (params None) has no single set of parameters
+        plan = self.plans.get(sql)
+        if plan is None and params is not None:
+            try:
+                plan = [
+                    row[3] for row in
+                    sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params)
+                ]
+            except sqlite3.Error as e:
+                plan = [f"No plan: {e}"]
+            self.plans[sql] = plan
+        self.inc('slow_queries', label)
+        with self.lock:
+            self.slow_queries.append({
+                'at': datetime.now().isoformat(timespec='milliseconds'),
+                'seconds': seconds,
+                'query': label,
+                'params': repr(params)[:200],
+                'plan': plan or [],
+            })
+    
+    def record_commit(self, work_seconds, commit_seconds):
+        self.observe('commit', None, commit_seconds)
+        self.observe('transaction', None, work_seconds + commit_seconds)
+    
+    def record_error(self, where):
+        if self.enabled:
+            self.inc('errors', where)
+    
+    def _collect(self):
+        values = {}
+        for name, collect in list(self.collectors.items()):
+            try:
+                collected = collect() or {}
+            except Exception:
+                log.exception("Metrics collector %s failed", name)
+                continue
+            for key, value in collected.items():
+                nested = value if isinstance(value, dict) else {None: value}
+                for sub, number in nested.items():
+                    if isinstance(number, (int, float)) and not isinstance(number, bool):
+                        values["_".join(part for part in (name, key, sub) if part)] = number
+        return values
+    
+    def to_json(self):
+        """The whole snapshot as a JSON-serializable dict"""
+        with self.lock:
+            histograms = {key: histogram.to_dict() for key, histogram in self.histograms.items()}
+            counters = dict(self.counters)
+            slow_queries = list(self.slow_queries)
+        grouped = {}
+        for (metric, label), histogram in sorted(histograms.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            grouped.setdefault(metric, {})[label or ""] = histogram
+        counted = {}
+        for (metric, label), value in sorted(counters.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            counted.setdefault(metric, {})[label or ""] = value
+        return {
+            'enabled': self.enabled,
+            'uptime_s': time.time() - self.started,
+            'totals': {
+                'operations': sum(h['count'] for h in grouped.get('operation', {}).values()),
+                'queries': sum(h['count'] for h in grouped.get('query', {}).values()),
+                'commits': sum(h['count'] for h in grouped.get('commit', {}).values()),
+                'rollbacks': sum(counted.get('rollbacks', {}).values()),
+                'errors': sum(counted.get('errors', {}).values()),
+                'slow_queries': sum(counted.get('slow_queries', {}).values()),
+                'lock_wait_s': sum(h['sum'] for h in grouped.get('lock_wait', {}).values()),
+            },
+            'histograms': grouped,
+            'counters': counted,
+            'gauges': self._collect(),
+            'slow_queries': slow_queries,
+        }
+    
+    def to_prometheus(self):
+        """The snapshot in the Prometheus text exposition format"""
+        def labels(name, value, *extra):
+            pairs = ([(name, value)] if name else []) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{_escape_label(val)}"' for key, val in pairs) + "}"
+        
+        with self.lock:
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in self.histograms.items()]
+            counters = list(self.counters.items())
+        lines = []
+        for metric, (label_name, help_text) in self.HISTOGRAMS.items():
+            series = sorted((key[1] or "", rest) for key, *rest in histograms if key[0] == metric)
+            if not series:
+                continue
+            name = f"parking_{metric}_seconds"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for label, (counts, total, count) in series:
+                cumulative = 0
+                for bound, bucket in zip(Histogram.BOUNDS + ("+Inf",), counts):
+                    cumulative += bucket
+                    lines.append(f"{name}_bucket{labels(label_name, label, ('le', bound))} {cumulative}")
+                lines.append(f"{name}_sum{labels(label_name, label)} {total:.6f}")
+                lines.append(f"{name}_count{labels(label_name, label)} {count}")
+        for metric, (label_name, help_text) in self.COUNTERS.items():
+            series = sorted((key[1] or "", value) for key, value in counters if key[0] == metric)
+            if not series:
+                continue
+            name = f"parking_{metric}_total"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for label, value in series:
+                lines.append(f"{name}{labels(label_name, label)} {value}")
+        for key, value in sorted(self._collect().items()):
+            lines += [f"# TYPE parking_{key} gauge", f"parking_{key} {value}"]
+        return "\n".join(lines) + "\n"
+    
+    def dump(self, path):
+        """Write the snapshot to path: JSON for .json, Prometheus text otherwise"""
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump(self.to_json(), f, indent=2, default=str)
+            else:
+                f.write(self.to_prometheus())
+
+class _ProfiledCursor(sqlite3.Cursor):
+    """Times every statement into its connection's Metrics.
+
+    execute() covers compiling the statement and stepping to its first row,
+    which for writes and aggregates is all the work; rows read afterwards
+    with fetchall() or fetchmany() are timed as 'fetch'.
+    """
+    label = None
+    
+    def execute(self, sql, params=()):
+        conn = self.connection
+        ticks = conn.vm_ticks
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            conn.metrics.record_query(conn, sql, params, time.perf_counter() - started,
+                                      conn.vm_ticks - ticks)
+            self.label = conn.metrics.query_label(sql)
+    
+    def executemany(self, sql, seq_of_params):
+        conn = self.connection
+        ticks = conn.vm_ticks
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            conn.metrics.record_query(conn, sql, None, time.perf_counter() - started,
+                                      conn.vm_ticks - ticks)
+            self.label = conn.metrics.query_label(sql)
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.connection.metrics.observe('fetch', self.label, time.perf_counter() - started)
+        return rows
+    
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.connection.metrics.observe('fetch', self.label, time.perf_counter() - started)
+        return rows
+
+class _ProfiledConnection(sqlite3.Connection):
+    """A connection whose cursors are _ProfiledCursors; ConnectionPool sets
+    metrics and installs tick() and traced() as SQLite callbacks"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = None
+        # Only ever touched by the thread holding the connection
+        self.vm_ticks = 0
+        self.statements = 0
+    
+    def cursor(self, factory=_ProfiledCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+    
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+    
+    def tick(self):
+        self.vm_ticks += 1
+        return 0
+    
+    def traced(self, statement):
+        self.statements += 1
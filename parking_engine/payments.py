@@ -0,0 +1,268 @@
+"""Payment gateways and the durable payment outbox"""
+
+import logging
+import threading
+import time
+import json
+import random
+from collections import deque
+
+from .config import CONFIG
+from .queries import PAYMENT_CLAIM_QUERY, PAYMENT_NEXT_DUE_QUERY, SET_PAYMENT_STATUS_QUERY
+from .pricing import PaymentService
+
+log = logging.getLogger(__name__)
+
+class PaymentError(Exception):
+    """A charge the gateway refused or could not confirm; it is retried"""
+
+class LocalGateway:
+    """Charges through PaymentService.process_payment, the built-in gateway.
+    
+    Gateways implement charge(idempotency_key, amount, timeout) and raise
+    PaymentError on failure. A retried charge reuses its idempotency key, so
+    a gateway must not charge the same key twice.
+    """
+    def charge(self, idempotency_key, amount, timeout=None):
+        if not PaymentService.process_payment(amount):
+            raise PaymentError("Payment declined")
+
+class FakeGateway:
+    """Simulated gateway for tests and benchmarks.
+    
+    Every charge takes latency_ms on average (0.5x to 1.5x) and fails with
+    failure_rate. With lost_rate the charge goes through but the reply is
+    lost, so only the idempotency key stops the retry charging twice.
+    """
+    def __init__(self, latency_ms=200, failure_rate=0.0, lost_rate=0.0, seed=None):
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.lost_rate = lost_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.charged = {}  # idempotency_key -> amount
+        self.calls = 0
+        self.duplicates = 0
+    
+    def charge(self, idempotency_key, amount, timeout=None):
+        with self.lock:
+            self.calls += 1
+            roll = self.random.random()
+            latency = self.latency * (0.5 + self.random.random())
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise PaymentError("Gateway timed out")
+        time.sleep(latency)
+        with self.lock:
+            if idempotency_key in self.charged:
+                # Already charged: confirm again without charging
+                self.duplicates += 1
+                return
+            if roll < self.failure_rate:
+                raise PaymentError("Card declined")
+            self.charged[idempotency_key] = amount
+        if roll >= 1 - self.lost_rate:
+            raise PaymentError("Gateway reply lost")
+
+class PaymentOutbox:
+    """Worker pool that settles payment_outbox rows against a gateway.
+    
+    Bookings only add an outbox row in their own transaction, so payment
+    latency never reaches the booking path. Workers claim due rows in
+    batches, charge them with their idempotency keys, and record the
+    outcome in one transaction per batch: paid, retried later with
+    exponential backoff, or failed after max_attempts. A claimed row is
+    leased; if its worker dies it becomes due again when the lease ends.
+    A worker claims no more rows than it can charge within one lease, and
+    hands back untried any row it could not start in time, so a live
+    worker's rows are never reclaimed mid-charge.
+    """
+    def __init__(self, parking_system, gateway=None, workers=None):
+        self.settings = CONFIG['payments']
+        self.parking_system = parking_system
+        self.pool = parking_system.pool
+        self.gateway = gateway or LocalGateway()
+        self.worker_count = self.settings['workers'] if workers is None else workers
+        lease_s, timeout_s = self.settings['lease_s'], self.settings['timeout_s']
+        if timeout_s >= lease_s:
+            raise ValueError("payments.lease_s must be longer than payments.timeout_s")
+        # One charge's worth of the lease is left for recording the outcomes
+        self.claim_size = max(1, min(self.settings['batch_size'], int(lease_s // timeout_s) - 1))
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.stopping = False
+        self.threads = []
+        self.random = random.Random()
+        
+        self.lock = threading.Lock()
+        self.counters = {'batches': 0, 'charges': 0, 'paid': 0, 'retried': 0, 'failed': 0}
+        self.in_flight = 0
+        self.gateway_latencies = deque(maxlen=10000)
+        self.settle_latencies = deque(maxlen=10000)
+        self.started_at = time.time()
+    
+    def start(self):
+        for number in range(self.worker_count):
+            thread = threading.Thread(target=self._run, name=f"parking-payments-{number}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+    
+    def notify(self):
+        """Wake the workers; called after a transaction adds outbox rows"""
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+    
+    def _run(self):
+        while True:
+            with self.condition:
+                if self.stopping:
+                    return
+                generation = self.generation
+            try:
+                batch = self._claim()
+                if batch:
+                    self._settle(batch)
+                    continue
+                wait = self._idle_wait()
+            except Exception:
+                log.exception("Payment worker error")
+                wait = self.settings['backoff_s']
+            with self.condition:
+                # Sleep until the next retry is due or new rows are added
+                if generation == self.generation and not self.stopping:
+                    self.condition.wait(wait)
+    
+    def _claim(self):
+        with self.pool.transaction() as cursor:
+            return cursor.execute(PAYMENT_CLAIM_QUERY, (
+                time.time(), self.settings['lease_s'], self.claim_size
+            )).fetchall()
+    
+    def _idle_wait(self):
+        with self.pool.reader() as conn:
+            due = conn.execute(PAYMENT_NEXT_DUE_QUERY).fetchone()[0]
+        return None if due is None else max(0.0, due - time.time())
+    
+    def _backoff(self, attempts):
+        delay = min(self.settings['backoff_max_s'], self.settings['backoff_s'] * 2 ** (attempts - 1))
+        return delay * (0.5 + self.random.random())
+    
+    def _settle(self, batch):
+        with self.lock:
+            self.in_flight += len(batch)
+        try:
+            now, charged, paid, retried, failed = self._charge_and_record(batch)
+        finally:
+            # Also when recording the outcomes fails; the rows stay leased
+            with self.lock:
+                self.in_flight -= len(batch)
+        with self.lock:
+            self.counters['batches'] += 1
+            self.counters['charges'] += charged
+            self.counters['paid'] += len(paid)
+            self.counters['retried'] += len(retried)
+            self.counters['failed'] += len(failed)
+            self.settle_latencies.extend(now - created_at for _, _, created_at in paid)
+    
+    def _charge_and_record(self, batch):
+        timeout = self.settings['timeout_s']
+        deadline = time.monotonic() + self.settings['lease_s']
+        outcomes, unsent = [], []
+        for outbox_id, key, amount, booking_ids, attempts, created_at in batch:
+            if time.monotonic() + timeout > deadline:
+                # A gateway overran its timeouts; the lease could end mid-charge
+                unsent.append((outbox_id,))
+                continue
+            started = time.perf_counter()
+            try:
+                self.gateway.charge(key, amount, timeout=timeout)
+                error = None
+            except PaymentError as e:
+                error = str(e)
+            except Exception as e:
+                error = f"Gateway error: {e}"
+            with self.lock:
+                self.gateway_latencies.append(time.perf_counter() - started)
+            outcomes.append((outbox_id, booking_ids, attempts, created_at, error))
+        
+        now = time.time()
+        paid, retried, failed = [], [], []
+        for outbox_id, booking_ids, attempts, created_at, error in outcomes:
+            if error is None:
+                paid.append((outbox_id, booking_ids, created_at))
+            elif attempts < self.settings['max_attempts']:
+                retried.append((now + self._backoff(attempts), error, outbox_id))
+            else:
+                failed.append((outbox_id, booking_ids, error))
+        
+        with self.pool.transaction() as cursor:
+            cursor.executemany(
+                "UPDATE payment_outbox SET status = 'paid', completed_at = ?, last_error = NULL "
+                "WHERE outbox_id = ?",
+                [(now, outbox_id) for outbox_id, _, _ in paid]
+            )
+            cursor.executemany(
+                "UPDATE payment_outbox SET status = 'pending', next_attempt_at = ?, last_error = ? "
+                "WHERE outbox_id = ?",
+                retried
+            )
+            cursor.executemany(
+                "UPDATE payment_outbox SET status = 'failed', completed_at = ?, last_error = ? "
+                "WHERE outbox_id = ?",
+                [(now, error, outbox_id) for outbox_id, _, error in failed]
+            )
+            cursor.executemany(
+                "UPDATE payment_outbox SET status = 'pending', next_attempt_at = 0, attempts = attempts - 1 "
+                "WHERE outbox_id = ?",
+                unsent
+            )
+            cursor.executemany(SET_PAYMENT_STATUS_QUERY, (
+                [('paid', booking_ids) for _, booking_ids, _ in paid]
+                + [('failed', booking_ids) for _, booking_ids, _ in failed]
+            ))
+            # Cached bookings show their payment status
+            settled = [booking_id for _, booking_ids, _ in paid + failed
+                       for booking_id in json.loads(booking_ids)]
+            self.pool.after_commit(lambda: self.parking_system.booking_cache.invalidate_bookings(settled))
+        return now, len(outcomes), paid, retried, failed
+    
+    def pending(self):
+        """Outbox rows not yet settled"""
+        with self.pool.reader() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM payment_outbox WHERE status IN ('pending', 'processing')"
+            ).fetchone()[0]
+    
+    def metrics(self):
+        """Counters, throughput and latency percentiles for sizing the pool"""
+        def percentile(samples, pct):
+            if not samples:
+                return 0.0
+            ordered = sorted(samples)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000
+        
+        with self.lock:
+            metrics = dict(self.counters)
+            gateway = list(self.gateway_latencies)
+            settle = list(self.settle_latencies)
+            metrics['in_flight'] = self.in_flight
+        elapsed = time.time() - self.started_at
+        metrics.update({
+            'workers': self.worker_count,
+            'pending': self.pending(),
+            'paid_per_sec': metrics['paid'] / elapsed if elapsed > 0 else 0.0,
+            'gateway_p50_ms': percentile(gateway, 50),
+            'gateway_p99_ms': percentile(gateway, 99),
+            'settle_p50_ms': percentile(settle, 50),
+            'settle_p99_ms': percentile(settle, 99),
+        })
+        return metrics
+    
+    def stop(self):
+        """Let running batches finish, then stop the workers"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,208 @@
+"""SQLite connections: one writer plus WAL readers, handed out fairly"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+
+from .config import CONFIG
+from .metrics import _ProfiledConnection
+
+log = logging.getLogger(__name__)
+
+class _FairCheckout:
+    """A set of connections handed out first come, first served.
+
+    A thread returning a connection hands it straight to the longest waiter,
+    so a busy thread that checks connections in and out in a tight loop
+    cannot starve the others. Also records checkout metrics.
+    """
+    def __init__(self, connections):
+        self._lock = threading.Lock()
+        self._free = list(connections)
+        self._waiters = deque()
+        self.stats = {'checkouts': 0, 'contended': 0, 'wait_time': 0.0, 'max_wait': 0.0}
+        self.on_wait = None  # Called with each contended wait, in seconds
+    
+    def acquire(self):
+        with self._lock:
+            self.stats['checkouts'] += 1
+            if self._free and not self._waiters:
+                return self._free.pop()
+            self.stats['contended'] += 1
+            waiter = [threading.Event(), None]
+            self._waiters.append(waiter)
+        started = time.perf_counter()
+        waiter[0].wait()
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.stats['wait_time'] += waited
+            self.stats['max_wait'] = max(self.stats['max_wait'], waited)
+        if self.on_wait:
+            self.on_wait(waited)
+        return waiter[1]
+    
+    def release(self, conn):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter[1] = conn
+                waiter[0].set()
+            else:
+                self._free.append(conn)
+    
+    @contextmanager
+    def checkout(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+class ConnectionPool:
+    """One writer connection behind a lock plus a set of WAL reader connections.
+
+    In WAL mode readers never block the writer, so the expiry thread and the
+    admin dashboard can read while a kiosk is booking. Given an enabled
+    Metrics, the connections are profiled and checkout waits, commits and
+    rollbacks are recorded too.
+    """
+    def __init__(self, db_path, readers=None, metrics=None, **pragmas):
+        settings = dict(CONFIG['database_pool'])
+        settings.update(pragmas)
+        if readers is not None:
+            settings['readers'] = readers
+        self.db_path = db_path
+        self.settings = settings
+        self._metrics = metrics if metrics and metrics.enabled else None
+        
+        self.writer = self._connect()
+        self.writer.execute("PRAGMA journal_mode = WAL")
+        self._reader_conns = [self._connect() for _ in range(settings['readers'])]
+        self._writer_checkout = _FairCheckout([self.writer])
+        self._reader_checkout = _FairCheckout(self._reader_conns)
+        self._after_commit = []
+        self._commit_hooks = []
+        if self._metrics:
+            self._writer_checkout.on_wait = partial(self._metrics.observe, 'lock_wait', 'writer')
+            self._reader_checkout.on_wait = partial(self._metrics.observe, 'lock_wait', 'reader')
+            self._metrics.add_collector('pool', self.metrics)
+            self._metrics.add_collector('sqlite', self.sqlite_counts)
+    
+    def _connect(self):
+        # isolation_level=None: transactions are opened explicitly
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=self.settings['busy_timeout'] / 1000,
+            cached_statements=self.settings['cached_statements'],
+            factory=_ProfiledConnection if self._metrics else sqlite3.Connection
+        )
+        if self._metrics:
+            conn.metrics = self._metrics
+            conn.set_progress_handler(conn.tick, self._metrics.vm_step_interval)
+            conn.set_trace_callback(conn.traced)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.settings['busy_timeout'])}")
+        conn.execute(f"PRAGMA synchronous = {self.settings['synchronous']}")
+        conn.execute(f"PRAGMA cache_size = {int(self.settings['cache_size'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.settings['mmap_size'])}")
+        return conn
+    
+    def writer_connection(self):
+        return self._writer_checkout.checkout()
+    
+    def reader(self):
+        return self._reader_checkout.checkout()
+    
+    @contextmanager
+    def snapshot(self):
+        """A reader inside one read transaction, so every query sees the same commit"""
+        with self.reader() as conn:
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.execute("COMMIT")
+    
+    @contextmanager
+    def transaction(self, durable=False):
+        """Run the block in one BEGIN IMMEDIATE transaction on the writer.
+
+        durable=True commits with synchronous=FULL whatever
+        database_pool.synchronous says, so the commit is on disk once the
+        block exits.
+        """
+        with self.writer_connection() as conn:
+            if durable:
+                conn.execute("PRAGMA synchronous = FULL")
+            try:
+                with self._transaction(conn) as cursor:
+                    yield cursor
+            finally:
+                if durable:
+                    conn.execute(f"PRAGMA synchronous = {self.settings['synchronous']}")
+    
+    @contextmanager
+    def _transaction(self, conn):
+        started = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+        except BaseException:
+            self._after_commit.clear()
+            conn.rollback()
+            if self._metrics:
+                self._metrics.inc('rollbacks')
+            raise
+        committing = time.perf_counter()
+        conn.commit()
+        if self._metrics:
+            self._metrics.record_commit(committing - started, time.perf_counter() - committing)
+        # Still holding the writer, so in-memory state is updated in
+        # commit order
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+        for hook in self._commit_hooks:
+            try:
+                hook(conn)
+            except Exception:
+                log.exception("Commit hook failed")
+    
+    def after_commit(self, callback):
+        """Run callback once the current transaction commits; drop it on rollback"""
+        self._after_commit.append(callback)
+    
+    def add_commit_hook(self, hook):
+        """Call hook(writer connection) after every commit, after the after_commit callbacks"""
+        self._commit_hooks.append(hook)
+    
+    def metrics(self):
+        return {
+            'writer': self._writer_checkout.snapshot(),
+            'reader': self._reader_checkout.snapshot(),
+        }
+    
+    def sqlite_counts(self):
+        """Statements run (trigger programs included) and VM steps, over all
+        profiled connections"""
+        conns = [self.writer] + self._reader_conns
+        return {
+            'statements': sum(conn.statements for conn in conns),
+            'vm_steps': sum(conn.vm_ticks for conn in conns) * self._metrics.vm_step_interval,
+        }
+    
+    def close(self):
+        with self.writer_connection():
+            self.writer.close()
+        for conn in self._reader_conns:
+            conn.close()
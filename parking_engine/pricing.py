@@ -0,0 +1,176 @@
+"""Tariffs and charges"""
+
+from datetime import datetime, timedelta
+from array import array
+from itertools import chain
+
+from .config import CONFIG
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# Times are measured in minutes from this Monday midnight
+TARIFF_EPOCH = datetime(2024, 1, 1)
+ONE_MINUTE = timedelta(minutes=1)
+
+def tariff_minutes(value):
+    """Minutes since TARIFF_EPOCH for a datetime, ISO string or number of minutes"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return (value - TARIFF_EPOCH) / ONE_MINUTE
+    return value
+
+class Tariff:
+    """A pricing scheme compiled into a table of cumulative charges.
+
+    rates[m] is the charge per minute during minute m of the week and
+    cumulative[m] the charge for minutes [0, m), so pricing any stay is two
+    lookups plus whole weeks. Daily caps split the stay at midnight. Prices
+    are memoized by (version, vehicle_type, duration bucket).
+    """
+    memo_size = 65536
+    
+    def __init__(self, pricing):
+        tariff = pricing.get('tariff') or {}
+        self.version = (tariff.get('version', 0), pricing['hourly_rate'])
+        self.grace = tariff.get('grace_minutes') or 0
+        self.daily_cap = tariff.get('daily_cap')
+        self.multipliers = dict(tariff.get('vehicle_types') or {})
+        
+        base = pricing['hourly_rate'] / 60
+        weekend = tariff.get('weekend_multiplier', 1.0)
+        day_rates = [base] * MINUTES_PER_DAY
+        for start_hour, end_hour, multiplier in tariff.get('bands') or []:
+            if not (0 <= start_hour <= 24 and 0 <= end_hour <= 24):
+                raise ValueError(f"Tariff band [{start_hour}, {end_hour}] is outside 0-24 hours")
+            start, end = int(start_hour * 60), int(end_hour * 60)
+            # A band past midnight, such as [22, 6], covers the end and the
+            # start of every day
+            minutes = (range(start, end) if start <= end
+                       else chain(range(start, MINUTES_PER_DAY), range(end)))
+            for minute in minutes:
+                day_rates[minute] *= multiplier
+        self.rates = array('d', day_rates * 5 + [rate * weekend for rate in day_rates] * 2)
+        self.cumulative = array('d', [0.0])
+        total = 0.0
+        for rate in self.rates:
+            total += rate
+            self.cumulative.append(total)
+        self.week_total = total
+        
+        # Where a stay falls only matters with bands, weekend rates or caps
+        self.time_invariant = len(set(self.rates)) == 1 and self.daily_cap is None
+        self.flat_rate = self.rates[0] if self.time_invariant else None
+        self.memo = {}
+    
+    def _charge_until(self, minutes):
+        # Charge for [TARIFF_EPOCH, minutes)
+        weeks, minute = divmod(minutes, MINUTES_PER_WEEK)
+        index = int(minute)
+        return weeks * self.week_total + self.cumulative[index] + (minute - index) * self.rates[index]
+    
+    def _price(self, start, end, vehicle_type):
+        if self.grace and end - start <= self.grace:
+            return 0.0
+        multiplier = self.multipliers.get(vehicle_type, 1.0)
+        if self.flat_rate is not None:
+            return round((end - start) * self.flat_rate * multiplier, 2)
+        if self.daily_cap is None:
+            return round((self._charge_until(end) - self._charge_until(start)) * multiplier, 2)
+        total = 0.0
+        while start < end:
+            midnight = min(end, (start // MINUTES_PER_DAY + 1) * MINUTES_PER_DAY)
+            day = (self._charge_until(midnight) - self._charge_until(start)) * multiplier
+            total += min(day, self.daily_cap)
+            start = midnight
+        return round(total, 2)
+    
+    def price(self, start, end, vehicle_type=None):
+        """Charge for one stay; start and end as accepted by tariff_minutes"""
+        return self._price(tariff_minutes(start), tariff_minutes(end), vehicle_type)
+    
+    def price_cached(self, start, end, vehicle_type=None):
+        """price() through the memo.
+
+        Only time-invariant tariffs are memoized: their price depends on the
+        duration alone, and durations repeat because bookings are made in
+        whole minutes. Buckets are microseconds, the resolution of the stored
+        timestamps, so cached prices are exact.
+        """
+        start, end = tariff_minutes(start), tariff_minutes(end)
+        if not self.time_invariant:
+            return self._price(start, end, vehicle_type)
+        key = (self.version, vehicle_type, round((end - start) * 60000000))
+        charge = self.memo.get(key)
+        if charge is None:
+            if len(self.memo) >= self.memo_size:
+                self.memo.clear()
+            charge = self.memo[key] = self._price(start, end, vehicle_type)
+        return charge
+    
+    def price_batch(self, starts, ends, vehicle_types=None):
+        """Charges for parallel sequences of stays, as an array('d').
+
+        Takes the same values as price(); converting every timestamp up front
+        keeps the pricing loop free of parsing.
+        """
+        if vehicle_types is None:
+            multipliers = [self.multipliers.get(None, 1.0)] * len(starts)
+        else:
+            multipliers = [self.multipliers.get(vehicle_type, 1.0) for vehicle_type in vehicle_types]
+        
+        if self.flat_rate is not None and not self.grace:
+            # Only durations matter; datetimes subtract without the epoch
+            rate = self.flat_rate
+            if starts and isinstance(starts[0], str):
+                starts = map(datetime.fromisoformat, starts)
+                ends = map(datetime.fromisoformat, ends)
+                return array('d', [
+                    round((end - start) / ONE_MINUTE * rate * multiplier, 2)
+                    for start, end, multiplier in zip(starts, ends, multipliers)
+                ])
+            starts = map(tariff_minutes, starts)
+            ends = map(tariff_minutes, ends)
+            return array('d', [
+                round((end - start) * rate * multiplier, 2)
+                for start, end, multiplier in zip(starts, ends, multipliers)
+            ])
+        
+        starts = array('d', map(tariff_minutes, starts))
+        ends = array('d', map(tariff_minutes, ends))
+        if self.daily_cap is None and not self.grace:
+            charge_until = self._charge_until
+            return array('d', [
+                round((charge_until(end) - charge_until(start)) * multiplier, 2)
+                for start, end, multiplier in zip(starts, ends, multipliers)
+            ])
+        price = self._price
+        vehicle_types = vehicle_types or [None] * len(starts)
+        return array('d', [
+            price(start, end, vehicle_type)
+            for start, end, vehicle_type in zip(starts, ends, vehicle_types)
+        ])
+
+class PaymentService:
+    _tariff = None
+    
+    @staticmethod
+    def tariff():
+        """The compiled tariff for CONFIG['pricing'], rebuilt when its version changes"""
+        pricing = CONFIG['pricing']
+        version = ((pricing.get('tariff') or {}).get('version', 0), pricing['hourly_rate'])
+        tariff = PaymentService._tariff
+        if tariff is None or tariff.version != version:
+            tariff = PaymentService._tariff = Tariff(pricing)
+        return tariff
+    
+    @staticmethod
+    def calculate_charge(start_time, end_time=None, vehicle_type=None):
+        if end_time is None:
+            end_time = datetime.now()
+        return PaymentService.tariff().price_cached(start_time, end_time, vehicle_type)
+    
+    @staticmethod
+    def process_payment(amount):
+        print(f"Processing payment of {CONFIG['pricing']['currency']}{amount}")
+        return True
@@ -0,0 +1,426 @@
+"""SQL shared by ParkingSystem, the payment outbox, the export and the query plan check"""
+
+from datetime import datetime, timedelta
+import re
+import time
+
+from .config import CONFIG
+from .records import Booking, Reservation, Slot
+from .changes import Change
+
+def epoch_sql(column):
+    """SQL for an ISO timestamp column as epoch microseconds (see records.EPOCH).
+
+    julianday() keeps only milliseconds, so it gets the whole seconds and the
+    fraction is read from the text.
+    """
+    return (f"(CAST(round((julianday(substr({column}, 1, 19)) - 2440587.5) * 86400) AS INTEGER)"
+            f" * 1000000 + CAST(substr({column}, 21) AS INTEGER))")
+
+# The columns of a Booking record
+BOOKING_COLUMNS = f'''
+    b.booking_id, b.slot_id, b.user_id, b.vehicle_number,
+    {epoch_sql('b.start_time')}, {epoch_sql('b.end_time')},
+    b.status, b.amount_paid, b.payment_status, b.vehicle_type'''
+
+# Hot-path queries, shared by ParkingSystem and the query plan check below
+AVAILABLE_SLOTS_QUERY = '''
+SELECT slot_id FROM slots 
+WHERE status = 'available' AND is_active = 1
+ORDER BY slot_id
+'''
+
+USER_BOOKINGS_QUERY = f'''
+SELECT {BOOKING_COLUMNS}
+FROM bookings b
+WHERE b.user_id = ? AND b.status = 'active'
+ORDER BY b.end_time
+'''
+
+# Gate lookups by number plate
+VEHICLE_BOOKINGS_QUERY = f'''
+SELECT {BOOKING_COLUMNS}
+FROM bookings b
+WHERE b.vehicle_number = ? AND b.status = 'active'
+ORDER BY b.end_time
+'''
+
+# Pinned to the partial index: without ANALYZE statistics the planner prefers
+# idx_bookings_status_start and sorts every active booking for each batch.
+EXPIRED_BOOKINGS_QUERY = '''
+SELECT b.booking_id FROM bookings b INDEXED BY idx_bookings_active_end
+WHERE b.status = 'active' AND b.end_time < ?
+ORDER BY b.end_time
+LIMIT ?
+'''
+
+# One batch of the expiry sweep
+EXPIRE_BATCH_QUERY = f'''
+UPDATE bookings SET status = 'expired'
+WHERE booking_id IN ({EXPIRED_BOOKINGS_QUERY})
+RETURNING booking_id, slot_id
+'''
+
+RELEASE_SLOTS_QUERY = '''
+UPDATE slots SET status = 'available'
+WHERE slot_id IN (SELECT value FROM json_each(?))
+'''
+
+# Claims every listed slot that is free (and of vehicle_type, when given)
+# and not reserved during [?4, ?3); returns the slot_ids actually claimed
+CLAIM_SLOTS_QUERY = '''
+UPDATE slots SET status = 'booked'
+WHERE slot_id IN (SELECT value FROM json_each(?1))
+    AND status = 'available' AND is_active = 1
+    AND vehicle_type = COALESCE(?2, vehicle_type)
+    AND NOT EXISTS (
+        SELECT 1 FROM reservations r
+        WHERE r.slot_id = slots.slot_id AND r.status = 'reserved'
+            AND r.start_time < ?3 AND r.end_time > ?4
+    )
+RETURNING slot_id
+'''
+
+# Reservations: windows on a slot never overlap, so only the latest one
+# starting before the new window ends can overlap it (check its end_time)
+RESERVATION_CONFLICT_QUERY = '''
+SELECT reservation_id, start_time, end_time FROM reservations
+WHERE slot_id = ? AND status = 'reserved' AND start_time < ?
+ORDER BY start_time DESC
+LIMIT 1
+'''
+
+# The active booking on a slot, if it runs past ?
+BOOKING_CONFLICT_QUERY = '''
+SELECT booking_id, end_time FROM bookings
+WHERE slot_id = ? AND status = 'active' AND end_time > ?
+LIMIT 1
+'''
+
+# Slots whose active booking runs past ?
+BOOKED_UNTIL_QUERY = '''
+SELECT slot_id FROM bookings INDEXED BY idx_bookings_active_end
+WHERE status = 'active' AND end_time > ?
+'''
+
+UPCOMING_RESERVATIONS_QUERY = '''
+SELECT reservation_id, slot_id, start_time, end_time FROM reservations
+WHERE status = 'reserved' AND end_time > ?
+'''
+
+USER_RESERVATIONS_QUERY = '''
+SELECT reservation_id, slot_id, vehicle_number, start_time, end_time
+FROM reservations
+WHERE user_id = ? AND status = 'reserved' AND end_time > ?
+ORDER BY start_time
+'''
+
+RELEASE_BOOKINGS_QUERY = '''
+UPDATE bookings SET status = 'completed'
+WHERE booking_id IN (SELECT value FROM json_each(?)) AND status = 'active'
+RETURNING booking_id, slot_id
+'''
+
+# Finished bookings old enough to archive, oldest first
+ARCHIVE_CANDIDATES_QUERY = '''
+SELECT booking_id, substr(start_time, 1, 7) FROM bookings INDEXED BY idx_bookings_status_start
+WHERE status IN ('completed', 'expired') AND start_time < ?1
+    AND end_time < ?1 AND payment_status != 'pending'
+ORDER BY status, start_time
+LIMIT ?2
+'''
+
+# Payment outbox: claim due rows (leasing them until ?1 + ?2), find the next
+# due time, record a new charge, and set payment_status on its bookings
+PAYMENT_CLAIM_QUERY = '''
+UPDATE payment_outbox
+SET status = 'processing', attempts = attempts + 1, next_attempt_at = ?1 + ?2
+WHERE outbox_id IN (
+    SELECT outbox_id FROM payment_outbox
+    WHERE status IN ('pending', 'processing') AND next_attempt_at <= ?1
+    ORDER BY next_attempt_at
+    LIMIT ?3
+)
+RETURNING outbox_id, idempotency_key, amount, booking_ids, attempts, created_at
+'''
+
+PAYMENT_NEXT_DUE_QUERY = '''
+SELECT MIN(next_attempt_at) FROM payment_outbox
+WHERE status IN ('pending', 'processing')
+'''
+
+INSERT_PAYMENT_QUERY = '''
+INSERT INTO payment_outbox (idempotency_key, booking_ids, amount, next_attempt_at, created_at)
+VALUES (?1, ?2, ?3, ?4, ?4)
+'''
+
+SET_PAYMENT_STATUS_QUERY = '''
+UPDATE bookings SET payment_status = ?
+WHERE booking_id IN (SELECT value FROM json_each(?))
+'''
+
+ALL_BOOKINGS_QUERY = f'''
+SELECT {BOOKING_COLUMNS}
+FROM bookings b
+'''
+
+TOTAL_BOOKINGS_QUERY = "SELECT COUNT(*) FROM bookings"
+
+ACTIVE_BOOKINGS_QUERY = "SELECT COUNT(*) FROM bookings WHERE status = 'active'"
+
+DAILY_REVENUE_QUERY = '''
+SELECT SUM(amount_paid) FROM bookings
+WHERE payment_status = 'paid' AND start_date = ?
+'''
+
+DASHBOARD_STATS_QUERY = '''
+SELECT s.total_bookings, s.active_bookings, COALESCE(r.revenue, 0)
+FROM booking_stats s
+LEFT JOIN revenue_rollup r ON r.kind = 'day' AND r.bucket = ?
+WHERE s.id = 1
+'''
+
+CHANGED_BOOKINGS_QUERY = ALL_BOOKINGS_QUERY.replace(
+    "b.vehicle_type", "b.vehicle_type, b.change_seq"
+) + '''
+WHERE b.change_seq > ?
+ORDER BY b.change_seq
+LIMIT ?
+'''
+
+CHANGE_LOG_QUERY = '''
+SELECT seq, entity, entity_id, status FROM change_log
+WHERE seq > ?
+ORDER BY seq
+LIMIT ?
+'''
+
+SLOTS_QUERY = '''
+SELECT slot_id, status, vehicle_type, is_active FROM slots
+ORDER BY slot_id
+'''
+
+# Queries run by name with ParkingSystem.fetch: name -> (SQL, record type,
+# or None for plain tuples). Their SQL never changes, so each stays prepared
+# in the connections' statement cache (database_pool.cached_statements).
+NAMED_QUERIES = {
+    'available_slots': (AVAILABLE_SLOTS_QUERY, None),
+    'slots': (SLOTS_QUERY, Slot),
+    'user_bookings': (USER_BOOKINGS_QUERY, Booking),
+    'vehicle_bookings': (VEHICLE_BOOKINGS_QUERY, Booking),
+    'user_reservations': (USER_RESERVATIONS_QUERY, Reservation),
+    'change_log': (CHANGE_LOG_QUERY, Change),
+    'dashboard_stats': (DASHBOARD_STATS_QUERY, None),
+}
+
+def archive_months(filters):
+    """(first month, last month) of archives that may hold bookings matching
+    filters, or None when only the hot table can"""
+    filters = filters or {}
+    if filters.get('status') == 'active':
+        return None
+    if filters.get('date'):
+        return filters['date'][:7], filters['date'][:7]
+    return (filters.get('date_from') or "")[:7] or None, (filters.get('date_to') or "")[:7] or None
+
+def build_all_bookings_query(filters=None, after=None, page_size=None):
+    """Build the admin bookings query, newest first.
+
+    With page_size the result is one keyset page; after is the
+    (start_time, booking_id) of the last row of the previous page.
+    """
+    query = ALL_BOOKINGS_QUERY
+    params = []
+    conditions = []
+    
+    if filters:
+        if filters.get('status'):
+            conditions.append("b.status = ?")
+            params.append(filters['status'])
+        if filters.get('date'):
+            conditions.append("b.start_date = ?")
+            params.append(filters['date'])
+    if after:
+        conditions.append("(b.start_time, b.booking_id) < (?, ?)")
+        params.extend(after)
+    
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    
+    query += " ORDER BY b.start_time DESC, b.booking_id DESC"
+    if page_size:
+        query += " LIMIT ?"
+        params.append(page_size)
+    return query, params
+
+def booking_matches(booking, filters):
+    """Whether a get_all_bookings Booking passes the admin filters"""
+    if not filters:
+        return True
+    if filters.get('status') and booking.status != filters['status']:
+        return False
+    if filters.get('date') and booking.start_time.date().isoformat() != filters['date']:
+        return False
+    return True
+
+# Bookings history export: column -> (SQL expression, Arrow type for Parquet)
+EXPORT_COLUMNS = {
+    'booking_id': ('b.booking_id', 'int64'),
+    'slot_id': ('b.slot_id', 'int64'),
+    'user_id': ('b.user_id', 'string'),
+    'vehicle_number': ('b.vehicle_number', 'string'),
+    'start_time': ('b.start_time', 'string'),
+    'end_time': ('b.end_time', 'string'),
+    'status': ('b.status', 'string'),
+    'amount_paid': ('b.amount_paid', 'float64'),
+    'payment_status': ('b.payment_status', 'string'),
+}
+
+def _export_conditions(filters):
+    """WHERE conditions and params for the export filters: status, date_from
+    and date_to (inclusive YYYY-MM-DD days of start_time), slot_id, user_id"""
+    conditions = []
+    params = []
+    filters = filters or {}
+    unknown = set(filters) - {'status', 'date_from', 'date_to', 'slot_id', 'user_id'}
+    if unknown:
+        raise ValueError(f"Unknown export filter: {', '.join(sorted(unknown))}")
+    if filters.get('status'):
+        conditions.append("b.status = ?")
+        params.append(filters['status'])
+    if filters.get('date_from'):
+        conditions.append("b.start_time >= ?")
+        params.append(datetime.strptime(filters['date_from'], '%Y-%m-%d').date().isoformat())
+    if filters.get('date_to'):
+        day_after = datetime.strptime(filters['date_to'], '%Y-%m-%d') + timedelta(days=1)
+        conditions.append("b.start_time < ?")
+        params.append(day_after.date().isoformat())
+    if filters.get('slot_id') not in (None, ''):
+        conditions.append("b.slot_id = ?")
+        params.append(int(filters['slot_id']))
+    if filters.get('user_id'):
+        conditions.append("b.user_id = ?")
+        params.append(filters['user_id'])
+    return conditions, params
+
+def build_export_query(columns, filters=None, after=None, batch_size=None):
+    """One batch of the bookings export, oldest first.
+
+    Batches are keyset pages on (start_time, booking_id), which the
+    start_time indexes already store in order, so every batch is an index
+    range scan however deep into the export it is. The first two selected
+    columns are that key; the requested columns follow.
+    """
+    for column in columns:
+        if column not in EXPORT_COLUMNS:
+            raise ValueError(f"Unknown export column: {column}")
+    conditions, params = _export_conditions(filters)
+    if after:
+        conditions.append("(b.start_time, b.booking_id) > (?, ?)")
+        params.extend(after)
+    query = "SELECT b.start_time, b.booking_id, " + ", ".join(
+        EXPORT_COLUMNS[column][0] for column in columns
+    ) + " FROM bookings b"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY b.start_time, b.booking_id LIMIT ?"
+    params.append(batch_size or CONFIG['export']['batch_size'])
+    return query, params
+
+def build_export_count_query(filters=None, archives=()):
+    conditions, params = _export_conditions(filters)
+    query = "SELECT COUNT(*) FROM bookings b"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if not archives:
+        return query, params
+    arms = [query] + [query.replace("FROM bookings b", f"FROM {table} b") for table in archives]
+    return "SELECT " + " + ".join(f"({arm})" for arm in arms), params * len(arms)
+
+# Columns a hot query must search bookings by; an index on one filter
+# column alone would still read every row matching it
+HOT_QUERY_KEYS = {
+    "get_user_bookings": ("user_id",),
+    "get_vehicle_bookings": ("vehicle_number",),
+    "get_all_bookings[status, page]": ("status",),
+    "get_all_bookings[date, page]": ("start_date",),
+    "get_all_bookings[status+date, page]": ("status", "start_date"),
+}
+
+def hot_query_plans():
+    """(name, query, params) for every query the UI runs on a refresh, and the gate lookup.
+
+    check_stats' total count and unpaged get_all_bookings calls read every
+    booking by design; they back maintenance commands, not a refresh.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    plans = [
+        ("get_available_slots", AVAILABLE_SLOTS_QUERY, ()),
+        ("get_user_bookings", USER_BOOKINGS_QUERY, ("user",)),
+        ("get_vehicle_bookings", VEHICLE_BOOKINGS_QUERY, ("plate",)),
+        ("check_expired_bookings", EXPIRED_BOOKINGS_QUERY,
+         (datetime.now().isoformat(), CONFIG['expiry_batch_size'])),
+        ("get_dashboard_stats", DASHBOARD_STATS_QUERY, (today,)),
+        ("check_stats.active", ACTIVE_BOOKINGS_QUERY, ()),
+        ("check_stats.revenue", DAILY_REVENUE_QUERY, (today,)),
+    ]
+    for label, filters in [
+        ("all", None),
+        ("status", {'status': 'active'}),
+        ("date", {'date': today}),
+        ("status+date", {'status': 'active', 'date': today}),
+    ]:
+        query, params = build_all_bookings_query(
+            filters, after=(datetime.now().isoformat(), 1), page_size=CONFIG['admin_page_size']
+        )
+        plans.append((f"get_all_bookings[{label}, page]", query, tuple(params)))
+    plans.append(("get_bookings_changed_since", CHANGED_BOOKINGS_QUERY, (0, CONFIG['admin_page_size'])))
+    plans.append(("get_changes_since", CHANGE_LOG_QUERY, (0, CONFIG['admin_page_size'])))
+    for label, filters in [
+        ("all", None),
+        ("status", {'status': 'completed'}),
+        ("dates", {'date_from': today, 'date_to': today}),
+    ]:
+        query, params = build_export_query(list(EXPORT_COLUMNS), filters, after=(today, 1))
+        plans.append((f"get_export_batch[{label}]", query, tuple(params)))
+    plans.append(("PaymentOutbox._claim", PAYMENT_CLAIM_QUERY,
+                  (time.time(), CONFIG['payments']['lease_s'], CONFIG['payments']['batch_size'])))
+    plans.append(("PaymentOutbox._idle_wait", PAYMENT_NEXT_DUE_QUERY, ()))
+    plans.append(("archive_bookings", ARCHIVE_CANDIDATES_QUERY,
+                  (datetime.now().isoformat(), CONFIG['archive']['batch_size'])))
+    now = datetime.now().isoformat()
+    plans.append(("reserve_slot.reservation", RESERVATION_CONFLICT_QUERY, (1, now)))
+    plans.append(("reserve_slot.booking", BOOKING_CONFLICT_QUERY, (1, now)))
+    plans.append(("find_free_slots", BOOKED_UNTIL_QUERY, (now,)))
+    plans.append(("rebuild_reservation_index", UPCOMING_RESERVATIONS_QUERY, (now,)))
+    plans.append(("get_user_reservations", USER_RESERVATIONS_QUERY, ("user", now)))
+    return plans
+
+def _is_full_scan(detail):
+    # A pass over a bookings index, covering or not, still reads every booking
+    return detail.startswith("SCAN") and ("INDEX" not in detail or "idx_bookings" in detail)
+
+def _unsearched_keys(name, plan):
+    searches = " ".join(detail for _, _, _, detail in plan
+                        if detail.startswith("SEARCH") and "idx_bookings" in detail)
+    return [column for column in HOT_QUERY_KEYS.get(name, ())
+            if not re.search(rf"\b{column}[=<>]", searches)]
+
+def find_full_scans(conn):
+    """Return {query name: plan lines} for hot queries that read more than they need.
+
+    That is any SCAN of bookings, a SCAN of another table without an index,
+    or a bookings SEARCH that leaves out a column from HOT_QUERY_KEYS. An
+    empty result means every hot query is served by an index; anything
+    else is a regression in the schema or in one of the queries.
+    """
+    offenders = {}
+    for name, query, params in hot_query_plans():
+        plan = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+        scans = [detail for _, _, _, detail in plan if _is_full_scan(detail)]
+        missing = _unsearched_keys(name, plan)
+        if missing:
+            scans.append(f"no SEARCH by {', '.join(missing)}")
+        if scans:
+            offenders[name] = scans
+    return offenders
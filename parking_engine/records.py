@@ -0,0 +1,125 @@
+"""Compact records for booking and slot rows"""
+
+from datetime import datetime, timedelta
+from array import array
+from collections import namedtuple
+from itertools import islice
+
+# Timestamps are stored as ISO text on the local wall clock. Records carry
+# them as integer microseconds since EPOCH on that same clock, which SQLite
+# works out while reading the row (see queries.epoch_sql), and only build
+# datetimes or ISO text when asked for one.
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+MICROS_PER_MINUTE = 60 * 1000000
+
+def epoch_micros(value):
+    """Microseconds since EPOCH for a datetime or ISO string"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - EPOCH) // ONE_MICROSECOND
+
+def epoch_datetime(micros):
+    return None if micros is None else EPOCH + timedelta(microseconds=micros)
+
+def epoch_iso(micros):
+    """The ISO text the timestamp is stored as, which keyset cursors compare against"""
+    return None if micros is None else epoch_datetime(micros).isoformat()
+
+def format_epoch(micros):
+    """Epoch microseconds -> '2024-05-01 09:30'"""
+    return "" if micros is None else epoch_datetime(micros).strftime('%Y-%m-%d %H:%M')
+
+class Booking(namedtuple('Booking', [
+    'booking_id', 'slot_id', 'user_id', 'vehicle_number', 'start', 'end',
+    'status', 'amount_paid', 'payment_status', 'vehicle_type'
+], defaults=(None,))):
+    """One booking, with start and end in epoch microseconds.
+    
+    vehicle_type is the slot's type when the booking was made, which the
+    booking was charged and its revenue counted by.
+    
+    Tuple-backed with no instance dict, so query rows become records with
+    Booking._make and no Python code runs per row.
+    """
+    __slots__ = ()
+    
+    @property
+    def start_time(self):
+        return epoch_datetime(self.start)
+    
+    @property
+    def end_time(self):
+        return epoch_datetime(self.end)
+    
+    def as_row(self):
+        """The booking as a plain tuple with ISO timestamps, as sent over HTTP"""
+        return self[:4] + (epoch_iso(self.start), epoch_iso(self.end)) + self[6:]
+    
+    @classmethod
+    def from_row(cls, row):
+        """Inverse of as_row"""
+        return cls(*row[:4], epoch_micros(row[4]), epoch_micros(row[5]), *row[6:])
+
+Slot = namedtuple('Slot', ['slot_id', 'status', 'vehicle_type', 'is_active'])
+
+# An upcoming reservation of a user; the times are ISO strings
+Reservation = namedtuple('Reservation', ['reservation_id', 'slot_id', 'vehicle_number', 'start_time', 'end_time'])
+
+class BookingTable:
+    """Many bookings stored column by column, read back as Booking records.
+
+    Ids, slots, times and amounts sit in arrays and the repeated strings
+    (user, status, payment status) are shared, so a row takes about a
+    quarter of the memory of a tuple. Rows are loaded in batches straight
+    from a cursor; indexing and iterating build Booking records on the fly.
+    """
+    batch_size = 5000
+    # Array typecode per Booking field; None keeps a list
+    typecodes = ('q', 'q', None, None, 'q', 'q', None, 'd', None, None)
+    shared = (2, 6, 8, 9)
+    
+    def __init__(self, rows=()):
+        self.columns = [array(code) if code else [] for code in self.typecodes]
+        self.strings = {}
+        self.extend(rows)
+    
+    def extend(self, rows):
+        rows = iter(rows)
+        share = self.strings.setdefault
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            values = list(zip(*batch))
+            for index in self.shared:
+                values[index] = list(map(share, values[index], values[index]))
+            for index, column in enumerate(self.columns):
+                if isinstance(column, list):
+                    column.extend(values[index])
+                    continue
+                try:
+                    # Converted whole, which is much faster than extending
+                    # an array item by item
+                    column.extend(array(column.typecode, values[index]))
+                except TypeError:
+                    # A NULL: this column carries on as a list
+                    column = self.columns[index] = column.tolist()
+                    column.extend(values[index])
+    
+    def column(self, name):
+        """One field of every booking, as an array or list"""
+        return self.columns[Booking._fields.index(name)]
+    
+    def __len__(self):
+        return len(self.columns[0])
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Booking._make([column[index] for column in self.columns])
+    
+    def __iter__(self):
+        return map(Booking._make, zip(*self.columns))
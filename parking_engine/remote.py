@@ -0,0 +1,275 @@
+"""Stand-in for ParkingSystem in a kiosk that talks to a ParkingServer"""
+
+import logging
+import threading
+import json
+import http.client
+from urllib.parse import urlsplit, urlencode, quote
+
+from .config import CONFIG
+from .metrics import Metrics
+from .system import BulkItem, BulkResult, PROFILED_OPERATIONS, ReservationResult
+from .changes import CHANGE_RESYNC, Change, ChangeBus
+from .records import Booking, Reservation, Slot
+
+log = logging.getLogger(__name__)
+
+class RemoteChangeBus(ChangeBus):
+    """ChangeBus for a thin client: starts following the server's feed on first subscribe"""
+    def __init__(self, remote):
+        super().__init__()
+        self.remote = remote
+        self.follower = None
+    
+    def subscribe(self, callback):
+        token = super().subscribe(callback)
+        with self.lock:
+            if self.follower is None:
+                self.follower = threading.Thread(
+                    target=self.remote.follow_changes, name="parking-changes", daemon=True
+                )
+                self.follower.start()
+        return token
+
+class RemoteParkingSystem:
+    """Stands in for ParkingSystem in a kiosk that talks to a ParkingServer.
+    
+    Mirrors the calls the kiosk and admin windows make. Each thread keeps
+    its own keep-alive connection to the server. A successful
+    authenticate_admin keeps the token the server issues and sends it with
+    every request, which the /admin/ calls need.
+    """
+    expiry_scheduler = None  # Expiry runs on the server
+    
+    def __init__(self, base_url, timeout=10):
+        url = urlsplit(base_url)
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.admin_token = None
+        # Fed by a thread long-polling /changes once anyone subscribes
+        self.change_bus = RemoteChangeBus(self)
+        self.closing = threading.Event()
+        # Times the calls as the kiosk sees them, network included
+        self.metrics = Metrics()
+        self.metrics.instrument(self, 'operation', [
+            name for name in PROFILED_OPERATIONS if hasattr(self, name)
+        ])
+    
+    def _connection(self):
+        conn = getattr(self.local, 'connection', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.local.connection = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+    
+    def request(self, method, path, query=None, data=None):
+        """Send one request and return the decoded JSON payload (or text, for a text response)"""
+        if query:
+            path += "?" + urlencode({key: value for key, value in query.items() if value is not None})
+        body = json.dumps(data) if data is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if self.admin_token:
+            headers["Authorization"] = f"Bearer {self.admin_token}"
+        
+        # An idle keep-alive connection may have been dropped; only reads are
+        # safe to send twice
+        for attempt in range(2 if method == "GET" else 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                payload = response.read()
+                if response.getheader("Content-Type", "").startswith("text/plain"):
+                    payload = payload.decode()
+                else:
+                    payload = json.loads(payload or b"null")
+                break
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                self.local.connection = None
+                if attempt or method != "GET":
+                    raise
+        
+        if response.status >= 400 and response.status != 409:
+            raise RuntimeError(f"Server error {response.status}: {payload.get('error')}")
+        return payload
+    
+    def get_available_slots(self, vehicle_type=None):
+        return self.request("GET", "/slots", {"vehicle_type": vehicle_type})["slots"]
+    
+    def get_slot_states(self):
+        return [tuple(state) for state in self.request("GET", "/slots/states")["slots"]]
+    
+    def get_slots(self):
+        return [Slot._make(slot) for slot in self.request("GET", "/slots/all")["slots"]]
+    
+    def find_free_slots(self, start_time, end_time, vehicle_type=None):
+        return self.request("GET", "/slots/free", {
+            "start": str(start_time).replace(' ', 'T'), "end": str(end_time).replace(' ', 'T'),
+            "vehicle_type": vehicle_type
+        })["slots"]
+    
+    def set_slot_active(self, slot_id, is_active):
+        self.request("POST", f"/admin/slots/{int(slot_id)}/active", data={"is_active": bool(is_active)})
+    
+    def add_slot(self, vehicle_type='regular'):
+        return self.request("POST", "/admin/slots", data={"vehicle_type": vehicle_type})["slot_id"]
+    
+    def book_slot(self, slot_id, user_id, vehicle_number, duration_minutes=60):
+        result = self.request("POST", "/bookings", data={
+            "slot_id": slot_id, "user_id": user_id,
+            "vehicle_number": vehicle_number, "duration_minutes": duration_minutes
+        })
+        return result["success"], result["message"]
+    
+    def book_slots_bulk(self, user_id, vehicle_numbers, count=None, slot_ids=None,
+                        vehicle_type=None, contiguous=False, duration_minutes=60,
+                        all_or_nothing=True):
+        return self._bulk_result(self.request("POST", "/bookings/bulk", data={
+            "user_id": user_id, "vehicle_numbers": vehicle_numbers, "count": count,
+            "slot_ids": slot_ids, "vehicle_type": vehicle_type, "contiguous": contiguous,
+            "duration_minutes": duration_minutes, "all_or_nothing": all_or_nothing
+        }))
+    
+    def release_bookings_bulk(self, booking_ids, all_or_nothing=False):
+        return self._bulk_result(self.request("POST", "/bookings/release", data={
+            "booking_ids": list(booking_ids), "all_or_nothing": all_or_nothing
+        }))
+    
+    @staticmethod
+    def _bulk_result(result):
+        return BulkResult(result["success"], result["message"],
+                          [BulkItem(**item) for item in result["items"]], result["amount"])
+    
+    def get_user_bookings(self, user_id):
+        bookings = self.request("GET", f"/users/{quote(str(user_id), safe='')}/bookings")["bookings"]
+        return [Booking.from_row(booking) for booking in bookings]
+    
+    def find_active_booking_by_vehicle(self, vehicle_number):
+        booking = self.request("GET", f"/vehicles/{quote(str(vehicle_number), safe='')}/booking")["booking"]
+        return Booking.from_row(booking) if booking else None
+    
+    def release_slot(self, booking_id):
+        result = self.request("POST", f"/bookings/{int(booking_id)}/release")
+        return result["success"], result["message"]
+    
+    def reserve_slot(self, slot_id, user_id, vehicle_number, start_time, end_time):
+        return ReservationResult(**self.request("POST", "/reservations", data={
+            "slot_id": slot_id, "user_id": user_id, "vehicle_number": vehicle_number,
+            "start_time": str(start_time).replace(' ', 'T'), "end_time": str(end_time).replace(' ', 'T')
+        }))
+    
+    def cancel_reservation(self, reservation_id):
+        result = self.request("POST", f"/reservations/{int(reservation_id)}/cancel")
+        return result["success"], result["message"]
+    
+    def check_in_reservation(self, reservation_id):
+        result = self.request("POST", f"/reservations/{int(reservation_id)}/check-in")
+        return result["success"], result["message"]
+    
+    def get_user_reservations(self, user_id):
+        reservations = self.request(
+            "GET", f"/users/{quote(str(user_id), safe='')}/reservations"
+        )["reservations"]
+        return [Reservation._make(reservation) for reservation in reservations]
+    
+    def get_all_bookings(self, filters=None, after=None, page_size=None):
+        query = dict(filters or {})
+        if after:
+            query['after_start'], query['after_id'] = after
+        query['page_size'] = page_size
+        return [Booking.from_row(booking) for booking in self.request("GET", "/admin/bookings", query)["bookings"]]
+    
+    def get_booking_change_seq(self):
+        return self.request("GET", "/admin/change-seq")["change_seq"]
+    
+    def get_export_batch(self, columns=None, filters=None, after=None, batch_size=None):
+        query = dict(filters or {})
+        query['columns'] = ",".join(columns) if columns else None
+        if after:
+            query['after_start'], query['after_id'] = after
+        query['batch_size'] = batch_size
+        result = self.request("GET", "/admin/export", query)
+        return [tuple(row) for row in result["rows"]], tuple(result["after"]) if result["after"] else None
+    
+    def count_export_rows(self, filters=None):
+        return self.request("GET", "/admin/export/count", dict(filters or {}))["count"]
+    
+    def get_change_log_seq(self):
+        return self.request("GET", "/changes/seq")["change_seq"]
+    
+    def get_changes_since(self, change_seq, limit=None, wait=None):
+        result = self.request("GET", "/changes", {"since": change_seq, "limit": limit, "wait": wait})
+        changes = result["changes"]
+        if changes is not None:
+            changes = [Change(*change) for change in changes]
+        return changes, result["change_seq"]
+    
+    def follow_changes(self):
+        """Long-poll the server and publish what it reports; runs on its own thread"""
+        wait = CONFIG['change_feed']['long_poll_s']
+        change_seq = None
+        missed = False
+        while not self.closing.is_set():
+            if getattr(self.local, 'connection', None) is None:
+                # Each request may be held open for the whole wait
+                self.local.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=wait + self.timeout
+                )
+                with self.lock:
+                    self.connections.append(self.local.connection)
+            try:
+                if change_seq is None:
+                    change_seq = self.get_change_log_seq()
+                changes, latest = self.get_changes_since(change_seq, wait=wait)
+            except Exception as e:
+                if self.closing.is_set():
+                    return
+                log.warning("Change feed unavailable: %s", e)
+                self.local.connection = None
+                change_seq = None
+                missed = True
+                self.closing.wait(5)
+                continue
+            if changes is None or missed:
+                # Anything may have changed while we were not looking
+                changes = [Change(latest, CHANGE_RESYNC, None, None)] + (changes or [])
+                missed = False
+            change_seq = latest
+            if changes:
+                self.change_bus.publish(changes)
+    
+    def get_bookings_changed_since(self, change_seq, limit=None):
+        result = self.request("GET", "/admin/changes", {"since": change_seq, "limit": limit})
+        return [Booking.from_row(booking) for booking in result["bookings"]], result["change_seq"]
+    
+    def authenticate_admin(self, username, password):
+        result = self.request("POST", "/admin/login", data={"username": username, "password": password})
+        if result["authenticated"]:
+            self.admin_token = result["token"]
+        return result["authenticated"]
+    
+    def get_dashboard_stats(self, day=None):
+        stats = self.request("GET", "/admin/stats", {"day": day})
+        return stats["total"], stats["active"], stats["revenue"]
+    
+    def get_server_metrics(self, prometheus=False):
+        """The server's metrics snapshot: the JSON dict, or Prometheus text"""
+        if prometheus:
+            return self.request("GET", "/metrics")
+        return self.request("GET", "/admin/metrics")
+    
+    def close(self):
+        self.closing.set()
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        if self.metrics.enabled and CONFIG['metrics']['dump_path']:
+            self.metrics.dump(CONFIG['metrics']['dump_path'])
@@ -0,0 +1,645 @@
+"""Database schema: versioned migrations, statistics rollups and monthly booking archives"""
+
+import sqlite3
+import re
+
+from .config import CONFIG
+
+# Database setup
+#
+# The schema is versioned with PRAGMA user_version. Each migration runs once,
+# in its own transaction, and never drops existing data.
+def _migration_base_schema(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS slots (
+        slot_id INTEGER PRIMARY KEY,
+        status TEXT DEFAULT 'available',
+        vehicle_type TEXT DEFAULT 'regular',
+        is_active INTEGER DEFAULT 1
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS bookings (
+        booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER,
+        user_id TEXT,
+        vehicle_number TEXT,
+        start_time TEXT,
+        end_time TEXT,
+        status TEXT DEFAULT 'active',
+        amount_paid REAL DEFAULT 0,
+        payment_status TEXT DEFAULT 'unpaid',
+        FOREIGN KEY (slot_id) REFERENCES slots (slot_id)
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS admin_users (
+        username TEXT PRIMARY KEY,
+        password TEXT,
+        role TEXT
+    )
+    ''')
+    
+    # Only seed a brand new garage
+    if cursor.execute("SELECT COUNT(*) FROM slots").fetchone()[0] == 0:
+        cursor.executemany(
+            "INSERT INTO slots (slot_id) VALUES (?)",
+            [(i,) for i in range(1, 21)]
+        )
+    
+    cursor.execute(
+        "INSERT OR IGNORE INTO admin_users (username, password, role) VALUES (?, ?, ?)",
+        ("admin", "admin123", "superadmin")
+    )
+
+def _migration_booking_indexes(cursor):
+    # start_time is an ISO string, so its first 10 characters are the date.
+    # A generated column lets the date filters use an index instead of
+    # evaluating date(start_time) on every row.
+    cursor.execute('''
+    ALTER TABLE bookings ADD COLUMN start_date TEXT
+    GENERATED ALWAYS AS (substr(start_time, 1, 10)) VIRTUAL
+    ''')
+    
+    # get_user_bookings: user_id + active, ordered by end_time
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_user_active
+    ON bookings (user_id, end_time) WHERE status = 'active'
+    ''')
+    # check_expired_bookings and the active count: active bookings by end_time
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_active_end
+    ON bookings (end_time, slot_id) WHERE status = 'active'
+    ''')
+    # get_all_bookings: status filter ordered by start_time, and no filter
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_status_start
+    ON bookings (status, start_time)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_start_time
+    ON bookings (start_time)
+    ''')
+    # get_all_bookings date filter and daily revenue (covering)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_start_date
+    ON bookings (start_date, payment_status, amount_paid)
+    ''')
+    # get_available_slots
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_slots_available
+    ON slots (slot_id) WHERE status = 'available' AND is_active = 1
+    ''')
+
+def _migration_booking_change_seq(cursor):
+    # Every insert or update of a booking stamps it with the next value of a
+    # single counter. Writers are serialized, so the stamps follow commit
+    # order and "change_seq > N" finds everything committed since N.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS booking_change_counter (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        seq INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO booking_change_counter (id, seq) VALUES (1, 0)")
+    cursor.execute("ALTER TABLE bookings ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_change_seq
+    ON bookings (change_seq)
+    ''')
+    
+    stamp = '''
+        UPDATE booking_change_counter SET seq = seq + 1 WHERE id = 1;
+        UPDATE bookings
+        SET change_seq = (SELECT seq FROM booking_change_counter WHERE id = 1)
+        WHERE booking_id = NEW.booking_id;
+    '''
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS bookings_stamp_insert
+    AFTER INSERT ON bookings
+    BEGIN {stamp} END
+    ''')
+    # Listing the columns keeps the trigger's own change_seq update from
+    # firing it again
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS bookings_stamp_update
+    AFTER UPDATE OF slot_id, user_id, vehicle_number, start_time, end_time,
+        status, amount_paid, payment_status ON bookings
+    BEGIN {stamp} END
+    ''')
+
+# Dashboard statistics are kept in rollup tables by triggers, so the admin
+# screen reads a handful of rows instead of aggregating every booking.
+# Revenue counts paid bookings only and is bucketed by each expression below.
+# Until migration 13 the vehicle type came from the slot as it is now, so
+# retyping a slot moved its past revenue.
+_SLOT_TYPE_BUCKETS = [
+    ('day', "substr({row}.start_time, 1, 10)"),
+    ('hour', "substr({row}.start_time, 1, 13)"),
+    ('slot', "CAST({row}.slot_id AS TEXT)"),
+    ('vehicle_type', "COALESCE((SELECT vehicle_type FROM slots WHERE slot_id = {row}.slot_id), 'unknown')"),
+]
+# The type recorded on the booking; the slot's is only a fallback for the
+# moment between the insert and the trigger that fills it in
+REVENUE_ROLLUP_BUCKETS = _SLOT_TYPE_BUCKETS[:3] + [
+    ('vehicle_type', "COALESCE({row}.vehicle_type, "
+                     "(SELECT vehicle_type FROM slots WHERE slot_id = {row}.slot_id), 'unknown')"),
+]
+
+def _revenue_rollup_statements(row, sign, buckets=REVENUE_ROLLUP_BUCKETS):
+    # Adds (sign '') or removes (sign '-') a paid booking from every bucket
+    statements = []
+    for kind, bucket in buckets:
+        statements.append(f'''
+        INSERT INTO revenue_rollup (kind, bucket, revenue, paid_bookings)
+        SELECT '{kind}', {bucket.format(row=row)}, {sign}{row}.amount_paid, {sign}1
+        WHERE {row}.payment_status = 'paid'
+        ON CONFLICT (kind, bucket) DO UPDATE SET
+            revenue = revenue + excluded.revenue,
+            paid_bookings = paid_bookings + excluded.paid_bookings;
+        ''')
+    return "".join(statements)
+
+def rebuild_stats_tables(cursor, buckets=REVENUE_ROLLUP_BUCKETS):
+    """Recompute booking_stats and revenue_rollup from the bookings and their archives"""
+    bookings = all_bookings_source(cursor)
+    cursor.execute("DELETE FROM revenue_rollup")
+    cursor.execute(f'''
+    INSERT OR REPLACE INTO booking_stats (id, total_bookings, active_bookings)
+    SELECT 1, COUNT(*), COALESCE(SUM(status = 'active'), 0) FROM {bookings}
+    ''')
+    for kind, bucket in buckets:
+        cursor.execute(f'''
+        INSERT INTO revenue_rollup (kind, bucket, revenue, paid_bookings)
+        SELECT '{kind}', {bucket.format(row='b')}, SUM(b.amount_paid), COUNT(*)
+        FROM {bookings} b
+        WHERE b.payment_status = 'paid'
+        GROUP BY 2
+        ''')
+
+def _migration_stats_rollups(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS booking_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_bookings INTEGER NOT NULL,
+        active_bookings INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS revenue_rollup (
+        kind TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        revenue REAL NOT NULL,
+        paid_bookings INTEGER NOT NULL,
+        PRIMARY KEY (kind, bucket)
+    ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS booking_stats_insert
+    AFTER INSERT ON bookings
+    BEGIN
+        UPDATE booking_stats SET
+            total_bookings = total_bookings + 1,
+            active_bookings = active_bookings + (NEW.status = 'active')
+        WHERE id = 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS booking_stats_status
+    AFTER UPDATE OF status ON bookings
+    WHEN (OLD.status = 'active') != (NEW.status = 'active')
+    BEGIN
+        UPDATE booking_stats SET
+            active_bookings = active_bookings + (NEW.status = 'active') - (OLD.status = 'active')
+        WHERE id = 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS booking_stats_delete
+    AFTER DELETE ON bookings
+    BEGIN
+        UPDATE booking_stats SET
+            total_bookings = total_bookings - 1,
+            active_bookings = active_bookings - (OLD.status = 'active')
+        WHERE id = 1;
+    END
+    ''')
+    
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS revenue_rollup_insert
+    AFTER INSERT ON bookings
+    WHEN NEW.payment_status = 'paid'
+    BEGIN {_revenue_rollup_statements('NEW', '', _SLOT_TYPE_BUCKETS)} END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS revenue_rollup_update
+    AFTER UPDATE OF slot_id, start_time, amount_paid, payment_status ON bookings
+    WHEN OLD.payment_status = 'paid' OR NEW.payment_status = 'paid'
+    BEGIN
+        {_revenue_rollup_statements('OLD', '-', _SLOT_TYPE_BUCKETS)}
+        {_revenue_rollup_statements('NEW', '', _SLOT_TYPE_BUCKETS)}
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS revenue_rollup_delete
+    AFTER DELETE ON bookings
+    WHEN OLD.payment_status = 'paid'
+    BEGIN {_revenue_rollup_statements('OLD', '-', _SLOT_TYPE_BUCKETS)} END
+    ''')
+    
+    rebuild_stats_tables(cursor, _SLOT_TYPE_BUCKETS)
+
+def _migration_change_log(cursor):
+    # Triggers append one entry per slot or booking change, whichever code
+    # path (or process) made it. Entries are ordered by seq, and only the
+    # latest change_feed.retention of them are kept.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        entity_id INTEGER NOT NULL,
+        status TEXT
+    )
+    ''')
+    
+    slot_status = "CASE WHEN NEW.is_active THEN NEW.status ELSE 'inactive' END"
+    for name, event, entity, row, status, condition in [
+        ("slots_log_insert", "INSERT", "slot", "NEW.slot_id", slot_status, ""),
+        ("slots_log_update", "UPDATE OF status, is_active, vehicle_type", "slot", "NEW.slot_id", slot_status,
+         "WHEN OLD.status IS NOT NEW.status OR OLD.is_active IS NOT NEW.is_active "
+         "OR OLD.vehicle_type IS NOT NEW.vehicle_type"),
+        ("slots_log_delete", "DELETE", "slot", "OLD.slot_id", "'deleted'", ""),
+        ("bookings_log_insert", "INSERT", "booking", "NEW.booking_id", "NEW.status", ""),
+        ("bookings_log_update", "UPDATE OF status, payment_status", "booking", "NEW.booking_id", "NEW.status",
+         "WHEN OLD.status IS NOT NEW.status OR OLD.payment_status IS NOT NEW.payment_status"),
+        ("bookings_log_delete", "DELETE", "booking", "OLD.booking_id", "'deleted'", ""),
+    ]:
+        table = "slots" if entity == "slot" else "bookings"
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name}
+        AFTER {event} ON {table} {condition}
+        BEGIN
+            INSERT INTO change_log (entity, entity_id, status) VALUES ('{entity}', {row}, {status});
+        END
+        ''')
+    
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS change_log_trim
+    AFTER INSERT ON change_log
+    BEGIN
+        DELETE FROM change_log WHERE seq <= NEW.seq - {int(CONFIG['change_feed']['retention'])};
+    END
+    ''')
+
+def _migration_payment_outbox(cursor):
+    # Bookings record the charge here in their own transaction; the payment
+    # workers settle it later. booking_ids is a JSON array because a bulk
+    # booking is one charge for many bookings. Times are epoch seconds.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS payment_outbox (
+        outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        booking_ids TEXT NOT NULL,
+        amount REAL NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        completed_at REAL
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_payment_outbox_due
+    ON payment_outbox (next_attempt_at) WHERE status IN ('pending', 'processing')
+    ''')
+
+def _migration_reservations(cursor):
+    # Advance reservations of a slot for [start_time, end_time). Reserved
+    # windows on one slot never overlap, so the latest window starting
+    # before a given end is the only one that can conflict with it.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS reservations (
+        reservation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        slot_id INTEGER NOT NULL,
+        user_id TEXT NOT NULL,
+        vehicle_number TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'reserved',
+        booking_id INTEGER,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (slot_id) REFERENCES slots (slot_id)
+    )
+    ''')
+    # Conflict checks: reserved windows of one slot by start_time
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_reservations_slot_window
+    ON reservations (slot_id, start_time, end_time) WHERE status = 'reserved'
+    ''')
+    # Loading the index: reserved windows that have not ended
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_reservations_end
+    ON reservations (end_time) WHERE status = 'reserved'
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_reservations_user
+    ON reservations (user_id, start_time) WHERE status = 'reserved'
+    ''')
+    # A reservation conflicts with the active booking on its slot
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_active_slot
+    ON bookings (slot_id, end_time) WHERE status = 'active'
+    ''')
+    for name, event, condition in [
+        ("reservations_log_insert", "INSERT", ""),
+        ("reservations_log_update", "UPDATE OF status", "WHEN OLD.status IS NOT NEW.status"),
+    ]:
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name}
+        AFTER {event} ON reservations {condition}
+        BEGIN
+            INSERT INTO change_log (entity, entity_id, status)
+            VALUES ('reservation', NEW.reservation_id, NEW.status);
+        END
+        ''')
+
+# Finished bookings are moved out of the hot table into one archive table
+# per month of start_time, listed in booking_archives. Moving a booking
+# deletes it from bookings, so the delete triggers skip their work while
+# archive_control.moving is set: archived bookings still count in the
+# dashboard statistics and are not reported as deleted.
+ARCHIVE_COLUMNS = (
+    "booking_id, slot_id, user_id, vehicle_number, start_time, end_time, "
+    "status, amount_paid, payment_status, change_seq, vehicle_type"
+)
+
+def archive_table_name(month):
+    """'2025-03' -> 'bookings_archive_2025_03'"""
+    if not re.fullmatch(r"\d{4}-\d{2}", month or ""):
+        raise ValueError(f"Invalid archive month: {month}")
+    return "bookings_archive_" + month.replace("-", "_")
+
+def create_archive_table(cursor, month):
+    table = archive_table_name(month)
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        booking_id INTEGER PRIMARY KEY,
+        slot_id INTEGER,
+        user_id TEXT,
+        vehicle_number TEXT,
+        start_time TEXT,
+        end_time TEXT,
+        status TEXT,
+        amount_paid REAL,
+        payment_status TEXT,
+        change_seq INTEGER,
+        start_date TEXT GENERATED ALWAYS AS (substr(start_time, 1, 10)) VIRTUAL,
+        vehicle_type TEXT
+    )
+    ''')
+    # The same orderings the hot table offers get_all_bookings and the export
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_start_time ON {table} (start_time)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_status_start ON {table} (status, start_time)")
+    cursor.execute(
+        "INSERT OR IGNORE INTO booking_archives (month, table_name) VALUES (?, ?)", (month, table)
+    )
+    return table
+
+def archive_tables(conn, month_from=None, month_to=None, newest_first=False):
+    """(month, table) for archived months month_from..month_to (YYYY-MM, inclusive)"""
+    return conn.execute(
+        "SELECT month, table_name FROM booking_archives WHERE month BETWEEN ? AND ? "
+        f"ORDER BY month {'DESC' if newest_first else 'ASC'}",
+        (month_from or "0000-00", month_to or "9999-99")
+    ).fetchall()
+
+def all_bookings_source(conn):
+    """FROM clause term for every booking, hot or archived"""
+    # Also used by migration 4, before the archive tables exist
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'booking_archives'"
+    ).fetchone():
+        return "bookings"
+    tables = [table for _, table in archive_tables(conn)]
+    if not tables:
+        return "bookings"
+    return "(" + " UNION ALL ".join(
+        f"SELECT {ARCHIVE_COLUMNS} FROM {table}" for table in ["bookings"] + tables
+    ) + ")"
+
+def _migration_booking_archive(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS booking_archives (
+        month TEXT PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        archived_rows INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS archive_control (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        moving INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO archive_control (id, moving) VALUES (1, 0)")
+    
+    not_moving = "NOT (SELECT moving FROM archive_control WHERE id = 1)"
+    for name in ("booking_stats_delete", "revenue_rollup_delete", "bookings_log_delete"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute(f'''
+    CREATE TRIGGER booking_stats_delete
+    AFTER DELETE ON bookings
+    WHEN {not_moving}
+    BEGIN
+        UPDATE booking_stats SET
+            total_bookings = total_bookings - 1,
+            active_bookings = active_bookings - (OLD.status = 'active')
+        WHERE id = 1;
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER revenue_rollup_delete
+    AFTER DELETE ON bookings
+    WHEN OLD.payment_status = 'paid' AND {not_moving}
+    BEGIN {_revenue_rollup_statements('OLD', '-', _SLOT_TYPE_BUCKETS)} END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER bookings_log_delete
+    AFTER DELETE ON bookings
+    WHEN {not_moving}
+    BEGIN
+        INSERT INTO change_log (entity, entity_id, status) VALUES ('booking', OLD.booking_id, 'deleted');
+    END
+    ''')
+
+def _migration_booking_journal(cursor):
+    # The last booking journal entry the checkpointer wrote to the tables,
+    # committed with the entries themselves so replay never applies one twice
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS journal_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        applied_seq INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO journal_state (id, applied_seq) VALUES (1, 0)")
+
+def _migration_vehicle_lookup(cursor):
+    # Gate cameras look up the active booking of a number plate
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_vehicle_active
+    ON bookings (vehicle_number, end_time) WHERE status = 'active'
+    ''')
+
+def _migration_status_date_index(cursor):
+    # The admin grid filtered by status and day; idx_bookings_status alone
+    # leaves every booking of that status to be read and checked for the day
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bookings_status_date
+    ON bookings (status, start_date, start_time)
+    ''')
+
+def _migration_settings(cursor):
+    # CONFIG values the triggers need, copied in by initialize_database so a
+    # change takes effect on the next start rather than being fixed at
+    # migration time
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS settings (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute(
+        "INSERT OR IGNORE INTO settings (name, value) VALUES ('change_log_retention', ?)",
+        (int(CONFIG['change_feed']['retention']),)
+    )
+    cursor.execute("DROP TRIGGER IF EXISTS change_log_trim")
+    cursor.execute('''
+    CREATE TRIGGER change_log_trim
+    AFTER INSERT ON change_log
+    BEGIN
+        DELETE FROM change_log WHERE seq <= NEW.seq - (
+            SELECT value FROM settings WHERE name = 'change_log_retention'
+        );
+    END
+    ''')
+
+def _migration_booking_vehicle_type(cursor):
+    # Bookings keep the vehicle type their slot had when they were made,
+    # so revenue by type stays put when a slot is retyped. Existing bookings
+    # get their slot's current type, which is what the rollup already counts.
+    slot_type = "COALESCE((SELECT vehicle_type FROM slots WHERE slot_id = {table}.slot_id), 'unknown')"
+    tables = ["bookings"] + [
+        table for table, in cursor.execute("SELECT table_name FROM booking_archives").fetchall()
+    ]
+    for table in tables:
+        columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+        if 'vehicle_type' not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN vehicle_type TEXT")
+        cursor.execute(f"UPDATE {table} SET vehicle_type = {slot_type.format(table=table)} "
+                       "WHERE vehicle_type IS NULL")
+    
+    # Writers that leave it out get the slot's type filled in
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS bookings_vehicle_type
+    AFTER INSERT ON bookings
+    WHEN NEW.vehicle_type IS NULL
+    BEGIN
+        UPDATE bookings SET vehicle_type = {slot_type.format(table='NEW')}
+        WHERE booking_id = NEW.booking_id;
+    END
+    ''')
+    
+    not_moving = "NOT (SELECT moving FROM archive_control WHERE id = 1)"
+    for name in ("revenue_rollup_insert", "revenue_rollup_update", "revenue_rollup_delete"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute(f'''
+    CREATE TRIGGER revenue_rollup_insert
+    AFTER INSERT ON bookings
+    WHEN NEW.payment_status = 'paid'
+    BEGIN {_revenue_rollup_statements('NEW', '')} END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER revenue_rollup_update
+    AFTER UPDATE OF slot_id, start_time, amount_paid, payment_status, vehicle_type ON bookings
+    WHEN OLD.payment_status = 'paid' OR NEW.payment_status = 'paid'
+    BEGIN
+        {_revenue_rollup_statements('OLD', '-')}
+        {_revenue_rollup_statements('NEW', '')}
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER revenue_rollup_delete
+    AFTER DELETE ON bookings
+    WHEN OLD.payment_status = 'paid' AND {not_moving}
+    BEGIN {_revenue_rollup_statements('OLD', '-')} END
+    ''')
+
+MIGRATIONS = [
+    (1, "base schema", _migration_base_schema),
+    (2, "booking indexes and start_date column", _migration_booking_indexes),
+    (3, "booking change sequence", _migration_booking_change_seq),
+    (4, "dashboard statistics rollups", _migration_stats_rollups),
+    (5, "change log", _migration_change_log),
+    (6, "payment outbox", _migration_payment_outbox),
+    (7, "advance reservations", _migration_reservations),
+    (8, "booking archive", _migration_booking_archive),
+    (9, "booking journal checkpoint", _migration_booking_journal),
+    (10, "active bookings by vehicle", _migration_vehicle_lookup),
+    (11, "bookings by status and date", _migration_status_date_index),
+    (12, "settings read by triggers", _migration_settings),
+    (13, "vehicle type recorded on bookings", _migration_booking_vehicle_type),
+]
+
+# The version a fully migrated database reports
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Apply every pending migration and return the versions applied"""
+    applied = []
+    current = get_schema_version(conn)
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            step(cursor)
+            # PRAGMA does not accept bound parameters
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def apply_settings(conn):
+    """Copy the CONFIG values the triggers read into the settings table"""
+    with conn:
+        conn.execute(
+            "UPDATE settings SET value = ? WHERE name = 'change_log_retention' AND value != ?",
+            (int(CONFIG['change_feed']['retention']),) * 2
+        )
+
+def initialize_database(db_path=None):
+    """Create the database or migrate it to SCHEMA_VERSION; returns the versions applied.
+
+    Nothing runs this on import: call it (or open_parking_system, or
+    ``python parking.py init``) once before opening a ParkingSystem.
+    Rerunning it is harmless, and applies any change to
+    CONFIG['change_feed']['retention'].
+    """
+    conn = sqlite3.connect(db_path or CONFIG['database'], check_same_thread=False)
+    try:
+        applied = migrate(conn)
+        apply_settings(conn)
+        return applied
+    finally:
+        conn.close()
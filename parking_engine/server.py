@@ -0,0 +1,551 @@
+"""HTTP/JSON server in front of a ParkingSystem"""
+
+import time
+import json
+import logging
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import re
+import signal
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from .config import CONFIG
+
+log = logging.getLogger(__name__)
+
+class APIError(Exception):
+    """A request the server refuses, with the HTTP status to answer with"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+HTTP_REASONS = {
+    200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+    429: "Too Many Requests", 500: "Internal Server Error"
+}
+
+MAX_REQUEST_BODY = 65536
+
+def _int_param(values, name, default=None):
+    value = values.get(name)
+    if value is None or value == '':
+        if default is None:
+            raise APIError(400, f"Missing parameter: {name}")
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise APIError(400, f"Parameter {name} must be an integer")
+
+def _outcome(result):
+    # (success, message) results answer 200 or 409 with the same body
+    success, message = result
+    return (200 if success else 409), {"success": success, "message": message}
+
+def _bulk_outcome(result):
+    return (200 if result.success else 409), {
+        "success": result.success, "message": result.message,
+        "items": [item._asdict() for item in result.items], "amount": result.amount
+    }
+
+def _completed(status, payload):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result((status, payload))
+    return future
+
+class PlainText(str):
+    """A handler result sent as text instead of JSON"""
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+class ParkingServer:
+    """Serves a ParkingSystem over HTTP/JSON so many gates share one garage.
+    
+    Mutations are queued to a single writer task and applied one at a time
+    in arrival order; reads run concurrently on a thread pool. A system with
+    group_commits set (JournaledParkingSystem) orders its own writes, so its
+    mutations run on the pool too and share journal commits. Connections
+    are kept alive, and pipelined requests are answered in the order they
+    arrived.
+    
+    Every /admin/ route but /admin/login needs an "Authorization: Bearer"
+    token that a successful login returns. A username with login_attempts
+    failed logins in the last login_lockout_s is refused until they age out.
+    """
+    def __init__(self, parking_system, host=None, port=None, readers=None, pipeline_depth=None):
+        settings = CONFIG['server']
+        self.parking_system = parking_system
+        self.host = host or settings['host']
+        self.port = settings['port'] if port is None else port
+        self.pipeline_depth = pipeline_depth or settings['pipeline_depth']
+        self.readers = ThreadPoolExecutor(readers or settings['readers'],
+                                          thread_name_prefix="parking-read")
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix="parking-write")
+        self.mutations = None
+        self.serial_writes = not getattr(parking_system, 'group_commits', False)
+        self.stopping = None
+        self.change_waiter = None
+        self.requests = 0
+        self.auth_lock = threading.Lock()
+        self.admin_tokens = {}    # token -> monotonic expiry
+        self.login_failures = {}  # username -> monotonic times of recent failed logins
+        
+        # (method, path pattern, handler, where it runs): 'read' on the reader
+        # pool, 'write' through the writer task, 'loop' on the event loop
+        self.routes = [
+            ("GET", r"/health", self.health, "loop"),
+            ("GET", r"/metrics", self.metrics_text, "loop"),
+            ("GET", r"/admin/metrics", self.metrics_json, "loop"),
+            ("GET", r"/changes", self.changes, "loop"),
+            ("GET", r"/changes/seq", self.change_log_seq, "read"),
+            ("GET", r"/slots", self.available_slots, "read"),
+            ("GET", r"/slots/states", self.slot_states, "read"),
+            ("GET", r"/slots/all", self.all_slots, "read"),
+            ("GET", r"/slots/free", self.free_slots, "read"),
+            ("POST", r"/bookings", self.book_slot, "write"),
+            ("POST", r"/bookings/(\d+)/release", self.release_slot, "write"),
+            ("POST", r"/bookings/bulk", self.book_slots_bulk, "write"),
+            ("POST", r"/bookings/release", self.release_bookings_bulk, "write"),
+            ("GET", r"/users/([^/]+)/bookings", self.user_bookings, "read"),
+            ("GET", r"/vehicles/([^/]+)/booking", self.vehicle_booking, "read"),
+            ("POST", r"/reservations", self.reserve_slot, "write"),
+            ("POST", r"/reservations/(\d+)/cancel", self.cancel_reservation, "write"),
+            ("POST", r"/reservations/(\d+)/check-in", self.check_in_reservation, "write"),
+            ("GET", r"/users/([^/]+)/reservations", self.user_reservations, "read"),
+            ("GET", r"/admin/bookings", self.all_bookings, "read"),
+            ("GET", r"/admin/changes", self.changed_bookings, "read"),
+            ("GET", r"/admin/change-seq", self.change_seq, "read"),
+            ("GET", r"/admin/stats", self.dashboard_stats, "read"),
+            ("GET", r"/admin/export", self.export_batch, "read"),
+            ("GET", r"/admin/export/count", self.export_count, "read"),
+            ("POST", r"/admin/login", self.authenticate_admin, "read"),
+            ("POST", r"/admin/slots", self.add_slot, "write"),
+            ("POST", r"/admin/slots/(\d+)/active", self.set_slot_active, "write"),
+        ]
+        self.routes = [
+            (method, re.compile(pattern), handler, kind,
+             pattern.startswith("/admin/") and pattern != "/admin/login")
+            for method, pattern, handler, kind in self.routes
+        ]
+    
+    # Handlers run on the reader pool or the writer thread. Each gets the path
+    # captures, the query string and the JSON body, and returns
+    # (status, payload) or just the payload for a 200.
+    def health(self, query, data):
+        return {"status": "ok", "requests": self.requests}
+    
+    def metrics_text(self, query, data):
+        return PlainText(self.parking_system.metrics.to_prometheus())
+    
+    def metrics_json(self, query, data):
+        return self.parking_system.metrics.to_json()
+    
+    async def changes(self, query, data):
+        # Long poll: with wait=S, an idle feed holds the request for up to S
+        # seconds and answers as soon as something is committed
+        loop = asyncio.get_running_loop()
+        since = _int_param(query, 'since')
+        limit = _int_param(query, 'limit', 0) or None
+        try:
+            wait = min(float(query.get('wait') or 0), CONFIG['change_feed']['long_poll_s'])
+        except ValueError:
+            raise APIError(400, "Parameter wait must be a number")
+        deadline = loop.time() + wait
+        while True:
+            # Taken before the query so a commit in between is not missed
+            waiter = self.change_waiter
+            changes, change_seq = await loop.run_in_executor(
+                self.readers, self.parking_system.get_changes_since, since, limit
+            )
+            remaining = deadline - loop.time()
+            if changes != [] or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), remaining)
+            except asyncio.TimeoutError:
+                break
+        return {
+            "changes": None if changes is None else [list(change) for change in changes],
+            "change_seq": change_seq
+        }
+    
+    def change_log_seq(self, query, data):
+        return {"change_seq": self.parking_system.get_change_log_seq()}
+    
+    def _wake_change_waiters(self):
+        waiter, self.change_waiter = self.change_waiter, asyncio.get_running_loop().create_future()
+        waiter.set_result(None)
+    
+    def available_slots(self, query, data):
+        return {"slots": self.parking_system.get_available_slots(query.get('vehicle_type'))}
+    
+    def slot_states(self, query, data):
+        return {"slots": self.parking_system.get_slot_states()}
+    
+    def all_slots(self, query, data):
+        return {"slots": self.parking_system.get_slots()}
+    
+    def free_slots(self, query, data):
+        if not query.get('start') or not query.get('end'):
+            raise APIError(400, "Missing parameter: start and end")
+        try:
+            slots = self.parking_system.find_free_slots(
+                query['start'], query['end'], query.get('vehicle_type')
+            )
+        except ValueError:
+            raise APIError(400, "Parameters start and end must be ISO timestamps")
+        return {"slots": slots}
+    
+    def book_slot(self, query, data):
+        return _outcome(self.parking_system.book_slot(
+            _int_param(data, 'slot_id'), str(data['user_id']), str(data['vehicle_number']),
+            _int_param(data, 'duration_minutes', 60)
+        ))
+    
+    def release_slot(self, booking_id, query, data):
+        return _outcome(self.parking_system.release_slot(int(booking_id)))
+    
+    def book_slots_bulk(self, query, data):
+        return _bulk_outcome(self.parking_system.book_slots_bulk(
+            str(data['user_id']), data['vehicle_numbers'],
+            count=data.get('count'), slot_ids=data.get('slot_ids'),
+            vehicle_type=data.get('vehicle_type'), contiguous=bool(data.get('contiguous')),
+            duration_minutes=_int_param(data, 'duration_minutes', 60),
+            all_or_nothing=data.get('all_or_nothing', True)
+        ))
+    
+    def release_bookings_bulk(self, query, data):
+        return _bulk_outcome(self.parking_system.release_bookings_bulk(
+            data['booking_ids'], all_or_nothing=bool(data.get('all_or_nothing'))
+        ))
+    
+    def user_bookings(self, user_id, query, data):
+        bookings = self.parking_system.get_user_bookings(unquote(user_id))
+        return {"bookings": [booking.as_row() for booking in bookings]}
+    
+    def vehicle_booking(self, vehicle_number, query, data):
+        booking = self.parking_system.find_active_booking_by_vehicle(unquote(vehicle_number))
+        return {"booking": booking.as_row() if booking else None}
+    
+    def reserve_slot(self, query, data):
+        result = self.parking_system.reserve_slot(
+            _int_param(data, 'slot_id'), str(data['user_id']), str(data['vehicle_number']),
+            str(data['start_time']), str(data['end_time'])
+        )
+        return (200 if result.success else 409), result._asdict()
+    
+    def cancel_reservation(self, reservation_id, query, data):
+        return _outcome(self.parking_system.cancel_reservation(int(reservation_id)))
+    
+    def check_in_reservation(self, reservation_id, query, data):
+        return _outcome(self.parking_system.check_in_reservation(int(reservation_id)))
+    
+    def user_reservations(self, user_id, query, data):
+        return {"reservations": self.parking_system.get_user_reservations(unquote(user_id))}
+    
+    def all_bookings(self, query, data):
+        filters = {key: query[key] for key in ('status', 'date') if query.get(key)}
+        after = None
+        if query.get('after_start'):
+            after = (query['after_start'], _int_param(query, 'after_id'))
+        page_size = _int_param(query, 'page_size', 0) or None
+        bookings = self.parking_system.get_all_bookings(filters, after, page_size)
+        return {"bookings": [booking.as_row() for booking in bookings]}
+    
+    def changed_bookings(self, query, data):
+        rows, change_seq = self.parking_system.get_bookings_changed_since(
+            _int_param(query, 'since'), _int_param(query, 'limit', 0) or None
+        )
+        return {"bookings": [booking.as_row() for booking in rows], "change_seq": change_seq}
+    
+    def change_seq(self, query, data):
+        return {"change_seq": self.parking_system.get_booking_change_seq()}
+    
+    @staticmethod
+    def _export_filters(query):
+        return {
+            key: query[key] for key in ('status', 'date_from', 'date_to', 'slot_id', 'user_id')
+            if query.get(key)
+        }
+    
+    def export_batch(self, query, data):
+        columns = query['columns'].split(',') if query.get('columns') else None
+        after = None
+        if query.get('after_start'):
+            after = (query['after_start'], _int_param(query, 'after_id'))
+        try:
+            rows, after = self.parking_system.get_export_batch(
+                columns, self._export_filters(query), after, _int_param(query, 'batch_size', 0) or None
+            )
+        except ValueError as e:
+            raise APIError(400, str(e))
+        return {"rows": rows, "after": after}
+    
+    def export_count(self, query, data):
+        try:
+            return {"count": self.parking_system.count_export_rows(self._export_filters(query))}
+        except ValueError as e:
+            raise APIError(400, str(e))
+    
+    def dashboard_stats(self, query, data):
+        total, active, revenue = self.parking_system.get_dashboard_stats(query.get('day'))
+        return {"total": total, "active": active, "revenue": revenue}
+    
+    def authenticate_admin(self, query, data):
+        settings = CONFIG['server']
+        username, password = str(data.get('username', '')), str(data.get('password', ''))
+        now = time.monotonic()
+        with self.auth_lock:
+            if username not in self.login_failures and len(self.login_failures) > 10000:
+                # Forget usernames that have not failed lately
+                self.login_failures = {
+                    name: times for name, times in self.login_failures.items()
+                    if times and times[-1] > now - settings['login_lockout_s']
+                }
+            failures = self.login_failures.setdefault(username, deque())
+            while failures and failures[0] < now - settings['login_lockout_s']:
+                failures.popleft()
+            if len(failures) >= settings['login_attempts']:
+                raise APIError(429, "Too many failed logins; try again later")
+            # Counted as a failure until it succeeds, so concurrent guesses
+            # cannot all slip in under the limit
+            failures.append(now)
+        try:
+            authenticated = self.parking_system.authenticate_admin(username, password)
+        except Exception:
+            with self.auth_lock:
+                if now in failures:
+                    failures.remove(now)
+            raise
+        if not authenticated:
+            return {"authenticated": False}
+        token = secrets.token_urlsafe(32)
+        with self.auth_lock:
+            self.login_failures.pop(username, None)
+            self.admin_tokens = {
+                other: expires for other, expires in self.admin_tokens.items() if expires > now
+            }
+            self.admin_tokens[token] = now + settings['admin_token_ttl_s']
+        return {"authenticated": True, "token": token}
+    
+    def _authorized(self, authorization):
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        with self.auth_lock:
+            expires = self.admin_tokens.get(token.strip())
+        return expires is not None and expires > time.monotonic()
+    
+    def add_slot(self, query, data):
+        return {"slot_id": self.parking_system.add_slot(data.get('vehicle_type') or 'regular')}
+    
+    def set_slot_active(self, slot_id, query, data):
+        if 'is_active' not in data:
+            raise APIError(400, "Missing parameter: is_active")
+        self.parking_system.set_slot_active(int(slot_id), bool(data['is_active']))
+        return {"success": True}
+    
+    async def serve(self, ready=None):
+        """Listen until SIGINT/SIGTERM or stop(); ready(port) is called once bound"""
+        loop = asyncio.get_running_loop()
+        self.mutations = asyncio.Queue()
+        self.stopping = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stopping.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Not the main thread, or not supported on this platform
+        
+        self.change_waiter = loop.create_future()
+        change_token = self.parking_system.change_bus.subscribe(
+            lambda changes: loop.call_soon_threadsafe(self._wake_change_waiters)
+        )
+        writer_task = asyncio.create_task(self.write_mutations())
+        server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port,
+            backlog=CONFIG['server']['backlog']
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"Serving on http://{self.host}:{self.port}")
+        if ready:
+            ready(self.port)
+        
+        try:
+            await self.stopping.wait()
+        finally:
+            self.parking_system.change_bus.unsubscribe(change_token)
+            server.close()
+            await server.wait_closed()
+            writer_task.cancel()
+            self.readers.shutdown(wait=True)
+            self.writer.shutdown(wait=True)
+    
+    def stop(self):
+        if self.stopping:
+            self.stopping.set()
+    
+    async def write_mutations(self):
+        # The single writer: one mutation at a time, in the order they arrived
+        loop = asyncio.get_running_loop()
+        while True:
+            call, future = await self.mutations.get()
+            try:
+                result = await loop.run_in_executor(self.writer, call)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+    
+    async def dispatch(self, method, target, body, authorization=None):
+        """Route one request and return (status, payload)"""
+        self.requests += 1
+        url = urlsplit(target)
+        allowed = False
+        for route_method, pattern, handler, kind, admin in self.routes:
+            match = pattern.fullmatch(url.path)
+            if not match:
+                continue
+            allowed = True
+            if route_method == method:
+                break
+        else:
+            if allowed:
+                return 405, {"error": f"{method} not allowed on {url.path}"}
+            return 404, {"error": f"No such resource: {url.path}"}
+        if admin and not self._authorized(authorization):
+            return 401, {"error": "Admin login required"}
+        
+        metrics = self.parking_system.metrics
+        if not metrics.enabled:
+            return await self._dispatch(method, url, handler, kind, match, body)
+        started = time.perf_counter()
+        try:
+            return await self._dispatch(method, url, handler, kind, match, body)
+        finally:
+            metrics.observe('http', f"{method} {pattern.pattern}", time.perf_counter() - started)
+    
+    async def _dispatch(self, method, url, handler, kind, match, body):
+        """Run the matched handler where its kind says and return (status, payload)"""
+        try:
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise APIError(400, "Request body must be a JSON object")
+            call = partial(handler, *match.groups(), query=query, data=data)
+            if kind == "loop":
+                result = call()
+                if asyncio.iscoroutine(result):
+                    result = await result
+            elif kind == "write" and self.serial_writes:
+                future = asyncio.get_running_loop().create_future()
+                await self.mutations.put((call, future))
+                result = await future
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self.readers, call)
+        except APIError as e:
+            return e.status, {"error": str(e)}
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"Bad request: {e}"}
+        except Exception:
+            log.exception("Server error on %s %s", method, url.path)
+            return 500, {"error": "Internal server error"}
+        
+        if isinstance(result, tuple):
+            return result
+        return 200, result
+    
+    async def read_request(self, reader):
+        """(method, target, keep-alive, body, Authorization header) for the next request, None at EOF"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise APIError(400, "Truncated request")
+            return None
+        except asyncio.LimitOverrunError:
+            raise APIError(413, "Request headers too large")
+        
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise APIError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        
+        if version == "HTTP/1.1":
+            keep_alive = headers.get('connection', '').lower() != 'close'
+        else:
+            keep_alive = headers.get('connection', '').lower() == 'keep-alive'
+        
+        length = headers.get('content-length', '0')
+        if not length.isdigit():
+            raise APIError(400, "Bad Content-Length")
+        if int(length) > MAX_REQUEST_BODY:
+            raise APIError(413, "Request body too large")
+        body = await reader.readexactly(int(length)) if int(length) else b""
+        return method, target, keep_alive, body, headers.get('authorization')
+    
+    async def handle_connection(self, reader, writer):
+        # The parser keeps reading while earlier requests are still running;
+        # the sender writes their responses back in request order. The
+        # bounded queue caps how far a client can pipeline ahead.
+        responses = asyncio.Queue(self.pipeline_depth)
+        sender = asyncio.create_task(self.send_responses(responses, writer))
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except APIError as e:
+                    await responses.put((_completed(e.status, {"error": str(e)}), False))
+                    break
+                if request is None:
+                    break
+                method, target, keep_alive, body, authorization = request
+                response = asyncio.ensure_future(self.dispatch(method, target, body, authorization))
+                await responses.put((response, keep_alive))
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await responses.put(None)
+            await sender
+            writer.close()
+    
+    async def send_responses(self, responses, writer):
+        broken = False
+        while True:
+            item = await responses.get()
+            if item is None:
+                return
+            response, keep_alive = item
+            status, payload = await response
+            if broken:
+                continue  # Keep draining so the parser never blocks
+            if isinstance(payload, PlainText):
+                body, content_type = payload.encode(), PlainText.content_type
+            else:
+                body, content_type = json.dumps(payload, default=str).encode(), "application/json"
+            writer.write(
+                f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'Unknown')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                + body
+            )
+            # Pipelined responses go out together
+            if responses.empty() or not keep_alive:
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    broken = True
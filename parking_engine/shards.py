@@ -0,0 +1,402 @@
+"""Sharded garage: slots split by site or level across several database files.
+
+Every shard is an ordinary parking database served by its own ``serve``
+worker process, so each has its own write lock and its own core. Shard n
+owns the slot, booking and reservation ids n * id_block + 1 through
+(n + 1) * id_block, which means any id names its shard: ShardedParkingSystem
+routes a call by arithmetic and needs no lookup table. Calls that span the
+garage fan out to every shard and merge the answers.
+
+Shards are numbered by their position in the list, so a shard may be added
+at the end but never moved or removed.
+"""
+
+import sqlite3
+import heapq
+import queue
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from .config import CONFIG
+from .schema import initialize_database
+from .records import BookingTable
+from .metrics import Metrics
+from .changes import ChangeBus
+from .system import PROFILED_OPERATIONS, BulkItem, BulkResult
+from .remote import RemoteParkingSystem
+
+def shard_ids(index):
+    """(first, last) id owned by shard index"""
+    block = CONFIG['shards']['id_block']
+    return index * block + 1, (index + 1) * block
+
+def shard_of(entity_id):
+    """Index of the shard that owns a slot, booking or reservation id"""
+    return (int(entity_id) - 1) // CONFIG['shards']['id_block']
+
+def initialize_shard(db_path, index):
+    """initialize_database, then move a new shard's ids into its block.
+
+    A brand new database is seeded with slots 1-20; for shard index they
+    become its first 20 ids, and its booking and reservation counters start
+    at the bottom of its block. Shard 0's block starts at 1, so an existing
+    single garage database can serve as shard 0 unchanged. Safe to rerun.
+    """
+    applied = initialize_database(db_path)
+    first, last = shard_ids(index)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        low, high = cursor.execute("SELECT MIN(slot_id), MAX(slot_id) FROM slots").fetchone()
+        if low is not None and low < first:
+            if cursor.execute(
+                "SELECT EXISTS (SELECT 1 FROM bookings) OR EXISTS (SELECT 1 FROM reservations)"
+            ).fetchone()[0]:
+                raise ValueError(f"{db_path} already has bookings with ids outside shard {index}")
+            # Deleted and inserted again rather than renumbered in place, so
+            # the change log stays in step with the slots table
+            slots = cursor.execute(
+                "SELECT slot_id + ?, status, vehicle_type, is_active FROM slots", (first - 1,)
+            ).fetchall()
+            cursor.execute("DELETE FROM slots")
+            cursor.executemany(
+                "INSERT INTO slots (slot_id, status, vehicle_type, is_active) VALUES (?, ?, ?, ?)",
+                slots
+            )
+        elif high is not None and high > last:
+            raise ValueError(f"{db_path} has slot {high}, outside shard {index}")
+
+        for table in ('bookings', 'reservations'):
+            row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+            if row is None:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, first - 1))
+            elif row[0] < first - 1:
+                cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (first - 1, table))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return applied
+
+def serve_shard(db_path, index, host=None, port=None, ready=None):
+    """Bring shard index up to date and serve it over HTTP until stopped"""
+    import asyncio
+    from .server import ParkingServer
+    from .system import ParkingSystem
+    initialize_shard(db_path, index)
+    parking_system = ParkingSystem(db_path)
+    try:
+        asyncio.run(ParkingServer(parking_system, host, port).serve(ready))
+    finally:
+        parking_system.close()
+
+def _shard_worker(db_path, index, host, port, started):
+    # Runs in the worker process; reports (index, port, error) once listening
+    try:
+        serve_shard(db_path, index, host, port,
+                    ready=lambda port: started.put((index, port, None)))
+    except Exception as e:
+        started.put((index, None, f"{type(e).__name__}: {e}"))
+        raise
+
+class ShardWorkers:
+    """One server process per shard.
+    
+    shards is a list of {"name", "database"} dicts, optionally with a
+    "port"; by default CONFIG['shards']['sites']. Without a port, shard n
+    listens on base_port + n, or on any free port when base_port is 0.
+    """
+    def __init__(self, shards=None, host=None, base_port=None):
+        settings = CONFIG['shards']
+        self.shards = list(settings['sites'] if shards is None else shards)
+        self.host = host or CONFIG['server']['host']
+        self.base_port = settings['base_port'] if base_port is None else base_port
+        self.processes = []
+        self.urls = []
+    
+    def start(self, timeout=30):
+        """Start every worker and return their URLs in shard order"""
+        context = multiprocessing.get_context("spawn")
+        started = context.Queue()
+        for index, shard in enumerate(self.shards):
+            port = shard.get('port', self.base_port + index if self.base_port else 0)
+            process = context.Process(
+                target=_shard_worker, args=(shard['database'], index, self.host, port, started),
+                name=f"parking-shard-{shard['name']}", daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+        
+        urls = [None] * len(self.shards)
+        try:
+            for _ in self.shards:
+                index, port, error = started.get(timeout=timeout)
+                if error:
+                    raise RuntimeError(f"Shard {self.shards[index]['name']} failed to start: {error}")
+                urls[index] = f"http://{self.host}:{port}"
+        except queue.Empty:
+            self.stop()
+            raise RuntimeError("Shard workers did not start in time")
+        except RuntimeError:
+            self.stop()
+            raise
+        self.urls = urls
+        return urls
+    
+    def wait(self):
+        for process in self.processes:
+            process.join()
+    
+    def stop(self, timeout=10):
+        # SIGTERM lets each server finish what it is doing and close its database
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+        self.processes = []
+
+class ShardChangeBus(ChangeBus):
+    """ChangeBus of a sharded garage: follows every shard's feed once anyone subscribes.
+
+    Each shard numbers its changes on its own, so the seqs of the merged
+    feed are only ordered within a shard.
+    """
+    def __init__(self, shards):
+        super().__init__()
+        self.shards = shards
+        self.following = False
+    
+    def subscribe(self, callback):
+        token = super().subscribe(callback)
+        with self.lock:
+            if not self.following:
+                self.following = True
+                for shard in self.shards:
+                    shard.change_bus.subscribe(self.publish)
+        return token
+
+class ShardedParkingSystem:
+    """Routes ParkingSystem calls to the shards of a sharded garage.
+    
+    Bookings, releases, reservations and slot changes go to the one shard
+    that owns the slot, booking or reservation id. Availability, a user's
+    bookings and the admin queries fan out to every shard in parallel and
+    are merged in the order a single ParkingSystem returns them, so the
+    kiosk, the admin window and the export run against it unchanged.
+    
+    Limits:
+    - Change sequences are per shard. get_booking_change_seq returns a
+      tuple of them to pass back to get_bookings_changed_since, which may
+      return up to limit bookings from each shard.
+    - get_export_batch exports shard by shard, each in start order, rather
+      than in one start order across the garage.
+    - A bulk booking is made on one shard, in one of its transactions:
+      named slots must all belong to one shard, and count slots come from
+      the first shard that can supply them. A bulk release spanning shards
+      is one transaction per shard, so it cannot be all-or-nothing.
+    - Writes only scale with the shard count while every shard worker has
+      a core of its own; every call also pays an HTTP round trip to its
+      shard. On fewer cores than shards the router is slower than one
+      database (see ``python benchmark.py shards``).
+    """
+    expiry_scheduler = None  # Expiry runs on every shard's server
+    
+    def __init__(self, urls, timeout=10):
+        self.shards = [RemoteParkingSystem(url, timeout) for url in urls]
+        self.fan_out_pool = ThreadPoolExecutor(len(self.shards), thread_name_prefix="parking-shards")
+        self.change_bus = ShardChangeBus(self.shards)
+        # Times the calls as a kiosk sees them, fan-out and merge included
+        self.metrics = Metrics()
+        self.metrics.instrument(self, 'operation', [
+            name for name in PROFILED_OPERATIONS if hasattr(self, name)
+        ])
+    
+    def shard(self, entity_id):
+        """The RemoteParkingSystem of the shard that owns a slot, booking or reservation id"""
+        index = shard_of(entity_id)
+        if not 0 <= index < len(self.shards):
+            raise ValueError(f"Id {entity_id} belongs to no shard")
+        return self.shards[index]
+    
+    def _owner(self, entity_id):
+        try:
+            return self.shard(entity_id)
+        except (ValueError, TypeError):
+            return None
+    
+    def fan_out(self, name, *args):
+        """Call name(*args) on every shard at once; the results in shard order"""
+        return list(self.fan_out_pool.map(lambda shard: getattr(shard, name)(*args), self.shards))
+    
+    def get_available_slots(self, vehicle_type=None, shard=None):
+        """Free slot ids on one shard (by index), or on all of them"""
+        if shard is not None:
+            return self.shards[shard].get_available_slots(vehicle_type)
+        # Shard blocks are in id order, so the lists concatenate sorted
+        return [slot_id for slots in self.fan_out('get_available_slots', vehicle_type) for slot_id in slots]
+    
+    def get_slot_states(self):
+        return [state for states in self.fan_out('get_slot_states') for state in states]
+    
+    def get_slots(self):
+        return [slot for slots in self.fan_out('get_slots') for slot in slots]
+    
+    def add_slot(self, vehicle_type='regular', shard=0):
+        return self.shards[shard].add_slot(vehicle_type)
+    
+    def set_slot_active(self, slot_id, is_active):
+        self.shard(slot_id).set_slot_active(slot_id, is_active)
+    
+    def book_slot(self, slot_id, user_id, vehicle_number, duration_minutes=60):
+        owner = self._owner(slot_id)
+        if owner is None:
+            return False, "Slot is not available"
+        return owner.book_slot(slot_id, user_id, vehicle_number, duration_minutes)
+    
+    def release_slot(self, booking_id):
+        owner = self._owner(booking_id)
+        if owner is None:
+            return False, "Booking not found or already released"
+        return owner.release_slot(booking_id)
+    
+    def book_slots_bulk(self, user_id, vehicle_numbers, count=None, slot_ids=None,
+                        vehicle_type=None, contiguous=False, duration_minutes=60,
+                        all_or_nothing=True):
+        options = dict(vehicle_type=vehicle_type, contiguous=contiguous,
+                       duration_minutes=duration_minutes, all_or_nothing=all_or_nothing)
+        if slot_ids is not None:
+            if not isinstance(slot_ids, (list, tuple)):
+                raise ValueError("slot_ids must be a list of slot ids")
+            owners = {self._owner(int(slot_id)) for slot_id in slot_ids}
+            if None in owners:
+                return BulkResult(False, "Some slots belong to no shard", [], 0)
+            if len(owners) > 1:
+                return BulkResult(False, "Slots on different shards cannot be booked together", [], 0)
+            owner = owners.pop() if owners else self.shards[0]
+            return owner.book_slots_bulk(user_id, vehicle_numbers, count, slot_ids, **options)
+        result = None
+        for shard in self.shards:
+            result = shard.book_slots_bulk(user_id, vehicle_numbers, count, None, **options)
+            if result.success:
+                break
+        return result
+    
+    def release_bookings_bulk(self, booking_ids, all_or_nothing=False):
+        if not isinstance(booking_ids, (list, tuple)):
+            raise ValueError("booking_ids must be a list of booking ids")
+        requested = [int(booking_id) for booking_id in booking_ids]
+        by_owner = {}
+        for booking_id in requested:
+            owner = self._owner(booking_id)
+            if owner is not None:
+                by_owner.setdefault(owner, []).append(booking_id)
+        if all_or_nothing:
+            if len(by_owner) > 1:
+                return BulkResult(False, "Bookings on different shards cannot be released together", [], 0)
+            owner = next(iter(by_owner)) if by_owner else self.shards[0]
+            return owner.release_bookings_bulk(requested, all_or_nothing=True)
+        released = {}
+        for result in self.fan_out_pool.map(
+            lambda owner: owner.release_bookings_bulk(by_owner[owner]), by_owner
+        ):
+            released.update((item.booking_id, item) for item in result.items if item.success)
+        items = [
+            released.get(booking_id) or
+            BulkItem(None, booking_id, False, "Booking not found or already released")
+            for booking_id in requested
+        ]
+        return BulkResult(bool(released), f"Released {len(released)} of {len(items)} bookings", items, 0)
+    
+    def reserve_slot(self, slot_id, user_id, vehicle_number, start_time, end_time):
+        return self.shard(slot_id).reserve_slot(slot_id, user_id, vehicle_number, start_time, end_time)
+    
+    def cancel_reservation(self, reservation_id):
+        owner = self._owner(reservation_id)
+        if owner is None:
+            return False, "Reservation not found or no longer active"
+        return owner.cancel_reservation(reservation_id)
+    
+    def check_in_reservation(self, reservation_id):
+        owner = self._owner(reservation_id)
+        if owner is None:
+            return False, "Reservation not found or no longer active"
+        return owner.check_in_reservation(reservation_id)
+    
+    def get_user_bookings(self, user_id):
+        return list(heapq.merge(*self.fan_out('get_user_bookings', user_id),
+                                key=lambda booking: booking.end))
+    
+    def find_active_booking_by_vehicle(self, vehicle_number):
+        bookings = [booking for booking in self.fan_out('find_active_booking_by_vehicle', vehicle_number)
+                    if booking]
+        return min(bookings, key=lambda booking: booking.end) if bookings else None
+    
+    def get_user_reservations(self, user_id):
+        return list(heapq.merge(*self.fan_out('get_user_reservations', user_id),
+                                key=lambda reservation: reservation.start_time))
+    
+    def get_all_bookings(self, filters=None, after=None, page_size=None):
+        """A BookingTable of the matching bookings on every shard, newest first.
+        
+        Each shard returns its own first page_size; the merged page is the
+        first page_size of those, so paging with after works as it does on
+        one database.
+        """
+        pages = self.fan_out('get_all_bookings', filters, after, page_size)
+        merged = heapq.merge(*pages, key=lambda booking: (booking.start, booking.booking_id), reverse=True)
+        return BookingTable(islice(merged, page_size) if page_size else merged)
+    
+    def get_dashboard_stats(self, day=None):
+        """(total bookings, active bookings, revenue for day) summed over the shards"""
+        total = active = revenue = 0
+        for shard_total, shard_active, shard_revenue in self.fan_out('get_dashboard_stats', day):
+            total += shard_total
+            active += shard_active
+            revenue += shard_revenue or 0
+        return total, active, revenue
+    
+    def get_booking_change_seq(self):
+        return tuple(self.fan_out('get_booking_change_seq'))
+    
+    def get_bookings_changed_since(self, change_seq, limit=None):
+        """Bookings changed on any shard after change_seq, a tuple from get_booking_change_seq.
+
+        Each shard returns up to limit, so more than limit bookings may come
+        back; the returned tuple never goes backwards on any shard.
+        """
+        results = list(self.fan_out_pool.map(
+            lambda shard, seq: shard.get_bookings_changed_since(seq, limit), self.shards, change_seq
+        ))
+        return ([booking for bookings, _ in results for booking in bookings],
+                tuple(seq for _, seq in results))
+    
+    def get_export_batch(self, columns=None, filters=None, after=None, batch_size=None):
+        """One batch of the export from one shard; the key moves to the next shard when it runs out"""
+        index, shard_after = after or (0, None)
+        rows, shard_after = self.shards[index].get_export_batch(columns, filters, shard_after, batch_size)
+        if shard_after is not None:
+            return rows, (index, shard_after)
+        if index + 1 < len(self.shards):
+            return rows, (index + 1, None)
+        return rows, None
+    
+    def count_export_rows(self, filters=None):
+        return sum(self.fan_out('count_export_rows', filters))
+    
+    def authenticate_admin(self, username, password):
+        # Each shard issues its own admin token, so the account must exist on all of them
+        return all(self.fan_out('authenticate_admin', username, password))
+    
+    def close(self):
+        self.fan_out_pool.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+        if self.metrics.enabled and CONFIG['metrics']['dump_path']:
+            self.metrics.dump(CONFIG['metrics']['dump_path'])
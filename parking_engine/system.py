@@ -0,0 +1,996 @@
+"""ParkingSystem, the booking engine"""
+
+import os
+from datetime import datetime, timedelta
+import time
+import json
+from collections import namedtuple
+
+from .config import CONFIG
+from .schema import (
+    ARCHIVE_COLUMNS, REVENUE_ROLLUP_BUCKETS, SCHEMA_VERSION, all_bookings_source, archive_tables,
+    create_archive_table, get_schema_version, initialize_database, rebuild_stats_tables
+)
+from .queries import (
+    ACTIVE_BOOKINGS_QUERY, ARCHIVE_CANDIDATES_QUERY, BOOKED_UNTIL_QUERY, BOOKING_CONFLICT_QUERY,
+    CHANGED_BOOKINGS_QUERY, CHANGE_LOG_QUERY, CLAIM_SLOTS_QUERY, EXPIRE_BATCH_QUERY,
+    EXPORT_COLUMNS, INSERT_PAYMENT_QUERY, NAMED_QUERIES, RELEASE_BOOKINGS_QUERY,
+    RELEASE_SLOTS_QUERY, RESERVATION_CONFLICT_QUERY, UPCOMING_RESERVATIONS_QUERY, archive_months,
+    build_all_bookings_query, build_export_count_query, build_export_query
+)
+from .metrics import Metrics
+from .pool import ConnectionPool
+from .records import MICROS_PER_MINUTE, Booking, BookingTable, epoch_iso, epoch_micros
+from .pricing import TARIFF_EPOCH, PaymentService, Tariff, tariff_minutes
+from .indexes import BookingCache, ReservationIndex, SlotIndex
+from .payments import PaymentOutbox
+from .changes import CHANGE_RESYNC, Change, ChangeBus
+from .expiry import ExpiryScheduler
+from .export import format_timestamp
+
+# Result of one check_expired_bookings call. expired holds the
+# (booking_id, slot_id) pairs that were released.
+ExpirySweep = namedtuple('ExpirySweep', ['expired', 'batches', 'checked_at'])
+
+# Results of book_slots_bulk and release_bookings_bulk: one BulkItem per
+# requested slot or booking, plus the overall outcome and the amount charged
+BulkItem = namedtuple('BulkItem', ['slot_id', 'booking_id', 'success', 'message'])
+BulkResult = namedtuple('BulkResult', ['success', 'message', 'items', 'amount'])
+ReservationResult = namedtuple('ReservationResult', ['success', 'message', 'reservation_id'])
+
+class _Rollback(Exception):
+    """Raised inside a transaction to roll it back and return result instead"""
+    def __init__(self, result):
+        super().__init__(result.message)
+        self.result = result
+
+# ParkingSystem calls timed when metrics are enabled
+PROFILED_OPERATIONS = (
+    'get_available_slots', 'get_slot_states', 'count_available_slots', 'book_slot',
+    'release_slot', 'book_slots_bulk', 'release_bookings_bulk', 'reserve_slot',
+    'cancel_reservation', 'check_in_reservation', 'find_free_slots', 'get_user_bookings',
+    'find_active_booking_by_vehicle', 'get_user_reservations', 'check_expired_bookings', 'get_all_bookings',
+    'get_export_batch', 'count_export_rows', 'get_changes_since',
+    'get_bookings_changed_since', 'get_dashboard_stats', 'archive_bookings',
+)
+
+class ParkingSystem:
+    def __init__(self, db_path=None, expiry_checker=True, payment_gateway=None, payment_workers=None,
+                 metrics=None):
+        self.db_path = db_path or CONFIG['database']
+        # Opening never creates or migrates the database; see open_parking_system
+        if not os.path.exists(self.db_path):
+            raise RuntimeError(f"No database at {self.db_path}; run initialize_database() first")
+        # Profiling costs nothing until CONFIG['metrics'] enables it
+        self.metrics = metrics or Metrics()
+        self.pool = ConnectionPool(self.db_path, metrics=self.metrics)
+        with self.pool.reader() as conn:
+            version = get_schema_version(conn)
+        if version != SCHEMA_VERSION:
+            self.pool.close()
+            raise RuntimeError(f"{self.db_path} is at schema version {version}, not {SCHEMA_VERSION}; "
+                               "run initialize_database() first")
+        self.metrics.instrument(self, 'operation', PROFILED_OPERATIONS)
+        self.slot_index = SlotIndex()
+        self.rebuild_slot_index()
+        self.reservations = ReservationIndex()
+        self.rebuild_reservation_index()
+        # Active bookings by user and by plate, dropped as commits change them
+        self.booking_cache = BookingCache()
+        self.metrics.add_collector('booking_cache', self.booking_cache.stats)
+        # Committed changes are read back from change_log and published
+        self.change_bus = ChangeBus()
+        self.published_seq = self.get_change_log_seq()
+        self.pool.add_commit_hook(self._publish_changes)
+        # Payments are settled in the background; payment_workers=0 leaves
+        # the outbox to another process
+        self.payment_outbox = None
+        if payment_workers != 0:
+            self.payment_outbox = PaymentOutbox(self, payment_gateway, payment_workers)
+            self.payment_outbox.start()
+            self.metrics.add_collector('payments', self.payment_outbox.metrics)
+        self.expiry_scheduler = None
+        if expiry_checker:
+            # Release slots as their bookings end
+            self.expiry_scheduler = ExpiryScheduler(self)
+            self.expiry_scheduler.start()
+            self.metrics.add_collector('expiry', self.expiry_scheduler.stats)
+    
+    def execute_query(self, query, params=(), fetch=False):
+        """Run one statement; with fetch, return its rows. Errors are counted and raised."""
+        result = None
+        try:
+            # Plain reads go to a reader connection, everything else is
+            # serialized through the writer
+            if fetch and query.lstrip().upper().startswith(("SELECT", "WITH")):
+                with self.pool.reader() as conn:
+                    result = conn.execute(query, params).fetchall()
+            else:
+                with self.pool.transaction() as cursor:
+                    cursor.execute(query, params)
+                    if fetch:
+                        result = cursor.fetchall()
+        except Exception:
+            self.metrics.record_error('execute_query')
+            raise
+        return result
+    
+    def fetch(self, name, params=()):
+        """Rows of the named query in NAMED_QUERIES, as its record type"""
+        query, record = NAMED_QUERIES[name]
+        rows = self.execute_query(query, params, fetch=True)
+        return rows if record is None else list(map(record._make, rows))
+    
+    def rebuild_slot_index(self):
+        self.slot_index.load(self.execute_query(
+            "SELECT slot_id, status, vehicle_type, is_active FROM slots", fetch=True
+        ))
+    
+    def check_slot_index(self):
+        """Compare the slot index with the slots table.
+
+        Returns (slot_id, index state, table state) for every slot where they
+        differ; states are (vehicle_type, available, is_active) or None.
+        """
+        table = {
+            slot_id: (vehicle_type, status == 'available', bool(is_active))
+            for slot_id, status, vehicle_type, is_active in self.execute_query(
+                "SELECT slot_id, status, vehicle_type, is_active FROM slots", fetch=True
+            )
+        }
+        index = self.slot_index.snapshot()
+        mismatches = []
+        for slot_id in sorted(set(table) | set(index)):
+            if table.get(slot_id) != index.get(slot_id):
+                mismatches.append((slot_id, index.get(slot_id), table.get(slot_id)))
+        
+        free = [row[0] for row in self.fetch('available_slots')]
+        if not mismatches and free != self.slot_index.available_slots():
+            mismatches.append((None, self.slot_index.available_slots(), free))
+        return mismatches
+    
+    def rebuild_reservation_index(self):
+        self.reservations.load(self.execute_query(
+            UPCOMING_RESERVATIONS_QUERY, (datetime.now().isoformat(),), fetch=True
+        ))
+    
+    def check_reservation_index(self):
+        """Compare the reservation index with the reservations table.
+
+        Returns (reservation_id, index window, table window) for every
+        reservation that has not ended where they differ; windows are
+        (slot_id, start, end) in tariff minutes, or None.
+        """
+        now = datetime.now()
+        table = {
+            reservation_id: (slot_id, tariff_minutes(start), tariff_minutes(end))
+            for reservation_id, slot_id, start, end in self.execute_query(
+                UPCOMING_RESERVATIONS_QUERY, (now.isoformat(),), fetch=True
+            )
+        }
+        index = self.reservations.snapshot(now)
+        return [
+            (reservation_id, index.get(reservation_id), table.get(reservation_id))
+            for reservation_id in sorted(set(table) | set(index))
+            if table.get(reservation_id) != index.get(reservation_id)
+        ]
+    
+    def _lookahead(self):
+        # Slots reserved within this window are not offered as free now
+        now = datetime.now()
+        return now, now + timedelta(minutes=CONFIG['reservations']['lookahead_minutes'])
+    
+    def _first_free(self, n, vehicle_type, start_time, end_time):
+        """Lowest n slot_ids free now and not reserved during [start_time, end_time)"""
+        if not self.reservations.count:
+            return self.slot_index.first_free(n, vehicle_type)
+        free = self.reservations.free_slots(
+            self.slot_index.available_slots(vehicle_type), start_time, end_time
+        )
+        return free if n is None else free[:n]
+    
+    def _free_run(self, n, vehicle_type, start_time, end_time):
+        """Like _first_free, but n consecutive slot_ids or []"""
+        if not self.reservations.count:
+            return self.slot_index.free_run(n, vehicle_type)
+        run = []
+        for slot_id in self._first_free(None, vehicle_type, start_time, end_time):
+            if not run or run[-1] != slot_id - 1:
+                run = []
+            run.append(slot_id)
+            if len(run) == n:
+                return run
+        return []
+    
+    def get_available_slots(self, vehicle_type=None):
+        return self._first_free(None, vehicle_type, *self._lookahead())
+    
+    def get_slot_states(self):
+        states = self.slot_index.slot_states()
+        if self.reservations.count:
+            free = set(self.reservations.free_slots(
+                [slot_id for slot_id, available in states if available], *self._lookahead()
+            ))
+            states = [(slot_id, slot_id in free) for slot_id, _ in states]
+        return states
+    
+    def get_slots(self):
+        """A Slot record for every slot"""
+        return self.fetch('slots')
+    
+    def count_available_slots(self, vehicle_type=None):
+        if self.reservations.count:
+            return len(self.get_available_slots(vehicle_type))
+        return self.slot_index.count_free(vehicle_type)
+    
+    def first_available_slots(self, n, vehicle_type=None):
+        return self._first_free(n, vehicle_type, *self._lookahead())
+    
+    def next_available_slot(self, vehicle_type=None):
+        if self.reservations.count:
+            slots = self.first_available_slots(1, vehicle_type)
+            return slots[0] if slots else None
+        return self.slot_index.next_free(vehicle_type)
+    
+    def set_slot_active(self, slot_id, is_active):
+        slot_id = int(slot_id)
+        with self.pool.transaction() as cursor:
+            cursor.execute(
+                "UPDATE slots SET is_active = ? WHERE slot_id = ?",
+                (1 if is_active else 0, slot_id)
+            )
+            self.pool.after_commit(
+                lambda: self.slot_index.update(slot_id, is_active=bool(is_active))
+            )
+    
+    def add_slot(self, vehicle_type='regular'):
+        with self.pool.transaction() as cursor:
+            slot_id = cursor.execute(
+                "INSERT INTO slots (slot_id, vehicle_type) "
+                "SELECT COALESCE(MAX(slot_id), 0) + 1, ? FROM slots RETURNING slot_id",
+                (vehicle_type,)
+            ).fetchone()[0]
+            self.pool.after_commit(
+                lambda: self.slot_index.update(slot_id, vehicle_type, True, True)
+            )
+        return slot_id
+    
+    def book_slot(self, slot_id, user_id, vehicle_number, duration_minutes=60):
+        start_time = datetime.now()
+        end_time = start_time + timedelta(minutes=duration_minutes)
+        
+        with self.pool.transaction() as cursor:
+            booking_id, error = self._insert_booking(
+                cursor, slot_id, user_id, vehicle_number, start_time, end_time
+            )
+            if error:
+                return False, error
+        
+        if self.expiry_scheduler:
+            self.expiry_scheduler.schedule(booking_id, end_time)
+        
+        return True, f"Slot {slot_id} booked successfully until {end_time.strftime('%Y-%m-%d %H:%M:%S')}"
+    
+    def _insert_booking(self, cursor, slot_id, user_id, vehicle_number, start_time, end_time):
+        """Claim slot_id and record its booking inside the caller's transaction.
+
+        Returns (booking_id, None), or (None, reason) having changed nothing.
+        """
+        start, end = start_time.isoformat(), end_time.isoformat()
+        reserved = cursor.execute(RESERVATION_CONFLICT_QUERY, (slot_id, end)).fetchone()
+        if reserved and reserved[2] > start:
+            return None, f"Slot {slot_id} is reserved from {format_timestamp(reserved[1])}"
+        
+        # The conditional UPDATE doubles as the availability check, so two
+        # kiosks racing for the same slot cannot both win it
+        cursor.execute(
+            "UPDATE slots SET status = 'booked' WHERE slot_id = ? AND status = 'available'",
+            (slot_id,)
+        )
+        if cursor.rowcount != 1:
+            return None, "Slot is not available"
+        
+        vehicle_type = self.slot_index.vehicle_type(slot_id)
+        amount = PaymentService.calculate_charge(start_time, end_time, vehicle_type)
+        cursor.execute('''
+        INSERT INTO bookings (
+            slot_id, user_id, vehicle_number, 
+            start_time, end_time, amount_paid, payment_status, vehicle_type
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING booking_id
+        ''', (slot_id, user_id, vehicle_number, start, end, amount,
+              'pending' if amount > 0 else 'paid', vehicle_type))
+        booking_id = cursor.fetchone()[0]
+        
+        self._queue_payment(cursor, [booking_id], amount)
+        self.pool.after_commit(lambda: self.slot_index.mark_booked(slot_id))
+        self.pool.after_commit(lambda: self.booking_cache.invalidate_owners([user_id], [vehicle_number]))
+        return booking_id, None
+    
+    @staticmethod
+    def _window(start_time, end_time):
+        # Stored times are naive local time; times with an offset are
+        # converted so they compare with now() and the stored windows
+        window = []
+        for value in (start_time, end_time):
+            if isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            if value.tzinfo is not None:
+                value = value.astimezone().replace(tzinfo=None)
+            window.append(value)
+        return tuple(window)
+    
+    def reserve_slot(self, slot_id, user_id, vehicle_number, start_time, end_time):
+        """Reserve slot_id for [start_time, end_time) ahead of time.
+
+        The window must not overlap another reservation of the slot or run
+        into its current booking. Times are datetimes or ISO strings, in
+        local time unless they carry an offset.
+        Returns a ReservationResult.
+        """
+        try:
+            start_time, end_time = self._window(start_time, end_time)
+        except (TypeError, ValueError):
+            return ReservationResult(False, "Invalid reservation window", None)
+        now = datetime.now()
+        if end_time <= start_time:
+            return ReservationResult(False, "Reservation must end after it starts", None)
+        if start_time < now:
+            return ReservationResult(False, "Reservation cannot start in the past", None)
+        if start_time > now + timedelta(days=CONFIG['reservations']['max_days_ahead']):
+            return ReservationResult(False, "Reservation starts too far ahead", None)
+        
+        slot_id = int(slot_id)
+        # Cheap refusal from memory; the table is checked again below
+        if self.reservations.conflict(slot_id, start_time, end_time) is not None:
+            return ReservationResult(False, f"Slot {slot_id} is already reserved then", None)
+        
+        start, end = start_time.isoformat(), end_time.isoformat()
+        with self.pool.transaction() as cursor:
+            slot = cursor.execute(
+                "SELECT is_active FROM slots WHERE slot_id = ?", (slot_id,)
+            ).fetchone()
+            if not slot or not slot[0]:
+                return ReservationResult(False, "Slot is not available", None)
+            reserved = cursor.execute(RESERVATION_CONFLICT_QUERY, (slot_id, end)).fetchone()
+            if reserved and reserved[2] > start:
+                return ReservationResult(False, f"Slot {slot_id} is already reserved then", None)
+            booked = cursor.execute(BOOKING_CONFLICT_QUERY, (slot_id, start)).fetchone()
+            if booked:
+                return ReservationResult(
+                    False, f"Slot {slot_id} is booked until {format_timestamp(booked[1])}", None
+                )
+            
+            reservation_id = cursor.execute('''
+            INSERT INTO reservations (slot_id, user_id, vehicle_number, start_time, end_time)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING reservation_id
+            ''', (slot_id, user_id, vehicle_number, start, end)).fetchone()[0]
+            self.pool.after_commit(lambda: self.reservations.add(
+                reservation_id, slot_id, start_time, end_time, now
+            ))
+        
+        return ReservationResult(
+            True,
+            f"Slot {slot_id} reserved from {format_timestamp(start)} to {format_timestamp(end)}",
+            reservation_id
+        )
+    
+    def cancel_reservation(self, reservation_id):
+        reservation_id = int(reservation_id)
+        with self.pool.transaction() as cursor:
+            row = cursor.execute('''
+            UPDATE reservations SET status = 'cancelled'
+            WHERE reservation_id = ? AND status = 'reserved'
+            RETURNING slot_id
+            ''', (reservation_id,)).fetchone()
+            if not row:
+                return False, "Reservation not found or no longer active"
+            slot_id = row[0]
+            self.pool.after_commit(lambda: self.reservations.remove(reservation_id, slot_id))
+        return True, f"Reservation {reservation_id} for slot {slot_id} cancelled"
+    
+    def check_in_reservation(self, reservation_id):
+        """Turn a reservation into a booking from now until the reservation ends"""
+        reservation_id = int(reservation_id)
+        now = datetime.now()
+        try:
+            with self.pool.transaction() as cursor:
+                row = cursor.execute('''
+                UPDATE reservations SET status = 'checked_in'
+                WHERE reservation_id = ? AND status = 'reserved'
+                RETURNING slot_id, user_id, vehicle_number, start_time, end_time
+                ''', (reservation_id,)).fetchone()
+                if not row:
+                    return False, "Reservation not found or no longer active"
+                slot_id, user_id, vehicle_number, start, end = row
+                start_time, end_time = self._window(start, end)
+                opens = start_time - timedelta(minutes=CONFIG['reservations']['check_in_early_minutes'])
+                if now < opens:
+                    raise _Rollback(ReservationResult(
+                        False, f"Check-in opens at {opens.strftime('%Y-%m-%d %H:%M')}", reservation_id
+                    ))
+                if now >= end_time:
+                    raise _Rollback(ReservationResult(False, "Reservation has ended", reservation_id))
+                
+                # The reservation no longer counts as reserved, so it does not
+                # block its own booking
+                booking_id, error = self._insert_booking(
+                    cursor, slot_id, user_id, vehicle_number, now, end_time
+                )
+                if error:
+                    raise _Rollback(ReservationResult(False, error, reservation_id))
+                cursor.execute(
+                    "UPDATE reservations SET booking_id = ? WHERE reservation_id = ?",
+                    (booking_id, reservation_id)
+                )
+                self.pool.after_commit(lambda: self.reservations.remove(reservation_id, slot_id))
+        except _Rollback as rollback:
+            return False, rollback.result.message
+        
+        if self.expiry_scheduler:
+            self.expiry_scheduler.schedule(booking_id, end_time)
+        
+        return True, f"Slot {slot_id} booked successfully until {end_time.strftime('%Y-%m-%d %H:%M:%S')}"
+    
+    def get_user_reservations(self, user_id):
+        return self.fetch('user_reservations', (user_id, datetime.now().isoformat()))
+    
+    def find_free_slots(self, start_time, end_time, vehicle_type=None):
+        """Active slots (of vehicle_type) free for all of [start_time, end_time).
+
+        A slot is free when no reservation overlaps the window and no active
+        booking runs past its start; the booking check is one indexed query,
+        the reservation check one bisect per slot.
+        """
+        start_time, end_time = self._window(start_time, end_time)
+        booked = {
+            row[0] for row in self.execute_query(
+                BOOKED_UNTIL_QUERY, (start_time.isoformat(),), fetch=True
+            )
+        }
+        return self.reservations.free_slots(
+            [slot_id for slot_id in self.slot_index.active_slots(vehicle_type) if slot_id not in booked],
+            start_time, end_time
+        )
+    
+    def _queue_payment(self, cursor, booking_ids, amount):
+        # Inside the booking transaction: the charge is recorded atomically
+        # with the bookings and settled by the payment workers afterwards
+        if amount <= 0 or not booking_ids:
+            return
+        cursor.execute(INSERT_PAYMENT_QUERY, (
+            os.urandom(16).hex(), json.dumps(booking_ids), amount, time.time()
+        ))
+        if self.payment_outbox:
+            self.pool.after_commit(self.payment_outbox.notify)
+    
+    def payment_metrics(self):
+        return self.payment_outbox.metrics() if self.payment_outbox else None
+    
+    def get_user_bookings(self, user_id):
+        return self.booking_cache.get('user', user_id, lambda: self.fetch('user_bookings', (user_id,)))
+    
+    def get_vehicle_bookings(self, vehicle_number):
+        """Active bookings of one number plate, ending soonest first"""
+        return self.booking_cache.get(
+            'vehicle', vehicle_number, lambda: self.fetch('vehicle_bookings', (vehicle_number,))
+        )
+    
+    def find_active_booking_by_vehicle(self, vehicle_number):
+        """The plate's active booking, or None: what a gate camera asks for.
+
+        A bulk booking can give one plate several; the one ending first is returned.
+        """
+        bookings = self.get_vehicle_bookings(vehicle_number)
+        return bookings[0] if bookings else None
+    
+    def release_slot(self, booking_id):
+        with self.pool.transaction() as cursor:
+            cursor.execute('''
+            UPDATE bookings SET status = 'completed' 
+            WHERE booking_id = ? AND status = 'active'
+            RETURNING slot_id
+            ''', (booking_id,))
+            result = cursor.fetchone()
+            
+            if not result:
+                return False, "Booking not found or already released"
+            
+            slot_id = result[0]
+            cursor.execute('''
+            UPDATE slots SET status = 'available' 
+            WHERE slot_id = ?
+            ''', (slot_id,))
+            self.pool.after_commit(lambda: self.slot_index.mark_available([slot_id]))
+            self.pool.after_commit(lambda: self.booking_cache.invalidate_bookings([booking_id]))
+        
+        if self.expiry_scheduler:
+            self.expiry_scheduler.cancel(int(booking_id))
+        
+        return True, f"Slot {slot_id} released successfully"
+    
+    def book_slots_bulk(self, user_id, vehicle_numbers, count=None, slot_ids=None,
+                        vehicle_type=None, contiguous=False, duration_minutes=60,
+                        all_or_nothing=True):
+        """Book many slots for one user in a single transaction with one payment.
+
+        Either name the slots (slot_ids) or ask for count free ones, optionally
+        of vehicle_type and as one run of consecutive slot_ids. vehicle_numbers
+        is one plate for every booking or a list with one per booking. In
+        all-or-nothing mode a single unavailable slot books nothing; otherwise
+        whatever could be claimed is booked. Returns a BulkResult; raises
+        ValueError for arguments of the wrong type.
+        """
+        if isinstance(vehicle_numbers, str):
+            vehicle_numbers = [vehicle_numbers]
+        elif not isinstance(vehicle_numbers, (list, tuple)):
+            raise ValueError("vehicle_numbers must be a plate or a list of plates")
+        if count is not None and (isinstance(count, bool) or not isinstance(count, int)):
+            raise ValueError("count must be a whole number")
+        if slot_ids is not None and not isinstance(slot_ids, (list, tuple)):
+            raise ValueError("slot_ids must be a list of slot ids")
+        if count is None and slot_ids is None:
+            count = len(vehicle_numbers)
+        if slot_ids is not None:
+            if count is not None or contiguous:
+                return BulkResult(False, "Give either slot_ids or count, not both", [], 0)
+            requested = [int(slot_id) for slot_id in slot_ids]
+        elif not count or count < 0:
+            return BulkResult(False, "Nothing to book", [], 0)
+        if len(vehicle_numbers) not in (1, len(slot_ids) if slot_ids is not None else count):
+            return BulkResult(False, "Need one vehicle number, or one per booking", [], 0)
+        
+        start_time = datetime.now()
+        end_time = start_time + timedelta(minutes=duration_minutes)
+        charges = {}  # vehicle_type -> charge per booking
+        
+        try:
+            with self.pool.transaction() as cursor:
+                # The index matches the table while the writer is held, so
+                # slots picked here are normally claimable
+                if slot_ids is None:
+                    if contiguous:
+                        requested = self._free_run(count, vehicle_type, start_time, end_time)
+                        if not requested:
+                            return BulkResult(False, f"No run of {count} free slots", [], 0)
+                    else:
+                        requested = self._first_free(count, vehicle_type, start_time, end_time)
+                    if len(requested) < count and all_or_nothing:
+                        return BulkResult(
+                            False, f"Only {len(requested)} of {count} slots are free", [], 0
+                        )
+                if len(set(requested)) != len(requested):
+                    return BulkResult(False, "Duplicate slot_ids in request", [], 0)
+                
+                claimed = {
+                    row[0] for row in cursor.execute(
+                        CLAIM_SLOTS_QUERY, (
+                            json.dumps(requested), vehicle_type,
+                            end_time.isoformat(), start_time.isoformat()
+                        )
+                    ).fetchall()
+                }
+                if all_or_nothing and len(claimed) != len(requested):
+                    items = [
+                        BulkItem(slot_id, None, False,
+                                 "Not booked" if slot_id in claimed else "Slot is not available")
+                        for slot_id in requested
+                    ]
+                    raise _Rollback(BulkResult(
+                        False, "Some slots are not available; nothing was booked", items, 0
+                    ))
+                
+                booked = [slot_id for slot_id in requested if slot_id in claimed]
+                for slot_id in booked:
+                    slot_type = self.slot_index.vehicle_type(slot_id)
+                    if slot_type not in charges:
+                        charges[slot_type] = PaymentService.calculate_charge(start_time, end_time, slot_type)
+                amount = round(sum(charges[self.slot_index.vehicle_type(slot_id)] for slot_id in booked), 2)
+                plates = vehicle_numbers * len(requested) if len(vehicle_numbers) == 1 else vehicle_numbers
+                plate_for = dict(zip(requested, plates))
+                start, end = start_time.isoformat(), end_time.isoformat()
+                payment_status = 'pending' if amount > 0 else 'paid'
+                
+                booking_ids = {}
+                for slot_id in booked:
+                    slot_type = self.slot_index.vehicle_type(slot_id)
+                    booking_ids[slot_id] = cursor.execute('''
+                    INSERT INTO bookings (
+                        slot_id, user_id, vehicle_number,
+                        start_time, end_time, amount_paid, payment_status, vehicle_type
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    RETURNING booking_id
+                    ''', (slot_id, user_id, plate_for[slot_id], start, end,
+                          charges[slot_type], payment_status, slot_type)).fetchone()[0]
+                # One charge for the whole request
+                self._queue_payment(cursor, list(booking_ids.values()), amount)
+                self.pool.after_commit(lambda: self.slot_index.mark_booked_many(booked))
+                self.pool.after_commit(
+                    lambda: self.booking_cache.invalidate_owners([user_id], set(plate_for.values()))
+                )
+        except _Rollback as rollback:
+            return rollback.result
+        
+        if self.expiry_scheduler and booking_ids:
+            self.expiry_scheduler.schedule_many(booking_ids.values(), end_time)
+        
+        until = end_time.strftime('%Y-%m-%d %H:%M:%S')
+        items = [
+            BulkItem(slot_id, booking_ids[slot_id], True, f"Booked until {until}")
+            if slot_id in booking_ids else
+            BulkItem(slot_id, None, False, "Slot is not available")
+            for slot_id in requested
+        ]
+        if slot_ids is None and len(requested) < count:
+            items.extend(BulkItem(None, None, False, "No free slot") for _ in range(count - len(requested)))
+        return BulkResult(
+            bool(booked), f"Booked {len(booked)} of {len(items)} slots until {until}", items, amount
+        )
+    
+    def release_bookings_bulk(self, booking_ids, all_or_nothing=False):
+        """Release many bookings in one transaction. Returns a BulkResult."""
+        if not isinstance(booking_ids, (list, tuple)):
+            raise ValueError("booking_ids must be a list of booking ids")
+        requested = [int(booking_id) for booking_id in booking_ids]
+        try:
+            with self.pool.transaction() as cursor:
+                released = dict(cursor.execute(
+                    RELEASE_BOOKINGS_QUERY, (json.dumps(requested),)
+                ).fetchall())
+                if all_or_nothing and len(released) != len(set(requested)):
+                    items = [
+                        BulkItem(None, booking_id, False,
+                                 "Not released" if booking_id in released
+                                 else "Booking not found or already released")
+                        for booking_id in requested
+                    ]
+                    raise _Rollback(BulkResult(
+                        False, "Some bookings cannot be released; nothing was released", items, 0
+                    ))
+                slot_ids = list(released.values())
+                cursor.execute(RELEASE_SLOTS_QUERY, (json.dumps(slot_ids),))
+                self.pool.after_commit(lambda: self.slot_index.mark_available(slot_ids))
+                self.pool.after_commit(lambda: self.booking_cache.invalidate_bookings(released))
+        except _Rollback as rollback:
+            return rollback.result
+        
+        if self.expiry_scheduler:
+            self.expiry_scheduler.cancel_many(released)
+        
+        items = [
+            BulkItem(released[booking_id], booking_id, True, "Released")
+            if booking_id in released else
+            BulkItem(None, booking_id, False, "Booking not found or already released")
+            for booking_id in requested
+        ]
+        return BulkResult(bool(released), f"Released {len(released)} of {len(items)} bookings", items, 0)
+    
+    def check_expired_bookings(self, now=None, batch_size=None):
+        """Expire every active booking that ended before now and free its slot.
+
+        Works through the backlog in batches of batch_size; each batch is one
+        transaction that marks the bookings expired and releases their slots.
+        """
+        now = (now or datetime.now()).isoformat()
+        batch_size = batch_size or CONFIG['expiry_batch_size']
+        expired = []
+        batches = 0
+        
+        while True:
+            with self.pool.transaction() as cursor:
+                batch = cursor.execute(EXPIRE_BATCH_QUERY, (now, batch_size)).fetchall()
+                if batch:
+                    slot_ids = [slot_id for _, slot_id in batch]
+                    cursor.execute(RELEASE_SLOTS_QUERY, (json.dumps(slot_ids),))
+                    self.pool.after_commit(
+                        lambda slot_ids=slot_ids: self.slot_index.mark_available(slot_ids)
+                    )
+                    self.pool.after_commit(
+                        lambda batch=batch: self.booking_cache.invalidate_bookings(
+                            booking_id for booking_id, _ in batch
+                        )
+                    )
+            if not batch:
+                break
+            batches += 1
+            expired.extend(batch)
+            if len(batch) < batch_size:
+                break
+        
+        return ExpirySweep(expired, batches, now)
+    
+    def get_all_bookings(self, filters=None, after=None, page_size=None):
+        """A BookingTable of the matching bookings, newest first.
+
+        after is the (ISO start_time, booking_id) of the last booking of the
+        previous page: (epoch_iso(booking.start), booking.booking_id).
+        """
+        query, params = build_all_bookings_query(filters, after, page_size)
+        with self.pool.snapshot() as conn:
+            months = archive_months(filters)
+            if not months or not archive_tables(conn, *months):
+                # Only the hot table can match: rows go from the cursor
+                # into the table without ever being held as a list
+                return BookingTable(conn.execute(query, params))
+            return BookingTable(self._with_archives(
+                conn, query, params, filters, after, page_size,
+                key=lambda row: (row[4], row[0]), newest_first=True,
+                month_of=lambda row: epoch_iso(row[4])[:7]
+            ))
+    
+    @staticmethod
+    def _with_archives(conn, query, params, filters, after, limit, key, newest_first, month_of):
+        """Run a bookings query on the hot table and merge in the archived months.
+
+        query reads FROM bookings b, ordered by key(row), which is
+        (start_time, booking_id), and returns at most limit rows; month_of(row)
+        is the 'YYYY-MM' of the row's start_time. Each archive table holds one
+        month of start_time, so once limit rows are in hand the months past
+        the last of them cannot change the result and are never read. Runs
+        inside one snapshot, so bookings archived meanwhile are seen exactly
+        once.
+        """
+        rows = conn.execute(query, params).fetchall()
+        months = archive_months(filters)
+        if not months:
+            return rows
+        for month, table in archive_tables(conn, *months, newest_first=newest_first):
+            # Months wholly on the far side of the keyset cursor
+            if after and (month > after[0][:7] if newest_first else month < after[0][:7]):
+                continue
+            if limit and len(rows) >= limit:
+                last = month_of(rows[-1])
+                if month < last if newest_first else month > last:
+                    break
+            rows.extend(conn.execute(query.replace("FROM bookings b", f"FROM {table} b"), params))
+            rows.sort(key=key, reverse=newest_first)
+            del rows[limit or len(rows):]
+        return rows
+    
+    def get_export_batch(self, columns=None, filters=None, after=None, batch_size=None):
+        """One batch of the bookings export and the key to pass for the next.
+
+        The key is None once there is nothing left. Errors are raised, so a
+        failed export is never mistaken for a short one.
+        """
+        batch_size = batch_size or CONFIG['export']['batch_size']
+        query, params = build_export_query(list(columns or EXPORT_COLUMNS), filters, after, batch_size)
+        with self.pool.snapshot() as conn:
+            rows = self._with_archives(
+                conn, query, params, filters, after, batch_size,
+                key=lambda row: (row[0], row[1]), newest_first=False,
+                month_of=lambda row: row[0][:7]
+            )
+        after = tuple(rows[-1][:2]) if len(rows) == batch_size else None
+        return [row[2:] for row in rows], after
+    
+    def count_export_rows(self, filters=None):
+        with self.pool.snapshot() as conn:
+            months = archive_months(filters)
+            archives = [table for _, table in archive_tables(conn, *months)] if months else []
+            query, params = build_export_count_query(filters, archives)
+            return conn.execute(query, params).fetchone()[0]
+    
+    def get_change_log_seq(self):
+        return self.execute_query("SELECT COALESCE(MAX(seq), 0) FROM change_log", fetch=True)[0][0]
+    
+    def get_changes_since(self, change_seq, limit=None):
+        """Changes logged after change_seq, oldest first, and the latest seq seen.
+
+        The list is None when the log has been trimmed past change_seq; reload
+        everything and carry on from the returned seq.
+        """
+        changes = self.fetch('change_log', (change_seq, limit or -1))
+        if changes and changes[0].seq > change_seq + 1:
+            oldest = self.execute_query("SELECT MIN(seq) FROM change_log", fetch=True)[0][0]
+            if oldest > change_seq + 1:
+                return None, self.get_change_log_seq()
+        if not changes:
+            return [], change_seq
+        return changes, changes[-1].seq
+    
+    def _publish_changes(self, conn):
+        # Commit hook: runs on the writer thread while it still holds the
+        # writer, so changes are published once each and in commit order
+        if not self.change_bus.has_subscribers():
+            # Nobody to tell; the position is found again when someone subscribes
+            self.published_seq = None
+            return
+        if self.published_seq is None:
+            # Subscribed since an unpublished commit, so what they missed is
+            # unknown: move to the end of the log and tell them to reload
+            self.published_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM change_log"
+            ).fetchone()[0]
+            self.change_bus.publish([Change(self.published_seq, CHANGE_RESYNC, None, None)])
+            return
+        rows = conn.execute(CHANGE_LOG_QUERY, (self.published_seq, -1)).fetchall()
+        if not rows:
+            return
+        changes = [Change(*row) for row in rows]
+        if rows[0][0] > self.published_seq + 1:
+            # Trimmed before it could be read; tell subscribers to reload
+            changes.insert(0, Change(self.published_seq, CHANGE_RESYNC, None, None))
+        self.published_seq = rows[-1][0]
+        self.change_bus.publish(changes)
+    
+    def get_booking_change_seq(self):
+        return self.execute_query(
+            "SELECT seq FROM booking_change_counter WHERE id = 1", fetch=True
+        )[0][0]
+    
+    def get_bookings_changed_since(self, change_seq, limit=None):
+        """Bookings inserted or updated after change_seq, oldest change first.
+
+        Returns (Booking records, latest change_seq seen). Pass the returned
+        sequence back in on the next call.
+        """
+        rows = self.execute_query(
+            CHANGED_BOOKINGS_QUERY, (change_seq, limit or -1), fetch=True
+        )
+        if rows:
+            change_seq = rows[-1][-1]
+        return [Booking._make(row[:-1]) for row in rows], change_seq
+    
+    def authenticate_admin(self, username, password):
+        return bool(self.execute_query(
+            "SELECT 1 FROM admin_users WHERE username = ? AND password = ?",
+            (username, password), fetch=True
+        ))
+    
+    def get_dashboard_stats(self, day=None):
+        """(total bookings, active bookings, revenue for day) from the rollups"""
+        day = day or datetime.now().strftime('%Y-%m-%d')
+        return self.fetch('dashboard_stats', (day,))[0]
+    
+    def get_revenue_rollup(self, kind):
+        """{bucket: (revenue, paid bookings)} for 'day', 'hour', 'slot' or 'vehicle_type'"""
+        rows = self.execute_query(
+            "SELECT bucket, revenue, paid_bookings FROM revenue_rollup "
+            "WHERE kind = ? AND paid_bookings != 0 ORDER BY bucket",
+            (kind,), fetch=True
+        )
+        return {bucket: (revenue, count) for bucket, revenue, count in rows}
+    
+    def reprice_bookings(self, filters=None, pricing=None):
+        """(booking_id, amount_paid, price under pricing) for the matching bookings.
+
+        pricing defaults to CONFIG['pricing']; nothing is written back.
+        """
+        tariff = Tariff(pricing) if pricing else PaymentService.tariff()
+        bookings = self.get_all_bookings(filters)
+        # Priced by the type each booking was made and charged as, not the
+        # slot's type today
+        # Tariff minutes straight from the epoch microseconds, no datetimes
+        offset = epoch_micros(TARIFF_EPOCH)
+        charges = tariff.price_batch(
+            [(start - offset) / MICROS_PER_MINUTE for start in bookings.column('start')],
+            [(end - offset) / MICROS_PER_MINUTE for end in bookings.column('end')],
+            bookings.column('vehicle_type')
+        )
+        return list(zip(bookings.column('booking_id'), bookings.column('amount_paid'), charges))
+    
+    def rebuild_stats(self):
+        with self.pool.transaction() as cursor:
+            rebuild_stats_tables(cursor)
+    
+    def archive_bookings(self, older_than_days=None, batch_size=None, max_batches=None, progress=None):
+        """Move finished bookings that ended over older_than_days ago into the
+        monthly archive tables; returns how many were moved.
+
+        Each batch is its own transaction, so bookings keep flowing between
+        batches and an interrupted run simply carries on where it stopped
+        next time. progress(moved so far) is called after every batch.
+        """
+        settings = CONFIG['archive']
+        days = settings['after_days'] if older_than_days is None else older_than_days
+        batch_size = batch_size or settings['batch_size']
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        moved = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with self.pool.transaction() as cursor:
+                rows = cursor.execute(ARCHIVE_CANDIDATES_QUERY, (cutoff, batch_size)).fetchall()
+                if not rows:
+                    break
+                months = {}
+                for booking_id, month in rows:
+                    months.setdefault(month, []).append(booking_id)
+                cursor.execute("UPDATE archive_control SET moving = 1 WHERE id = 1")
+                for month, booking_ids in months.items():
+                    table = create_archive_table(cursor, month)
+                    cursor.execute(f'''
+                    INSERT INTO {table} ({ARCHIVE_COLUMNS})
+                    SELECT {ARCHIVE_COLUMNS} FROM bookings
+                    WHERE booking_id IN (SELECT value FROM json_each(?))
+                    ''', (json.dumps(booking_ids),))
+                    cursor.execute(
+                        "UPDATE booking_archives SET archived_rows = archived_rows + ? WHERE month = ?",
+                        (len(booking_ids), month)
+                    )
+                cursor.execute(
+                    "DELETE FROM bookings WHERE booking_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps([booking_id for booking_id, _ in rows]),)
+                )
+                cursor.execute("UPDATE archive_control SET moving = 0 WHERE id = 1")
+            moved += len(rows)
+            batches += 1
+            if progress:
+                progress(moved)
+            if len(rows) < batch_size:
+                break
+        if moved:
+            # The moved rows went through the WAL twice; fold it back now
+            # rather than leave every reader to search a large log
+            with self.pool.writer_connection() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return moved
+    
+    def get_archive_summary(self):
+        """(month, table, archived rows) for every archive table, oldest first"""
+        return self.execute_query(
+            "SELECT month, table_name, archived_rows FROM booking_archives ORDER BY month", fetch=True
+        )
+    
+    def check_stats(self):
+        """Compare the rollups with aggregates over the raw bookings table.
+
+        Returns (what, rollup value, raw value) for every difference.
+        """
+        mismatches = []
+        total, active, _ = self.get_dashboard_stats()
+        with self.pool.snapshot() as conn:
+            bookings = all_bookings_source(conn)
+            raw_total = conn.execute(f"SELECT COUNT(*) FROM {bookings}").fetchone()[0]
+            raw_active = conn.execute(ACTIVE_BOOKINGS_QUERY).fetchone()[0]
+            raw_revenue = {
+                kind: conn.execute(f'''
+                SELECT {bucket.format(row='b')}, SUM(b.amount_paid), COUNT(*)
+                FROM {bookings} b WHERE b.payment_status = 'paid' GROUP BY 1
+                ''').fetchall()
+                for kind, bucket in REVENUE_ROLLUP_BUCKETS
+            }
+        if total != raw_total:
+            mismatches.append(("total_bookings", total, raw_total))
+        if active != raw_active:
+            mismatches.append(("active_bookings", active, raw_active))
+        
+        for kind, bucket in REVENUE_ROLLUP_BUCKETS:
+            raw = {
+                key: (round(revenue, 2), count)
+                for key, revenue, count in raw_revenue[kind]
+            }
+            rollup = {
+                key: (round(revenue, 2), count)
+                for key, (revenue, count) in self.get_revenue_rollup(kind).items()
+            }
+            for key in sorted(set(raw) | set(rollup)):
+                if raw.get(key) != rollup.get(key):
+                    mismatches.append((f"revenue[{kind}={key}]", rollup.get(key), raw.get(key)))
+        return mismatches
+    
+    def close(self):
+        # Stop the expiry scheduler; it wakes immediately
+        if self.expiry_scheduler:
+            self.expiry_scheduler.stop()
+        # Charges in progress are finished; the rest stay in the outbox
+        if self.payment_outbox:
+            self.payment_outbox.stop()
+        # Close the database connections
+        self.pool.close()
+        if self.metrics.enabled and CONFIG['metrics']['dump_path']:
+            self.metrics.dump(CONFIG['metrics']['dump_path'])
+
+def open_parking_system(db_path=None, **options):
+    """Bring db_path's schema up to date and open a ParkingSystem on it.
+
+    The explicit start-up step for a kiosk, server or worker; options are
+    passed to ParkingSystem. With CONFIG['journal']['enabled'] it opens a
+    JournaledParkingSystem instead.
+    """
+    initialize_database(db_path)
+    if CONFIG['journal']['enabled']:
+        from .journal import JournaledParkingSystem
+        return JournaledParkingSystem(db_path, **options)
+    return ParkingSystem(db_path, **options)
@@ -0,0 +1,33 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parking_engine.schema import initialize_database
+from parking_engine.system import ParkingSystem
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A freshly migrated database file"""
+    path = str(tmp_path / "parking.db")
+    initialize_database(path)
+    return path
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def parking_system(db_path):
+    """A ParkingSystem with no background expiry or payment threads"""
+    parking_system = ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+    yield parking_system
+    parking_system.close()
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+import random
+
+import pytest
+
+from parking_engine.queries import booking_matches
+from parking_engine.records import epoch_iso
+
+BASE = datetime(2030, 3, 1, 8, 0)
+
+
+@pytest.fixture
+def history(parking_system, conn):
+    rng = random.Random(99)
+    rows = []
+    for n in range(60):
+        # Whole hours, so several bookings share a start time
+        start = BASE + timedelta(hours=rng.randrange(0, 72))
+        rows.append((rng.randrange(1, 21), f"user{n}", f"PLATE{n}", start.isoformat(),
+                     (start + timedelta(hours=1)).isoformat(), rng.choice(['completed', 'expired']), 5.0))
+    conn.executemany('''
+    INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, status, amount_paid)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    return parking_system
+
+
+def pages(parking_system, filters, page_size):
+    after = None
+    while True:
+        page = parking_system.get_all_bookings(filters, after, page_size)
+        yield list(page)
+        if len(page) < page_size:
+            return
+        after = (epoch_iso(page[-1].start), page[-1].booking_id)
+
+
+@pytest.mark.parametrize("filters", [
+    None,
+    {'status': 'expired'},
+    {'date': '2030-03-02'},
+    {'status': 'completed', 'date': '2030-03-03'},
+])
+def test_keyset_pages_cover_every_booking_once(history, filters):
+    everything = list(history.get_all_bookings(filters))
+    assert len(everything) > 7
+    assert everything == sorted(everything, key=lambda booking: (booking.start, booking.booking_id), reverse=True)
+    paged = [booking for page in pages(history, filters, 7) for booking in page]
+    assert paged == everything
+    # The in-memory filter used for live updates agrees with the query
+    unfiltered = history.get_all_bookings()
+    assert [booking for booking in unfiltered if booking_matches(booking, filters)] == everything
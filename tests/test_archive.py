@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from parking_engine.export import iter_export_batches
+
+
+def add_bookings(conn, rows):
+    conn.executemany('''
+    INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, status,
+                          amount_paid, payment_status)
+    VALUES (?, ?, ?, ?, ?, ?, 5.0, 'paid')
+    ''', [
+        (slot_id, "user1", f"PLATE{n}", start.isoformat(), (start + timedelta(hours=1)).isoformat(), status)
+        for n, (slot_id, start, status) in enumerate(rows)
+    ])
+    conn.commit()
+
+
+def test_archived_bookings_stay_readable_and_counted(parking_system, conn):
+    recent = datetime.now() - timedelta(days=1)
+    add_bookings(conn, [(1, datetime(2020, 1, 5 + n), 'completed') for n in range(4)]
+                 + [(2, datetime(2020, 2, 3), 'expired'), (3, recent, 'completed')])
+    parking_system.rebuild_stats()
+    everything = list(parking_system.get_all_bookings())
+    exported = [row for batch in iter_export_batches(parking_system, batch_size=2) for row in batch]
+
+    moved = []
+    assert parking_system.archive_bookings(older_than_days=90, batch_size=3, progress=moved.append) == 5
+    assert moved == [3, 5]
+    assert conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0] == 1
+    assert [(month, rows) for month, _, rows in parking_system.get_archive_summary()] == [
+        ('2020-01', 4), ('2020-02', 1)
+    ]
+    # Reads merge the archives back in; the rollups are untouched
+    assert list(parking_system.get_all_bookings()) == everything
+    assert list(parking_system.get_all_bookings(after=None, page_size=2)) == everything[:2]
+    assert [booking.vehicle_number for booking in parking_system.get_all_bookings({'date': '2020-01-06'})] == [
+        "PLATE1"
+    ]
+    assert [row for batch in iter_export_batches(parking_system, batch_size=2) for row in batch] == exported
+    assert parking_system.count_export_rows({'date_from': '2020-01-01', 'date_to': '2020-01-31'}) == 4
+    assert parking_system.check_stats() == []
+    assert parking_system.archive_bookings(older_than_days=90) == 0
@@ -0,0 +1,56 @@
+from argparse import Namespace
+import json
+import shutil
+import sqlite3
+
+import benchmark
+
+
+def workload_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+    SELECT slot_id, user_id, vehicle_number, status, amount_paid,
+           ROUND((julianday(end_time) - julianday(start_time)) * 1440)
+    FROM bookings ORDER BY booking_id
+    ''').fetchall()
+    conn.close()
+    return rows
+
+
+def test_seeded_workload_is_reproducible(db_path, tmp_path):
+    other = str(tmp_path / "other.db")
+    shutil.copy(db_path, other)
+    assert benchmark.seed_workload(db_path, 30, 2000, days=30) == 100
+    benchmark.seed_workload(other, 30, 2000, days=30)
+    rows = workload_rows(db_path)
+    assert rows == workload_rows(other)
+    assert len(rows) == 2000
+    assert all(10 <= minutes <= 24 * 60 for *_, minutes in rows)
+    # A few regulars park far more often than the rest
+    by_user = {}
+    for row in rows:
+        by_user[row[1]] = by_user.get(row[1], 0) + 1
+    assert max(by_user.values()) > 10 * (len(rows) / len(by_user))
+
+
+def results(throughput, p99_ms):
+    return {
+        "parameters": {"rate": 200}, "revision": None, "throughput": throughput,
+        "operations": {"book_slot": {"p50_ms": 1.0, "p95_ms": 2.0, "p99_ms": p99_ms}},
+    }
+
+
+def compare(tmp_path, baseline, candidate, threshold=10):
+    paths = []
+    for name, result in (("baseline.json", baseline), ("candidate.json", candidate)):
+        path = tmp_path / name
+        path.write_text(json.dumps(result))
+        paths.append(str(path))
+    return benchmark.bench_compare(Namespace(files=paths, threshold=threshold))
+
+
+def test_compare_flags_regressions_past_the_threshold(tmp_path, capsys):
+    assert compare(tmp_path, results(100, 5.0), results(95, 5.4)) == 0
+    assert compare(tmp_path, results(100, 5.0), results(100, 6.0)) == 1
+    assert compare(tmp_path, results(100, 5.0), results(80, 5.0)) == 1
+    assert "book_slot p99" in capsys.readouterr().out
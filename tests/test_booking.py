@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+import threading
+
+from parking_engine.system import ParkingSystem
+
+
+def race(callables):
+    """Run the callables on their own threads, released together; returns their results"""
+    barrier = threading.Barrier(len(callables))
+    results = [None] * len(callables)
+
+    def run(i, call):
+        barrier.wait()
+        results[i] = call()
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(callables)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def active_bookings(conn):
+    return conn.execute(
+        "SELECT slot_id, COUNT(*) FROM bookings WHERE status = 'active' GROUP BY slot_id"
+    ).fetchall()
+
+
+def test_concurrent_book_slot_books_a_slot_once(parking_system, conn):
+    results = race([
+        lambda n=n: parking_system.book_slot(1, f"user{n}", f"PLATE{n}")
+        for n in range(8)
+    ])
+    assert sum(success for success, _ in results) == 1
+    assert active_bookings(conn) == [(1, 1)]
+    assert conn.execute("SELECT status FROM slots WHERE slot_id = 1").fetchone() == ('booked',)
+
+
+def test_kiosks_on_one_database_book_each_slot_once(db_path, conn):
+    # Separate ParkingSystems share nothing but the database file
+    kiosks = [ParkingSystem(db_path, expiry_checker=False, payment_workers=0) for _ in range(3)]
+    try:
+        results = race([
+            lambda kiosk=kiosk, n=n, slot_id=slot_id: kiosk.book_slot(slot_id, f"user{n}", f"PLATE{n}")
+            for n, kiosk in enumerate(kiosks)
+            for slot_id in (1, 2, 3)
+        ])
+    finally:
+        for kiosk in kiosks:
+            kiosk.close()
+    assert sum(success for success, _ in results) == 3
+    assert active_bookings(conn) == [(1, 1), (2, 1), (3, 1)]
+
+
+def test_released_slot_can_be_booked_again(parking_system, conn):
+    assert parking_system.book_slot(1, "user1", "PLATE1")[0]
+    assert not parking_system.book_slot(1, "user2", "PLATE2")[0]
+    booking_id = conn.execute("SELECT booking_id FROM bookings WHERE slot_id = 1").fetchone()[0]
+    assert parking_system.release_slot(booking_id)[0]
+    assert parking_system.book_slot(1, "user2", "PLATE2")[0]
+    assert active_bookings(conn) == [(1, 1)]
+
+
+def test_reservation_times_with_an_offset_are_taken_as_local(parking_system):
+    start = (datetime.now(timezone.utc) + timedelta(days=1)).replace(microsecond=0)
+    end = start + timedelta(hours=2)
+    result = parking_system.reserve_slot(1, "user1", "PLATE1", start.isoformat(), end.isoformat())
+    assert result.success, result.message
+    local_start = start.astimezone().replace(tzinfo=None)
+    clash = parking_system.reserve_slot(
+        1, "user2", "PLATE2", local_start + timedelta(hours=1), local_start + timedelta(hours=3)
+    )
+    assert not clash.success
+    free = parking_system.find_free_slots(start, end)
+    assert 1 not in free
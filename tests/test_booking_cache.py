@@ -0,0 +1,102 @@
+import time
+
+from parking_engine.indexes import BookingCache
+from parking_engine.records import Booking
+
+
+def booking(booking_id, user_id="alice", vehicle_number="KA01"):
+    return Booking(booking_id, 1, user_id, vehicle_number, 0, 3_600_000_000, 'active', 5.0, 'paid')
+
+
+def test_second_lookup_is_a_hit():
+    cache = BookingCache(max_entries=4, ttl_s=60)
+    loads = []
+    
+    def load():
+        loads.append(1)
+        return [booking(1)]
+    
+    assert cache.get('user', "alice", load) == [booking(1)]
+    assert cache.get('user', "alice", load) == [booking(1)]
+    assert len(loads) == 1
+    stats = cache.stats()
+    assert stats["hits"]["user"] == 1 and stats["misses"]["user"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_invalidations_drop_only_the_entries_they_change():
+    cache = BookingCache(max_entries=8, ttl_s=60)
+    cache.get('user', "alice", lambda: [booking(1)])
+    cache.get('vehicle', "KA01", lambda: [booking(1)])
+    cache.get('user', "bob", lambda: [booking(2, "bob", "KA02")])
+    
+    cache.invalidate_bookings([1])
+    assert set(cache.entries) == {('user', "bob")}
+    assert 1 not in cache.holders
+    
+    cache.invalidate_owners(["bob"], ["KA09"])
+    assert not cache.entries and not cache.holders
+    assert cache.stats()["invalidations"] == 3
+
+
+def test_load_overlapping_an_invalidation_is_not_stored():
+    cache = BookingCache(max_entries=4, ttl_s=60)
+    
+    def load():
+        cache.invalidate_owners(["alice"])
+        return [booking(1)]
+    
+    assert cache.get('user', "alice", load) == [booking(1)]
+    assert not cache.entries
+
+
+def test_least_recent_entry_is_evicted():
+    cache = BookingCache(max_entries=2, ttl_s=60)
+    cache.get('user', "a", lambda: [booking(1, "a")])
+    cache.get('user', "b", lambda: [booking(2, "b")])
+    cache.get('user', "a", list)
+    cache.get('user', "c", lambda: [booking(3, "c")])
+    assert set(cache.entries) == {('user', "a"), ('user', "c")}
+    assert 2 not in cache.holders
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = BookingCache(max_entries=4, ttl_s=0.01)
+    cache.get('user', "alice", lambda: [booking(1)])
+    time.sleep(0.02)
+    assert cache.get('user', "alice", list) == []
+    assert cache.stats()["expirations"] == 1
+
+
+def test_zero_entries_turns_the_cache_off():
+    cache = BookingCache(max_entries=0, ttl_s=60)
+    loads = []
+    for _ in range(2):
+        cache.get('user', "alice", lambda: loads.append(1) or [])
+    assert len(loads) == 2 and not cache.entries
+
+
+def test_system_lookups_follow_book_and_release(parking_system):
+    assert parking_system.get_user_bookings("alice") == []
+    assert parking_system.find_active_booking_by_vehicle("KA01") is None
+    
+    assert parking_system.book_slot(3, "alice", "KA01")[0]
+    booked = parking_system.find_active_booking_by_vehicle("KA01")
+    assert booked is not None and booked.slot_id == 3
+    assert parking_system.get_user_bookings("alice") == [booked]
+    assert parking_system.get_user_bookings("alice") == [booked]
+    
+    assert parking_system.release_slot(booked.booking_id)[0]
+    assert parking_system.get_user_bookings("alice") == []
+    assert parking_system.find_active_booking_by_vehicle("KA01") is None
+    assert parking_system.booking_cache.stats()["hits"]["user"] >= 1
+
+
+def test_system_lookups_follow_bulk_booking(parking_system):
+    parking_system.get_user_bookings("alice")
+    parking_system.get_vehicle_bookings("KA01")
+    result = parking_system.book_slots_bulk("alice", "KA01", count=2)
+    assert result.success
+    assert len(parking_system.get_user_bookings("alice")) == 2
+    assert len(parking_system.get_vehicle_bookings("KA01")) == 2
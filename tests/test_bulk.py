@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+from parking_engine.server import ParkingServer
+
+
+async def post(server, path, body):
+    # The writer task serve() would run
+    server.mutations = asyncio.Queue()
+    writer = asyncio.create_task(server.write_mutations())
+    try:
+        return await server.dispatch("POST", path, json.dumps(body).encode())
+    finally:
+        writer.cancel()
+
+
+def active_slots(conn):
+    return {slot_id for slot_id, in conn.execute(
+        "SELECT slot_id FROM bookings WHERE status = 'active'"
+    )}
+
+
+def test_bulk_book_by_count_charges_once(parking_system, conn):
+    result = parking_system.book_slots_bulk("fleet", "PLATE1", count=3)
+    assert result.success
+    booking_ids = [item.booking_id for item in result.items]
+    assert len(set(booking_ids)) == 3
+    rows = conn.execute(
+        "SELECT booking_id, slot_id FROM bookings ORDER BY booking_id"
+    ).fetchall()
+    assert rows == [(item.booking_id, item.slot_id) for item in result.items]
+    assert conn.execute("SELECT COUNT(*) FROM payment_outbox").fetchone()[0] == 1
+
+
+def test_bulk_book_is_all_or_nothing(parking_system, conn):
+    assert parking_system.book_slot(2, "user2", "PLATE2")[0]
+    result = parking_system.book_slots_bulk("fleet", ["A", "B", "C"], slot_ids=[1, 2, 3])
+    assert not result.success
+    assert [item.message for item in result.items] == [
+        "Not booked", "Slot is not available", "Not booked"
+    ]
+    assert active_slots(conn) == {2}
+
+    result = parking_system.book_slots_bulk(
+        "fleet", ["A", "B", "C"], slot_ids=[1, 2, 3], all_or_nothing=False
+    )
+    assert result.success
+    assert [item.success for item in result.items] == [True, False, True]
+    assert active_slots(conn) == {1, 2, 3}
+
+
+def test_contiguous_run_skips_booked_slots(parking_system):
+    assert parking_system.book_slot(3, "user3", "PLATE3")[0]
+    result = parking_system.book_slots_bulk("fleet", "PLATE1", count=4, contiguous=True)
+    assert [item.slot_id for item in result.items] == [4, 5, 6, 7]
+
+
+def test_bulk_release(parking_system, conn):
+    booked = parking_system.book_slots_bulk("fleet", "PLATE1", count=3)
+    booking_ids = [item.booking_id for item in booked.items]
+    result = parking_system.release_bookings_bulk(booking_ids[:2] + [999])
+    assert [item.success for item in result.items] == [True, True, False]
+    assert active_slots(conn) == {booked.items[2].slot_id}
+    assert set(parking_system.get_available_slots()) >= {booked.items[0].slot_id, booked.items[1].slot_id}
+
+    result = parking_system.release_bookings_bulk([booking_ids[2], 999], all_or_nothing=True)
+    assert not result.success
+    assert active_slots(conn) == {booked.items[2].slot_id}
+
+
+@pytest.mark.parametrize("arguments", [
+    {"count": "3"},
+    {"count": True},
+    {"slot_ids": "1,2"},
+    {"slot_ids": 5},
+])
+def test_bulk_book_rejects_arguments_of_the_wrong_type(parking_system, arguments):
+    with pytest.raises(ValueError):
+        parking_system.book_slots_bulk("fleet", "PLATE1", **arguments)
+
+
+def test_server_answers_bad_bulk_requests_with_400(parking_system):
+    server = ParkingServer(parking_system, port=0)
+    try:
+        for path, body in [
+            ("/bookings/bulk", {"user_id": "fleet", "vehicle_numbers": "PLATE1", "count": "3"}),
+            ("/bookings/bulk", {"user_id": "fleet", "vehicle_numbers": "PLATE1", "slot_ids": "1"}),
+            ("/bookings/release", {"booking_ids": 1}),
+        ]:
+            status, _ = asyncio.run(post(server, path, body))
+            assert status == 400
+    finally:
+        server.readers.shutdown(wait=True)
+        server.writer.shutdown(wait=True)
@@ -0,0 +1,48 @@
+import sqlite3
+
+from parking_engine.changes import CHANGE_RESYNC
+from parking_engine.config import CONFIG
+from parking_engine.schema import initialize_database
+
+
+def log_slot_changes(db_path, count):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for _ in range(count):
+            conn.execute("UPDATE slots SET is_active = 1 - is_active WHERE slot_id = 1")
+    seqs = [seq for seq, in conn.execute("SELECT seq FROM change_log ORDER BY seq")]
+    conn.close()
+    return seqs
+
+
+def test_retention_comes_from_config_at_start(db_path, monkeypatch):
+    monkeypatch.setitem(CONFIG['change_feed'], 'retention', 5)
+    initialize_database(db_path)
+    seqs = log_slot_changes(db_path, 10)
+    assert len(seqs) == 5
+
+    # A smaller retention applies on the next start, without a migration
+    monkeypatch.setitem(CONFIG['change_feed'], 'retention', 2)
+    initialize_database(db_path)
+    seqs = log_slot_changes(db_path, 1)
+    assert len(seqs) == 2
+    assert seqs[-1] - seqs[0] == 1
+
+
+def test_commits_without_subscribers_skip_the_change_query(parking_system):
+    statements = []
+    parking_system.pool.writer.set_trace_callback(statements.append)
+    parking_system.set_slot_active(1, False)
+    parking_system.pool.writer.set_trace_callback(None)
+    assert not [sql for sql in statements if "FROM change_log" in sql]
+
+
+def test_late_subscribers_are_told_to_reload_then_follow_the_log(parking_system):
+    parking_system.set_slot_active(1, False)
+    published = []
+    parking_system.change_bus.subscribe(published.append)
+    parking_system.set_slot_active(1, True)
+    assert [change.entity for change in published[0]] == [CHANGE_RESYNC]
+    parking_system.set_slot_active(2, False)
+    assert [(change.entity, change.entity_id) for change in published[1]] == [('slot', 2)]
+    assert published[1][0].seq == parking_system.get_change_log_seq()
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+import time
+
+import pytest
+
+from parking_engine.expiry import ExpiryScheduler
+from parking_engine.system import ExpirySweep, ParkingSystem
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_sweep_expires_the_backlog_in_batches(parking_system, conn):
+    for slot_id in range(1, 6):
+        assert parking_system.book_slot(slot_id, f"user{slot_id}", f"PLATE{slot_id}")[0]
+    assert parking_system.book_slot(6, "user6", "PLATE6", duration_minutes=600)[0]
+    sweep = parking_system.check_expired_bookings(now=datetime.now() + timedelta(hours=2), batch_size=2)
+    assert sorted(slot_id for _, slot_id in sweep.expired) == [1, 2, 3, 4, 5]
+    assert sweep.batches == 3
+    assert conn.execute(
+        "SELECT slot_id FROM bookings WHERE status = 'active'"
+    ).fetchall() == [(6,)]
+    assert conn.execute(
+        "SELECT slot_id FROM slots WHERE status = 'booked'"
+    ).fetchall() == [(6,)]
+    assert all(parking_system.slot_index.is_free(slot_id) for slot_id in range(1, 6))
+    assert parking_system.check_expired_bookings(now=datetime.now() + timedelta(hours=2)).expired == []
+
+
+def test_scheduler_reports_releases_through_metrics_not_stdout(db_path, capsys):
+    parking_system = ParkingSystem(db_path, payment_workers=0)
+    try:
+        assert parking_system.book_slot(1, "user1", "PLATE1", duration_minutes=0)[0]
+        wait_for(lambda: parking_system.metrics.to_json()['gauges']['expiry_released'] == 1)
+        assert parking_system.metrics.to_json()['gauges']['expiry_scheduled'] == 0
+        assert 1 in parking_system.get_available_slots()
+    finally:
+        parking_system.close()
+    assert capsys.readouterr().out == ""
+
+
+class SweepCounter:
+    """Stands in for ParkingSystem: records when the scheduler sweeps"""
+    def __init__(self):
+        self.sweeps = []
+
+    def execute_query(self, query, params=(), fetch=False):
+        return []
+
+    def check_expired_bookings(self):
+        self.sweeps.append(time.monotonic())
+        return ExpirySweep([], 0, None)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = ExpiryScheduler(SweepCounter())
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+
+def test_idle_scheduler_does_not_sweep(scheduler):
+    scheduler.schedule(1, datetime.now() + timedelta(hours=1))
+    time.sleep(0.2)
+    assert scheduler.parking_system.sweeps == []
+
+
+def test_an_earlier_booking_wakes_the_scheduler(scheduler):
+    scheduler.schedule(1, datetime.now() + timedelta(hours=1))
+    scheduler.schedule(2, datetime.now() + timedelta(seconds=0.1))
+    wait_for(lambda: scheduler.parking_system.sweeps)
+    assert len(scheduler.parking_system.sweeps) == 1
+    assert scheduler.next_deadline() == pytest.approx((datetime.now() + timedelta(hours=1)).timestamp(), abs=5)
+
+
+def test_cancelled_bookings_are_not_swept(scheduler):
+    scheduler.schedule_many([1, 2], datetime.now() + timedelta(seconds=0.1))
+    scheduler.cancel_many([1, 2])
+    assert scheduler.next_deadline() is None
+    time.sleep(0.3)
+    assert scheduler.parking_system.sweeps == []
@@ -0,0 +1,83 @@
+import csv
+from datetime import datetime, timedelta
+import os
+import random
+
+import pytest
+
+from parking_engine.export import export_bookings, iter_export_batches
+
+BASE = datetime(2030, 3, 1, 8, 0)
+
+
+@pytest.fixture
+def history(parking_system, conn):
+    rng = random.Random(7)
+    rows = []
+    for n in range(50):
+        start = BASE + timedelta(hours=rng.randrange(0, 96))
+        rows.append((rng.randrange(1, 4), f"user{n % 3}", f"PLATE{n}", start.isoformat(),
+                     (start + timedelta(hours=1)).isoformat(), rng.choice(['completed', 'expired']), 5.0))
+    conn.executemany('''
+    INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, status, amount_paid)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    return parking_system
+
+
+def expected_rows(conn, where="1", params=()):
+    return [row for row in conn.execute(
+        f"SELECT booking_id, vehicle_number FROM bookings WHERE {where} ORDER BY start_time, booking_id",
+        params
+    )]
+
+
+@pytest.mark.parametrize("filters, where, params", [
+    (None, "1", ()),
+    ({'status': 'expired'}, "status = ?", ('expired',)),
+    ({'date_from': '2030-03-02', 'date_to': '2030-03-03'},
+     "start_time >= ? AND start_time < ?", ('2030-03-02', '2030-03-04')),
+    ({'slot_id': 2, 'user_id': 'user1'}, "slot_id = ? AND user_id = ?", (2, 'user1')),
+])
+def test_batches_stream_the_matching_bookings_oldest_first(history, conn, filters, where, params):
+    batches = list(iter_export_batches(history, ['booking_id', 'vehicle_number'], filters, batch_size=7))
+    assert all(len(batch) <= 7 for batch in batches)
+    rows = [row for batch in batches for row in batch]
+    assert rows == expected_rows(conn, where, params)
+    assert history.count_export_rows(filters) == len(rows)
+
+
+def test_unknown_filters_are_refused(history):
+    with pytest.raises(ValueError):
+        history.count_export_rows({'plate': 'PLATE1'})
+
+
+def test_csv_export_reports_progress(history, conn, tmp_path):
+    path = str(tmp_path / "bookings.csv")
+    progress = []
+    written = export_bookings(history, path, columns=['booking_id', 'vehicle_number'],
+                              batch_size=20, progress=lambda done, total: progress.append((done, total)))
+    assert written == 50
+    assert progress == [(20, 50), (40, 50), (50, 50), (50, 50)]
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['booking_id', 'vehicle_number']
+    assert [(int(booking_id), plate) for booking_id, plate in rows[1:]] == expected_rows(conn)
+
+
+def test_cancelled_export_leaves_no_file(history, tmp_path):
+    path = str(tmp_path / "bookings.csv")
+    assert export_bookings(history, path, batch_size=10, cancelled=lambda: True) is None
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + ".part")
+
+
+def test_parquet_export(history, conn, tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "bookings.parquet")
+    assert export_bookings(history, path, batch_size=15) == 50
+    table = parquet.read_table(path)
+    assert table.num_rows == 50
+    assert table.column('booking_id').to_pylist() == [booking_id for booking_id, _ in expected_rows(conn)]
+    assert table.schema.field('amount_paid').type == 'double'
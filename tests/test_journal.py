@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+from parking_engine.config import CONFIG
+from parking_engine.journal import BookingJournal, JournaledParkingSystem, read_segment
+
+
+@pytest.fixture
+def journaled(db_path, monkeypatch):
+    # Nothing reaches the tables unless a test checkpoints
+    monkeypatch.setitem(CONFIG['journal'], 'checkpoint_interval_ms', 3600000)
+
+    def open_system():
+        return JournaledParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+    return open_system
+
+
+def crash(parking_system):
+    """Stop without the checkpoint close() would write, leaving the segments"""
+    parking_system.checkpoint = lambda: 0
+    parking_system.stopping = True
+    parking_system.checkpoint_wakeup.set()
+    parking_system.checkpointer.join()
+    parking_system.journal.close()
+    parking_system.pool.close()
+
+
+def last_segment(parking_system):
+    return BookingJournal.segment_paths(parking_system.journal_path)[-1]
+
+
+def truncate_last_line(path):
+    with open(path, 'rb+') as f:
+        f.truncate(os.path.getsize(path) - 5)
+
+
+def corrupt_last_line(path):
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    # A flipped bit in the payload leaves the line whole but its CRC wrong
+    data[-3] ^= 0x01
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def table_state(conn):
+    bookings = conn.execute(
+        "SELECT booking_id, slot_id, status FROM bookings ORDER BY booking_id"
+    ).fetchall()
+    booked = [slot_id for slot_id, in conn.execute(
+        "SELECT slot_id FROM slots WHERE status = 'booked' ORDER BY slot_id"
+    )]
+    return bookings, booked
+
+
+@pytest.mark.parametrize("damage", [truncate_last_line, corrupt_last_line])
+def test_replay_stops_at_damaged_last_booking(journaled, conn, damage):
+    parking_system = journaled()
+    for slot_id in (1, 2, 3):
+        assert parking_system.book_slot(slot_id, f"user{slot_id}", f"PLATE{slot_id}")[0]
+    segment = last_segment(parking_system)
+    crash(parking_system)
+    assert len(read_segment(segment)) == 3
+    damage(segment)
+    assert len(read_segment(segment)) == 2
+
+    parking_system = journaled()
+    try:
+        assert table_state(conn) == ([(1, 1, 'active'), (2, 2, 'active')], [1, 2])
+        # Replayed segments are gone; the fresh one starts empty
+        assert [read_segment(path) for path in BookingJournal.segment_paths(parking_system.journal_path)] == [[]]
+        # The lost booking's slot and id are free again
+        assert parking_system.slot_index.is_free(3)
+        assert parking_system.book_slot(3, "user3", "PLATE3")[0]
+        parking_system.checkpoint()
+        assert table_state(conn)[0][-1] == (3, 3, 'active')
+    finally:
+        parking_system.close()
+
+
+@pytest.mark.parametrize("damage", [truncate_last_line, corrupt_last_line])
+def test_replay_stops_at_damaged_last_release(journaled, conn, damage):
+    parking_system = journaled()
+    for slot_id in (1, 2):
+        assert parking_system.book_slot(slot_id, f"user{slot_id}", f"PLATE{slot_id}")[0]
+    assert parking_system.release_slot(1)[0]
+    segment = last_segment(parking_system)
+    crash(parking_system)
+    damage(segment)
+
+    parking_system = journaled()
+    try:
+        assert table_state(conn) == ([(1, 1, 'active'), (2, 2, 'active')], [1, 2])
+        assert not parking_system.slot_index.is_free(1)
+        assert parking_system.release_slot(1)[0]
+    finally:
+        parking_system.close()
+
+
+def test_replay_applies_entries_once(journaled, conn):
+    parking_system = journaled()
+    assert parking_system.book_slot(1, "user1", "PLATE1")[0]
+    parking_system.checkpoint()
+    assert parking_system.book_slot(2, "user2", "PLATE2")[0]
+    crash(parking_system)
+
+    parking_system = journaled()
+    parking_system.close()
+    assert table_state(conn) == ([(1, 1, 'active'), (2, 2, 'active')], [1, 2])
+
+
+def test_failed_fsync_is_cut_off_the_journal(journaled, conn, monkeypatch):
+    parking_system = journaled()
+    assert parking_system.book_slot(1, "user1", "PLATE1")[0]
+    segment = last_segment(parking_system)
+    fsync = os.fsync
+    journal_fd = parking_system.journal.file.fileno()
+
+    def failing_fsync(fd):
+        if fd == journal_fd and not failing_fsync.failed:
+            failing_fsync.failed = True
+            raise OSError(5, "Input/output error")
+        fsync(fd)
+
+    failing_fsync.failed = False
+    monkeypatch.setattr(os, 'fsync', failing_fsync)
+    assert not parking_system.book_slot(2, "user2", "PLATE2")[0]
+    assert parking_system.journal.error
+    assert parking_system.slot_index.is_free(2)
+    # The failed booking was written but not made durable; it must not come back
+    assert len(read_segment(segment)) == 1
+    crash(parking_system)
+
+    parking_system = journaled()
+    parking_system.close()
+    assert table_state(conn) == ([(1, 1, 'active')], [1])
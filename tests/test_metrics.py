@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from parking_engine.config import CONFIG
+from parking_engine.metrics import Histogram, Metrics
+from parking_engine.system import ParkingSystem
+
+
+@pytest.fixture
+def profiled(db_path, monkeypatch):
+    monkeypatch.setitem(CONFIG['metrics'], 'enabled', True)
+    # Every statement counts as slow, so the log fills
+    monkeypatch.setitem(CONFIG['metrics'], 'slow_query_ms', 0)
+    parking_system = ParkingSystem(db_path, expiry_checker=False, payment_workers=0)
+    yield parking_system
+    parking_system.close()
+
+
+def test_disabled_metrics_leave_the_hot_paths_alone(parking_system):
+    assert 'book_slot' not in vars(parking_system)
+    assert type(parking_system.pool.writer) is sqlite3.Connection
+    parking_system.book_slot(1, "user1", "PLATE1")
+    assert parking_system.metrics.to_json()['histograms'] == {}
+
+
+def test_operations_queries_and_commits_are_timed(profiled):
+    assert profiled.book_slot(1, "user1", "PLATE1")[0]
+    assert not profiled.book_slot(1, "user2", "PLATE2")[0]
+    snapshot = profiled.metrics.to_json()
+    assert snapshot['histograms']['operation']['book_slot']['count'] == 2
+    assert snapshot['totals']['commits'] >= 1
+    assert snapshot['totals']['queries'] > 0
+    slow = snapshot['slow_queries'][-1]
+    assert slow['plan'] and slow['query']
+
+
+def test_raising_calls_count_as_errors(profiled):
+    with pytest.raises(ValueError):
+        profiled.book_slots_bulk("fleet", "PLATE1", count="3")
+    assert profiled.metrics.to_json()['counters']['errors'] == {'book_slots_bulk': 1}
+
+
+def test_prometheus_text(profiled):
+    profiled.book_slot(1, "user1", "PLATE1")
+    text = profiled.metrics.to_prometheus()
+    assert "# TYPE parking_operation_seconds histogram" in text
+    lines = text.splitlines()
+    infinite = next(line for line in lines
+                    if line.startswith('parking_operation_seconds_bucket{operation="book_slot",le="+Inf"}'))
+    count = next(line for line in lines
+                 if line.startswith('parking_operation_seconds_count{operation="book_slot"}'))
+    assert infinite.split()[-1] == count.split()[-1] == "1"
+    assert "parking_booking_cache_entries" in text
+
+
+def test_histogram_percentiles_and_label_escaping():
+    histogram = Histogram()
+    for seconds in [0.0002] * 99 + [3.0]:
+        histogram.observe(seconds)
+    assert histogram.percentile(50) == 0.00025
+    assert histogram.percentile(100) == 3.0
+    metrics = Metrics(enabled=True)
+    metrics.inc('errors', 'say "hi"\nthere')
+    assert 'parking_errors_total{operation="say \\"hi\\" there"} 1' in metrics.to_prometheus()
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from parking_engine.config import CONFIG
+from parking_engine.payments import PaymentOutbox
+
+
+class SlowGateway:
+    """Takes seconds per charge whatever the timeout"""
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.keys = []
+
+    def charge(self, idempotency_key, amount, timeout=None):
+        time.sleep(self.seconds)
+        self.keys.append(idempotency_key)
+
+
+def book(parking_system, count):
+    for slot_id in range(1, count + 1):
+        assert parking_system.book_slot(slot_id, f"user{slot_id}", f"PLATE{slot_id}")[0]
+
+
+def test_claim_fits_within_the_lease(parking_system, monkeypatch):
+    for name, value in [('batch_size', 10), ('timeout_s', 10), ('lease_s', 60)]:
+        monkeypatch.setitem(CONFIG['payments'], name, value)
+    book(parking_system, 8)
+    outbox = PaymentOutbox(parking_system, SlowGateway(0), workers=0)
+    assert len(outbox._claim()) == 5
+
+
+def test_timeout_must_be_shorter_than_the_lease(parking_system, monkeypatch):
+    monkeypatch.setitem(CONFIG['payments'], 'timeout_s', CONFIG['payments']['lease_s'])
+    with pytest.raises(ValueError):
+        PaymentOutbox(parking_system, workers=0)
+
+
+def test_rows_not_started_within_the_lease_are_handed_back(parking_system, conn, monkeypatch):
+    for name, value in [('batch_size', 3), ('timeout_s', 0.5), ('lease_s', 2)]:
+        monkeypatch.setitem(CONFIG['payments'], name, value)
+    book(parking_system, 3)
+    gateway = SlowGateway(0.9)
+    outbox = PaymentOutbox(parking_system, gateway, workers=0)
+    batch = outbox._claim()
+    assert len(batch) == 3
+    outbox._settle(batch)
+
+    # Two charges overran their timeout; the third could not finish in the lease
+    assert len(gateway.keys) == 2
+    rows = conn.execute(
+        "SELECT idempotency_key, status, attempts, next_attempt_at <= ? FROM payment_outbox ORDER BY outbox_id",
+        (time.time(),)
+    ).fetchall()
+    assert [row[1:] for row in rows] == [('paid', 1, 0), ('paid', 1, 0), ('pending', 0, 1)]
+    assert rows[2][0] not in gateway.keys
+
+
+def test_in_flight_drops_back_when_recording_fails(parking_system, monkeypatch):
+    book(parking_system, 2)
+    outbox = PaymentOutbox(parking_system, SlowGateway(0), workers=0)
+    batch = outbox._claim()
+
+    def transaction(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(parking_system.pool, 'transaction', transaction)
+    with pytest.raises(RuntimeError):
+        outbox._settle(batch)
+    monkeypatch.undo()
+    assert outbox.metrics()['in_flight'] == 0
+    assert outbox.metrics()['batches'] == 0
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from parking_engine.pool import ConnectionPool, _FairCheckout
+
+
+@pytest.fixture
+def pool(db_path):
+    pool = ConnectionPool(db_path, readers=2)
+    yield pool
+    pool.close()
+
+
+def slot_status(conn, slot_id):
+    return conn.execute("SELECT status FROM slots WHERE slot_id = ?", (slot_id,)).fetchone()[0]
+
+
+def test_readers_see_the_last_commit_while_a_write_is_open(pool):
+    assert pool.writer.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    with pool.transaction() as cursor:
+        cursor.execute("UPDATE slots SET status = 'booked' WHERE slot_id = 1")
+        # WAL: the reader is not blocked, and sees only committed data
+        with pool.reader() as conn:
+            assert slot_status(conn, 1) == 'available'
+    with pool.reader() as conn:
+        assert slot_status(conn, 1) == 'booked'
+
+
+def test_after_commit_callbacks_run_on_commit_only(pool):
+    ran = []
+    with pytest.raises(RuntimeError):
+        with pool.transaction() as cursor:
+            cursor.execute("UPDATE slots SET status = 'booked' WHERE slot_id = 1")
+            pool.after_commit(lambda: ran.append('rolled back'))
+            raise RuntimeError("abort")
+    with pool.transaction() as cursor:
+        cursor.execute("UPDATE slots SET status = 'booked' WHERE slot_id = 2")
+        pool.after_commit(lambda: ran.append('committed'))
+    assert ran == ['committed']
+    with pool.reader() as conn:
+        assert slot_status(conn, 1) == 'available'
+
+
+def test_durable_transaction_restores_synchronous(pool):
+    with pool.transaction(durable=True) as cursor:
+        assert cursor.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+    assert pool.writer.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_checkout_serves_waiters_in_arrival_order():
+    checkout = _FairCheckout(["conn"])
+    held = checkout.acquire()
+    served = []
+
+    def take_turn(n):
+        conn = checkout.acquire()
+        served.append(n)
+        checkout.release(conn)
+
+    threads = []
+    for n in range(3):
+        thread = threading.Thread(target=take_turn, args=(n,))
+        thread.start()
+        # Queued before the next one starts
+        while checkout.snapshot()['contended'] == n:
+            time.sleep(0.001)
+        threads.append(thread)
+    checkout.release(held)
+    for thread in threads:
+        thread.join()
+    assert served == [0, 1, 2]
+    assert checkout.snapshot()['contended'] == 3
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+
+from parking_engine.pricing import Tariff
+
+# A Wednesday
+DAY = datetime(2030, 1, 2)
+
+
+def tariff(bands, **options):
+    return Tariff({'hourly_rate': 6.0, 'tariff': dict(options, bands=bands)})
+
+
+def test_band_wrapping_midnight_covers_both_ends_of_the_day():
+    night = tariff([[22, 6, 0.5]])
+    assert night.price(DAY.replace(hour=23), DAY.replace(hour=23, minute=30)) == 1.5
+    assert night.price(DAY.replace(hour=2), DAY.replace(hour=3)) == 3.0
+    assert night.price(DAY.replace(hour=12), DAY.replace(hour=13)) == 6.0
+    # The same as the two halves written out
+    split = tariff([[22, 24, 0.5], [0, 6, 0.5]])
+    assert night.rates == split.rates
+
+
+def test_band_outside_the_day_is_refused():
+    with pytest.raises(ValueError):
+        tariff([[20, 30, 2.0]])
+
+
+def test_reprice_uses_the_type_a_booking_was_made_as(parking_system, conn):
+    pricing = {'hourly_rate': 6.0, 'tariff': {'vehicle_types': {'ev': 2.0}}}
+    assert parking_system.book_slot(1, "user1", "PLATE1")[0]
+    with conn:
+        conn.execute("UPDATE slots SET vehicle_type = 'ev' WHERE slot_id = 1")
+    parking_system.rebuild_slot_index()
+    [(booking_id, amount_paid, price)] = parking_system.reprice_bookings(pricing=pricing)
+    # Still a regular booking: one hour at the plain hourly rate
+    assert price == pytest.approx(6.0, abs=0.01)
+    assert parking_system.get_all_bookings()[0].vehicle_type == 'regular'
@@ -0,0 +1,17 @@
+from parking_engine.queries import find_full_scans
+
+
+def test_fresh_database_has_no_full_scans(conn):
+    assert find_full_scans(conn) == {}
+
+
+def test_missing_index_is_reported(conn):
+    conn.execute("DROP INDEX idx_bookings_user_active")
+    assert "get_user_bookings" in find_full_scans(conn)
+
+
+def test_search_on_one_filter_column_is_reported(conn):
+    # idx_bookings_status_start still serves the status half of the filter
+    conn.execute("DROP INDEX idx_bookings_status_date")
+    offenders = find_full_scans(conn)
+    assert "get_all_bookings[status+date, page]" in offenders
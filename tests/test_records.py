@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+import random
+import sqlite3
+
+from parking_engine.queries import epoch_sql
+from parking_engine.records import Booking, BookingTable, epoch_iso, epoch_micros
+
+
+def booking_rows(count):
+    rng = random.Random(5)
+    start = epoch_micros(datetime(2030, 1, 1))
+    return [
+        (n, rng.randrange(1, 50), f"user{rng.randrange(5)}", f"PLATE{n}", start + n * 1000,
+         start + n * 1000 + 3600000000, rng.choice(['active', 'completed']), 6.5,
+         rng.choice(['paid', 'pending']), 'regular')
+        for n in range(1, count + 1)
+    ]
+
+
+def test_sql_epoch_matches_python():
+    rng = random.Random(11)
+    conn = sqlite3.connect(":memory:")
+    for _ in range(500):
+        value = datetime(2000, 1, 1) + timedelta(microseconds=rng.randrange(60 * 365 * 86400 * 10 ** 6))
+        if rng.random() < 0.2:
+            value = value.replace(microsecond=0)
+        stored = value.isoformat()
+        assert conn.execute(f"SELECT {epoch_sql('?1')}", (stored,)).fetchone()[0] == epoch_micros(stored)
+        assert epoch_iso(epoch_micros(stored)) == stored
+
+
+def test_table_reads_back_the_rows_it_was_given():
+    rows = booking_rows(12000)  # More than one load batch
+    table = BookingTable(rows)
+    assert len(table) == len(rows)
+    assert list(table) == [Booking._make(row) for row in rows]
+    assert table[-1] == Booking._make(rows[-1])
+    assert table[10:13] == [Booking._make(row) for row in rows[10:13]]
+    assert table.column('slot_id').typecode == 'q'
+    # Equal strings are stored once
+    users = table.column('user_id')
+    assert len({id(user) for user in users}) == 5
+
+
+def test_a_null_turns_its_column_into_a_list():
+    rows = booking_rows(3)
+    rows[1] = rows[1][:5] + (None,) + rows[1][6:]
+    table = BookingTable(rows)
+    assert table.column('end') == [row[5] for row in rows]
+    assert table[1].end is None and table[1].end_time is None
+
+
+def test_rows_round_trip_over_http():
+    booking = Booking._make(booking_rows(1)[0])
+    assert Booking.from_row(booking.as_row()) == booking
+    assert booking.as_row()[4] == "2030-01-01T00:00:00.001000"
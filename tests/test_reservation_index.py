@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+import random
+
+from parking_engine.indexes import ReservationIndex
+
+BASE = datetime(2030, 1, 1)
+SLOTS = range(1, 6)
+SEED = 1234
+ROUNDS = 3000
+
+
+def window(rng):
+    start = BASE + timedelta(minutes=rng.randrange(0, 24 * 60, 15))
+    return start, start + timedelta(minutes=rng.randrange(15, 6 * 60, 15))
+
+
+def overlapping(windows, slot_id, start, end):
+    return {
+        reservation_id for reservation_id, (slot, w_start, w_end) in windows.items()
+        if slot == slot_id and w_start < end and start < w_end
+    }
+
+
+def test_matches_brute_force():
+    rng = random.Random(SEED)
+    index = ReservationIndex()
+    windows = {}
+    next_id = 1
+    for _ in range(ROUNDS):
+        slot_id = rng.choice(SLOTS)
+        start, end = window(rng)
+        conflicts = overlapping(windows, slot_id, start, end)
+        found = index.conflict(slot_id, start, end)
+        if conflicts:
+            assert found in conflicts
+        else:
+            assert found is None
+        assert index.free_slots(list(SLOTS), start, end) == [
+            slot for slot in SLOTS if not overlapping(windows, slot, start, end)
+        ]
+        if not conflicts and rng.random() < 0.6:
+            # The index, like reserve_slot, only ever holds disjoint windows per slot;
+            # now is before BASE so nothing is pruned
+            index.add(next_id, slot_id, start, end, now=BASE - timedelta(days=1))
+            windows[next_id] = (slot_id, start, end)
+            next_id += 1
+        elif windows and rng.random() < 0.3:
+            reservation_id = rng.choice(list(windows))
+            index.remove(reservation_id, windows.pop(reservation_id)[0])
+        assert index.count == len(windows)
+
+
+def test_touching_windows_do_not_conflict():
+    index = ReservationIndex()
+    start = BASE + timedelta(hours=9)
+    index.add(1, 1, start, start + timedelta(hours=1), now=BASE)
+    assert index.conflict(1, start + timedelta(hours=1), start + timedelta(hours=2)) is None
+    assert index.conflict(1, start - timedelta(hours=1), start) is None
+    assert index.conflict(1, start + timedelta(minutes=59), start + timedelta(hours=2)) == 1
+
+
+def test_ended_windows_are_pruned():
+    index = ReservationIndex()
+    index.add(1, 1, BASE, BASE + timedelta(hours=1), now=BASE)
+    index.add(2, 1, BASE + timedelta(hours=3), BASE + timedelta(hours=4), now=BASE + timedelta(hours=2))
+    assert index.count == 1
+    assert index.conflict(1, BASE, BASE + timedelta(hours=1)) is None
+    assert index.conflict(1, BASE + timedelta(hours=3), BASE + timedelta(hours=5)) == 2
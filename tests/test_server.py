@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from parking_engine.config import CONFIG
+from parking_engine.server import APIError, ParkingServer
+
+
+@pytest.fixture
+def server(parking_system):
+    server = ParkingServer(parking_system, port=0)
+    yield server
+    server.readers.shutdown(wait=True)
+    server.writer.shutdown(wait=True)
+
+
+def login(server, password):
+    return server.authenticate_admin({}, {'username': 'admin', 'password': password})
+
+
+def test_lockout_after_failed_logins(server, monkeypatch):
+    monkeypatch.setitem(CONFIG['server'], 'login_attempts', 3)
+    for _ in range(3):
+        assert login(server, 'wrong') == {"authenticated": False}
+    with pytest.raises(APIError) as locked:
+        login(server, 'admin123')
+    assert locked.value.status == 429
+
+
+def test_successful_login_forgets_failures(server, monkeypatch):
+    monkeypatch.setitem(CONFIG['server'], 'login_attempts', 3)
+    for _ in range(2):
+        login(server, 'wrong')
+    assert login(server, 'admin123')['authenticated']
+    for _ in range(2):
+        login(server, 'wrong')
+    assert login(server, 'admin123')['authenticated']
+
+
+def test_concurrent_guesses_cannot_pass_the_limit(server, monkeypatch):
+    monkeypatch.setitem(CONFIG['server'], 'login_attempts', 3)
+    checked = []
+
+    def slow_check(username, password):
+        checked.append(password)
+        time.sleep(0.05)
+        return False
+
+    monkeypatch.setattr(server.parking_system, 'authenticate_admin', slow_check)
+    barrier = threading.Barrier(8)
+
+    def guess(n):
+        barrier.wait()
+        try:
+            login(server, f"guess{n}")
+        except APIError:
+            pass
+
+    threads = [threading.Thread(target=guess, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(checked) == 3
+
+
+def test_admin_routes_need_an_unexpired_token(server, monkeypatch):
+    status, _ = asyncio.run(server.dispatch("GET", "/admin/change-seq", b""))
+    assert status == 401
+    token = login(server, 'admin123')['token']
+    assert server._authorized(f"Bearer {token}")
+    assert not server._authorized(f"Bearer {token}x")
+    server.admin_tokens[token] = time.monotonic() - 1
+    assert not server._authorized(f"Bearer {token}")
+    status, _ = asyncio.run(server.dispatch("GET", "/admin/change-seq", b"", f"Bearer {token}"))
+    assert status == 401
+
+
+def test_token_lifetime_follows_config(server, monkeypatch):
+    monkeypatch.setitem(CONFIG['server'], 'admin_token_ttl_s', 60)
+    before = time.monotonic()
+    token = login(server, 'admin123')['token']
+    assert before + 60 <= server.admin_tokens[token] <= time.monotonic() + 60
+
+
+def test_database_errors_raise_and_become_500(server, parking_system, conn, caplog):
+    conn.execute("DROP TABLE reservations")
+    conn.commit()
+    with pytest.raises(sqlite3.OperationalError):
+        parking_system.book_slot(1, "alice", "KA01")
+    with pytest.raises(sqlite3.OperationalError):
+        parking_system.execute_query("SELECT * FROM reservations", fetch=True)
+    assert parking_system.slot_index.is_free(1)
+    
+    with caplog.at_level(logging.ERROR, logger="parking_engine.server"):
+        status, payload = asyncio.run(server.dispatch("GET", "/users/alice/reservations", b""))
+    assert status == 500 and payload == {"error": "Internal server error"}
+    assert "Server error on GET /users/alice/reservations" in caplog.text
@@ -0,0 +1,115 @@
+import pytest
+
+from parking_engine import gui
+from parking_engine.gui import SlotGrid, VirtualSlotGrid
+
+
+class FakeButton:
+    """Records what SlotGrid does to a ttk.Button"""
+    created = []
+
+    def __init__(self, parent, text, command):
+        self.text = text
+        self.command = command
+        self.calls = []
+        self.created.append(self)
+
+    def grid(self, **options):
+        self.calls.append(('grid', options['row'], options['column']))
+
+    def grid_configure(self, **options):
+        self.calls.append(('grid', options['row'], options['column']))
+
+    def state(self, states):
+        self.calls.append(('state', states[0]))
+
+    def destroy(self):
+        self.calls.append(('destroy',))
+
+
+class FakeCanvas:
+    """A canvas height pixels high, scrolled by setting top"""
+    def __init__(self, height):
+        self.height = height
+        self.top = 0
+        self.items = []
+        self.bindings = {}
+
+    def bind(self, event, handler, add=None):
+        self.bindings[event] = handler
+        return event
+
+    def unbind(self, event, binding):
+        self.bindings.pop(event, None)
+
+    def config(self, **options):
+        pass
+
+    def canvasx(self, x):
+        return x
+
+    def canvasy(self, y):
+        return self.top + y
+
+    def winfo_height(self):
+        return self.height
+
+    def delete(self, tag):
+        self.items = []
+
+    def create_rectangle(self, *coords, **options):
+        self.items.append(('rectangle', options['fill']))
+
+    def create_text(self, *coords, **options):
+        self.items.append(('text', options['text']))
+
+
+@pytest.fixture
+def buttons(monkeypatch):
+    FakeButton.created = []
+    monkeypatch.setattr(gui.ttk, 'Button', FakeButton)
+    return FakeButton.created
+
+
+def test_slot_grid_only_touches_changed_slots(buttons):
+    grid = SlotGrid(None, on_select=None, columns=2)
+    grid.update([(1, True), (2, True), (3, False)])
+    assert [button.text for button in buttons] == ["Slot 1", "Slot 2", "Slot 3"]
+    assert buttons[2].calls == [('grid', 1, 0), ('state', 'disabled')]
+    for button in buttons:
+        button.calls.clear()
+
+    # Slot 2 is booked, slot 3 freed and slot 1 removed: 2 and 3 move up
+    grid.update([(2, False), (3, True)])
+    assert buttons[0].calls == [('destroy',)]
+    assert buttons[1].calls == [('grid', 0, 0), ('state', 'disabled')]
+    assert buttons[2].calls == [('grid', 0, 1), ('state', '!disabled')]
+    for button in buttons:
+        button.calls.clear()
+
+    grid.update([(2, False), (3, True)])
+    assert len(buttons) == 3
+    assert all(button.calls == [] for button in buttons)
+
+
+def test_virtual_grid_draws_only_visible_rows():
+    selected = []
+    canvas = FakeCanvas(height=VirtualSlotGrid.CELL_HEIGHT * 2)
+    grid = VirtualSlotGrid(canvas, selected.append, columns=4)
+    grid.update([(slot_id, slot_id % 2 == 0) for slot_id in range(1, 10001)])
+    texts = [item[1] for item in canvas.items if item[0] == 'text']
+    # Rows 0-2: the two visible and the one partly in view
+    assert texts == [f"Slot {slot_id}" for slot_id in range(1, 13)]
+
+    canvas.top = VirtualSlotGrid.CELL_HEIGHT * 1000
+    grid.redraw()
+    texts = [item[1] for item in canvas.items if item[0] == 'text']
+    assert texts[0] == "Slot 4001"
+
+    # Clicks map back to slots; booked ones are ignored
+    click = type("Event", (), {})
+    click.x, click.y = VirtualSlotGrid.CELL_WIDTH + 1, 1
+    canvas.bindings["<Button-1>"](click)
+    click.x = 1
+    canvas.bindings["<Button-1>"](click)
+    assert selected == [4002]
@@ -0,0 +1,73 @@
+import random
+
+from parking_engine.indexes import SlotIndex
+
+SEED = 4321
+ROUNDS = 3000
+TYPES = ['regular', 'ev', 'bike']
+
+
+def free_ids(model, vehicle_type=None):
+    return sorted(
+        slot_id for slot_id, (slot_type, available, is_active) in model.items()
+        if available and is_active and vehicle_type in (None, slot_type)
+    )
+
+
+def lowest_run(free, n):
+    free = set(free)
+    for slot_id in sorted(free):
+        if all(slot_id + k in free for k in range(n)):
+            return list(range(slot_id, slot_id + n))
+    return []
+
+
+def test_matches_brute_force():
+    rng = random.Random(SEED)
+    # Ids start high, like a shard's block
+    model = {slot_id: ['regular', True, True] for slot_id in range(1001, 1041)}
+    index = SlotIndex()
+    index.load((slot_id, 'available', 'regular', 1) for slot_id in model)
+    for _ in range(ROUNDS):
+        slot_id = rng.randrange(995, 1050)
+        roll = rng.random()
+        if roll < 0.1:
+            vehicle_type = rng.choice(TYPES)
+            model.setdefault(slot_id, ['regular', True, True])[0] = vehicle_type
+            index.update(slot_id, vehicle_type=vehicle_type)
+        elif roll < 0.2:
+            is_active = rng.random() < 0.5
+            model.setdefault(slot_id, ['regular', True, True])[2] = is_active
+            index.update(slot_id, is_active=is_active)
+        elif roll < 0.6:
+            slot_ids = rng.sample(range(995, 1050), rng.randrange(1, 4))
+            for booked in slot_ids:
+                model.setdefault(booked, ['regular', True, True])[1] = False
+            index.mark_booked_many(slot_ids)
+        else:
+            model.setdefault(slot_id, ['regular', True, True])[1] = True
+            index.mark_available([slot_id])
+
+        for vehicle_type in [None] + TYPES:
+            free = free_ids(model, vehicle_type)
+            assert index.available_slots(vehicle_type) == free
+            assert index.count_free(vehicle_type) == len(free)
+            assert index.next_free(vehicle_type) == (free[0] if free else None)
+            assert index.first_free(3, vehicle_type) == free[:3]
+        n = rng.randrange(1, 5)
+        assert index.free_run(n) == lowest_run(free_ids(model), n)
+        assert index.is_free(slot_id) == (slot_id in free_ids(model))
+
+
+def test_matches_the_slots_table(parking_system, conn):
+    assert parking_system.book_slot(2, "user2", "PLATE2")[0]
+    parking_system.set_slot_active(5, False)
+    conn.execute("UPDATE slots SET vehicle_type = 'ev' WHERE slot_id = 7")
+    conn.commit()
+    parking_system.rebuild_slot_index()
+    free = [slot_id for slot_id, in conn.execute(
+        "SELECT slot_id FROM slots WHERE status = 'available' AND is_active = 1 ORDER BY slot_id"
+    )]
+    assert parking_system.slot_index.available_slots() == free
+    assert parking_system.slot_index.available_slots('ev') == [7]
+    assert 2 not in free and 5 not in free
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import parking_engine
+from parking_engine.system import ParkingSystem
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import sys
+import parking_engine
+print(" ".join(sorted(name for name in ("tkinter", "asyncio", "pyarrow") if name in sys.modules)))
+"""
+
+
+def run(args, cwd):
+    return subprocess.run([sys.executable] + args, cwd=cwd, capture_output=True, text=True,
+                          env=dict(os.environ, PYTHONPATH=ROOT), check=True).stdout
+
+
+def test_import_loads_no_ui_server_or_arrow_and_writes_nothing(tmp_path):
+    assert run(["-c", IMPORT_SCRIPT], tmp_path).strip() == ""
+    assert os.listdir(tmp_path) == []
+
+
+def test_help_does_not_start_anything(tmp_path):
+    assert "usage" in run([os.path.join(ROOT, "parking.py"), "--help"], tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_opening_a_missing_database_creates_nothing(tmp_path):
+    path = str(tmp_path / "missing.db")
+    with pytest.raises(RuntimeError):
+        ParkingSystem(path)
+    assert not os.path.exists(path)
+
+
+def test_lazy_names_resolve():
+    assert parking_engine.ShardedParkingSystem.__module__ == "parking_engine.shards"
+    assert parking_engine.APIError.__module__ == "parking_engine.server"
+    with pytest.raises(AttributeError):
+        parking_engine.NoSuchThing
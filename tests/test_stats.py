@@ -0,0 +1,79 @@
+import sqlite3
+
+from parking_engine import schema
+from parking_engine.schema import create_archive_table, migrate
+
+
+def pay_all(conn):
+    with conn:
+        conn.execute("UPDATE bookings SET payment_status = 'paid' WHERE payment_status = 'pending'")
+
+
+def test_retyping_a_slot_keeps_its_revenue_bucket(parking_system, conn):
+    assert parking_system.book_slot(1, "user1", "PLATE1")[0]
+    pay_all(conn)
+    revenue = parking_system.get_revenue_rollup('vehicle_type')
+    assert list(revenue) == ['regular']
+
+    with conn:
+        conn.execute("UPDATE slots SET vehicle_type = 'compact' WHERE slot_id = 1")
+    assert parking_system.get_revenue_rollup('vehicle_type') == revenue
+    assert parking_system.check_stats() == []
+
+    # Bookings made after the change count as the new type
+    assert parking_system.book_slot(2, "user2", "PLATE2")[0]
+    with conn:
+        conn.execute("UPDATE slots SET vehicle_type = 'compact' WHERE slot_id = 2")
+    pay_all(conn)
+    assert set(parking_system.get_revenue_rollup('vehicle_type')) == {'regular'}
+    assert parking_system.check_stats() == []
+
+
+def test_insert_without_vehicle_type_takes_the_slots(conn):
+    with conn:
+        conn.execute("UPDATE slots SET vehicle_type = 'ev' WHERE slot_id = 3")
+        conn.execute(
+            "INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, amount_paid, "
+            "payment_status) VALUES (3, 'u', 'P', '2030-01-01T10:00:00.000000', "
+            "'2030-01-01T11:00:00.000000', 5.0, 'paid')"
+        )
+    assert conn.execute("SELECT vehicle_type FROM bookings").fetchall() == [('ev',)]
+    assert conn.execute(
+        "SELECT bucket, revenue FROM revenue_rollup WHERE kind = 'vehicle_type'"
+    ).fetchall() == [('ev', 5.0)]
+
+
+def test_migration_backfills_bookings_and_archives(tmp_path, monkeypatch):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    monkeypatch.setattr(schema, 'MIGRATIONS', schema.MIGRATIONS[:12])
+    migrate(conn)
+    with conn:
+        conn.execute("UPDATE slots SET vehicle_type = 'ev' WHERE slot_id = 1")
+        for month in ("2029-12", "2030-01"):
+            conn.execute(
+                "INSERT INTO bookings (slot_id, user_id, vehicle_number, start_time, end_time, amount_paid, "
+                "payment_status) VALUES (1, 'u', 'P', ?, ?, 5.0, 'paid')",
+                (f"{month}-01T10:00:00.000000", f"{month}-01T11:00:00.000000")
+            )
+        # An archive made before migration 13 has no vehicle_type column
+        conn.execute("CREATE TABLE bookings_archive_2029_12 AS SELECT "
+                     "booking_id, slot_id, user_id, vehicle_number, start_time, end_time, status, "
+                     "amount_paid, payment_status, change_seq FROM bookings WHERE start_time < '2030'")
+        conn.execute("INSERT INTO booking_archives (month, table_name) "
+                     "VALUES ('2029-12', 'bookings_archive_2029_12')")
+        conn.execute("UPDATE archive_control SET moving = 1")
+        conn.execute("DELETE FROM bookings WHERE start_time < '2030'")
+        conn.execute("UPDATE archive_control SET moving = 0")
+    monkeypatch.undo()
+
+    assert migrate(conn) == [13]
+    for table in ("bookings", "bookings_archive_2029_12"):
+        assert conn.execute(f"SELECT vehicle_type FROM {table}").fetchall() == [('ev',)]
+    assert conn.execute(
+        "SELECT bucket, revenue, paid_bookings FROM revenue_rollup WHERE kind = 'vehicle_type'"
+    ).fetchall() == [('ev', 10.0, 2)]
+    # Archives made from now on carry the column
+    create_archive_table(conn.cursor(), "2030-02")
+    assert 'vehicle_type' in [row[1] for row in conn.execute("PRAGMA table_info(bookings_archive_2030_02)")]
+    conn.close()
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from parking_engine.gui import SlotManagementWindow, StallMonitor, UIExecutor
+
+
+class FakeRoot:
+    """Stands in for Tk: after() callbacks are run by drain()"""
+    def __init__(self):
+        self.timers = {}
+        self.next_id = 0
+
+    def after(self, ms, callback):
+        self.next_id += 1
+        self.timers[self.next_id] = callback
+        return self.next_id
+
+    def after_cancel(self, timer):
+        self.timers.pop(timer, None)
+
+
+@pytest.fixture
+def executor():
+    executor = UIExecutor(FakeRoot(), workers=2)
+    yield executor
+    executor.close()
+
+
+def drain(executor, done=None, timeout=5):
+    """Poll until done() or, without it, until no keyed request is queued or running"""
+    deadline = time.monotonic() + timeout
+    while True:
+        executor._poll()
+        with executor.lock:
+            if done() if done else not executor.in_flight and executor.results.empty():
+                return
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_results_reach_callbacks_on_poll(executor):
+    results, errors = [], []
+    executor.submit(None, lambda a, b: a + b, 2, 3, callback=results.append)
+    executor.submit(None, lambda: 1 / 0, errback=errors.append)
+    drain(executor, lambda: results and errors)
+    assert results == [5]
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
+def test_submits_with_one_key_coalesce_into_one_rerun(executor):
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def slow(n):
+        calls.append(n)
+        started.set()
+        release.wait(5)
+        return n
+
+    assert executor.submit('key', slow, 1, callback=results.append)
+    started.wait(5)
+    assert not executor.submit('key', slow, 2, callback=results.append)
+    assert not executor.submit('key', slow, 3, callback=results.append)
+    release.set()
+    drain(executor)
+    assert calls == [1, 3]
+    assert results == [1, 3]
+    assert executor.coalesced == 2
+
+
+def test_quick_toggles_end_in_the_last_requested_state(executor, parking_system):
+    started, release = threading.Event(), threading.Event()
+    set_slot_active = parking_system.set_slot_active
+    requested = []
+
+    def held_set_slot_active(slot_id, is_active):
+        requested.append(is_active)
+        started.set()
+        release.wait(5)
+        return set_slot_active(slot_id, is_active)
+
+    parking_system.set_slot_active = held_set_slot_active
+    # The window without Tk: only the toggle bookkeeping runs
+    window = SlotManagementWindow.__new__(SlotManagementWindow)
+    window.parking_system = parking_system
+    window.executor = executor
+    window.slot_active = {"1": True}
+    window.requested_active = {}
+    window.on_slot_changed = lambda message: None
+    window.on_error = pytest.fail
+
+    window.toggle_slot_status("1")
+    started.wait(5)
+    window.toggle_slot_status("1")
+    window.toggle_slot_status("1")
+    window.toggle_slot_status("1")
+    release.set()
+    drain(executor)
+    # Clicks two to four fold into one request for the state after four toggles
+    assert requested == [False, True]
+    is_active = {slot.slot_id: slot.is_active for slot in parking_system.get_slots()}
+    assert is_active[1]
+    assert window.requested_active == {}
+
+
+def test_stall_histogram_percentiles():
+    monitor = StallMonitor(FakeRoot(), interval_ms=50)
+    for stall_ms in [0.5] * 90 + [30] * 9 + [700]:
+        monitor.record(stall_ms)
+    assert monitor.samples == 100
+    assert monitor.percentile(50) == 1
+    assert monitor.percentile(95) == 50
+    assert monitor.percentile(100) == 700
+    assert "  >1000 ms 0" in monitor.format_histogram()
+    monitor.stop()
+    assert monitor.root.timers == {}